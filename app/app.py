@@ -5,6 +5,7 @@ from PyQt6.QtCore import QFile, QTextStream
 from PyQt6.QtWidgets import QApplication
 from apscheduler.schedulers.qt import QtScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 from database_manager import DatabaseManager
 from backend.managers.api_manager import EpicAPIManager
@@ -41,17 +42,39 @@ def load_stylesheet(stylesheet):
     return qss_content
 
 
-def build_dependencies():
-    '''Builds dependencies for the app, a scuffed version of a factory pattern to allow for dependency injection'''
+def build_dependencies(capture_path=None, ingest_mode="async", decoders=None, continuous_inference=None, inference_backend="library",
+                       batch_inference=None, max_batch_size=5000, inference_telemetry=False, inference_log=False):
+    '''Builds dependencies for the app, a scuffed version of a factory pattern to allow for dependency injection
+
+    Kwargs:
+        capture_path {str} -- file the raw vitals stream is captured to, nothing is captured by default
+        ingest_mode {str} -- how the vitals manager serves devices, 'threaded', 'async' or 'process'
+        decoders {int} -- number of decoder processes in process mode, defaults to one less than the number of cores
+        continuous_inference {float} -- seconds between publishing each patient's prediction, inference only runs on request by default
+        inference_backend {str} -- 'library' predicts with XGBoost/scikit-learn, 'compiled' with the NumPy tree evaluator
+        batch_inference {float} -- seconds between scoring every patient with new samples in one batch, off by default
+        max_batch_size {int} -- maximum number of rows scored in a batch_inference tick
+        inference_telemetry {bool} -- whether the inference stages are timed, off by default
+        inference_log {bool} -- whether every inference request and model load is logged as a JSON line
+    '''
     db_manager = DatabaseManager()
-    vitals_manager = VitalsManager()
+    vitals_manager = VitalsManager(mode=ingest_mode, capture_path=capture_path, decoders=decoders)
     api_manager = EpicAPIManager()
-    ml_manager = MLManager(model_type='xgb', binary=False, max_cache_size=100)
+    ml_manager = MLManager(model_type='xgb', binary=False, max_cache_size=100, backend=inference_backend)
+    if inference_telemetry or inference_log:
+        ml_manager.enable_telemetry(log_lines=inference_log)
+    if continuous_inference:
+        ml_manager.enable_continuous_inference(micro_batch=10, publish_interval=continuous_inference)
+    elif batch_inference:
+        ml_manager.enable_batch_scheduler(tick=batch_inference, max_batch_size=max_batch_size)
     
     fluid_manager = FluidManager(db_manager)
     patient_manager = PatientManager(db_manager)
     
-    coordinator = Coordinator(fluid_manager, api_manager, patient_manager)
+    coordinator = Coordinator(fluid_manager, api_manager, patient_manager, vitals_manager, ml_manager)
+
+    # samples routed to a patient are cached for inference whether or not they are on screen
+    vitals_manager.add_sink(ml_manager.add_to_cache)
 
     return {
         "db_manager": db_manager,
@@ -64,16 +87,41 @@ def build_dependencies():
     }
 
 
-def configure_scheduler(coordinator:Coordinator):
-    '''Create and configure a cron scheduler that works within Qt's event loop'''
+def configure_scheduler(coordinator:Coordinator, vitals_manager:VitalsManager=None, stats_interval=None,
+                        ml_manager:MLManager=None, inference_stats_interval=None):
+    '''Create and configure a cron scheduler that works within Qt's event loop
+
+    Kwargs:
+        vitals_manager {VitalsManager} -- the vitals manager whose ingest stats are logged
+        stats_interval {float} -- seconds between logging the ingest stats, not logged by default
+        ml_manager {MLManager} -- the ML manager whose inference telemetry is logged
+        inference_stats_interval {float} -- seconds between logging the inference telemetry, not logged by default
+    '''
     scheduler = QtScheduler()
     scheduler.add_job(coordinator.remove_inactive_patients, CronTrigger(hour=0, minute=0))
+
+    if vitals_manager and stats_interval:
+        scheduler.add_job(lambda: print(vitals_manager.stats.summary()), IntervalTrigger(seconds=stats_interval))
+
+    if ml_manager and inference_stats_interval:
+        scheduler.add_job(lambda: print(ml_manager.telemetry.summary()), IntervalTrigger(seconds=inference_stats_interval))
+
     return scheduler
 
 
 def run(args):
     '''Initalizes the router and start the PyQT application'''
-    dependencies = build_dependencies()
+    dependencies = build_dependencies(
+        capture_path=args.capture,
+        ingest_mode=args.ingest_mode,
+        decoders=args.decoders,
+        continuous_inference=args.continuous_inference,
+        inference_backend=args.inference_backend,
+        batch_inference=args.batch_inference,
+        max_batch_size=args.max_batch_size,
+        inference_telemetry=args.inference_stats is not None,
+        inference_log=args.inference_log,
+    )
 
     try:
         # initalizes the database if the --initdb flag is passed
@@ -88,7 +136,14 @@ def run(args):
         # on app startup, remove all inactive patients, and create a cron scheduler
         # to remove inactive patients every night at midnight, if the app is left on
         dependencies['coordinator'].remove_inactive_patients()
-        scheduler = configure_scheduler(dependencies['coordinator'])
+
+        # devices bound from the command line are routed to their patient whether or not they are on screen
+        for source_id, patient_mrn in args.bind_device:
+            dependencies['coordinator'].bind_device(source_id, patient_mrn)
+        scheduler = configure_scheduler(
+            dependencies['coordinator'], dependencies['vitals_manager'], args.ingest_stats,
+            dependencies['ml_manager'], args.inference_stats,
+        )
         scheduler.start()
 
         # initalize the windows and specify the routing for each window
@@ -127,6 +182,16 @@ def run(args):
         # cleanup
         dependencies['db_manager'].close_session()
         dependencies['vitals_manager'].stop_server()
+        dependencies['ml_manager'].shutdown()
+
+
+def parse_binding(value):
+    '''Parses a DEVICE=MRN device binding into a (device, mrn) tuple'''
+    source_id, separator, patient_mrn = value.partition("=")
+    if not separator or not source_id or not patient_mrn:
+        raise argparse.ArgumentTypeError(f"expected DEVICE=MRN, got {value!r}")
+
+    return source_id, patient_mrn
 
 
 def parse_arguments(args=None):
@@ -142,6 +207,19 @@ def parse_arguments(args=None):
     
     parser = argparse.ArgumentParser()
     parser.add_argument("--initdb", action="store_true", default=False, help="Initalize the database")
+    parser.add_argument("--bind-device", type=parse_binding, action="append", default=[], metavar="DEVICE=MRN",
+                        help="Route the vitals of a device (its host or host:port) to the patient with MRN, can be repeated")
+    parser.add_argument("--capture", default=None, help="Capture the raw vitals stream to this file for replaying")
+    parser.add_argument("--ingest-mode", choices=["threaded", "async", "process"], default="async", help="How the vitals manager serves devices, process decodes in a pool of processes")
+    parser.add_argument("--decoders", type=int, default=None, help="Number of decoder processes used by --ingest-mode process")
+    inference = parser.add_mutually_exclusive_group()
+    inference.add_argument("--continuous-inference", type=float, default=None, metavar="SECONDS", help="Score every sample as it arrives and publish each patient's prediction every SECONDS")
+    inference.add_argument("--batch-inference", type=float, default=None, metavar="SECONDS", help="Every SECONDS, score every patient with new samples together in one batch and publish their predictions")
+    parser.add_argument("--max-batch-size", type=int, default=5000, help="Maximum number of rows scored in a --batch-inference tick")
+    parser.add_argument("--inference-backend", choices=["library", "compiled"], default="library", help="Predict with XGBoost/scikit-learn or the compiled NumPy tree evaluator")
+    parser.add_argument("--ingest-stats", type=float, default=None, metavar="SECONDS", help="Log the vitals ingest stats every SECONDS")
+    parser.add_argument("--inference-stats", type=float, default=None, metavar="SECONDS", help="Time every inference stage and log the inference telemetry every SECONDS")
+    parser.add_argument("--inference-log", action="store_true", default=False, help="Log every inference request and model load with its stage timings as a JSON line")
 
     return parser.parse_args(args)
 
@@ -7,10 +7,12 @@ class Coordinator:
         pass
     '''
 
-    def __init__(self, fluid_manager, api_manager, patient_manager):
+    def __init__(self, fluid_manager, api_manager, patient_manager, vitals_manager=None, ml_manager=None):
         self._fluid_manager = fluid_manager
         self._api = api_manager
         self._patient_manager = patient_manager
+        self._vitals_manager = vitals_manager
+        self._ml_manager = ml_manager
 
     
     def get_or_create_patient(self, patient_mrn):
@@ -44,6 +46,33 @@ class Coordinator:
             return
         
         self._patient_manager.delete_patient(inactive_patients)
+        self._fluid_manager.forget_totals(inactive_patients)
+
+        # drop the device bindings and inference cache kept for the deleted patients
+        for patient in inactive_patients:
+            if self._vitals_manager:
+                self._vitals_manager.forget_patient(patient.patient_mrn)
+            if self._ml_manager:
+                self._ml_manager.remove_cache(patient.patient_mrn)
+
+
+    def bind_device(self, source_id, patient_mrn):
+        '''Routes the samples of a device to a patient, creating the patient from the external search if needed
+
+        Args:
+            source_id {str} -- the device, either its "host:port" peer address or just its host
+            patient_mrn {str} -- MRN of the patient the device is monitoring
+
+        Returns:
+            bound {bool} -- False if no patient was found for the MRN
+        '''
+        patient = self.get_or_create_patient(patient_mrn)
+        if patient is None:
+            print(f"No patient found with MRN {patient_mrn}, {source_id} is not bound")
+            return False
+
+        self._vitals_manager.bind_device(source_id, patient)
+        return True
 
 
 if __name__ == "__main__":
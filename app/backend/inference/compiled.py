@@ -0,0 +1,357 @@
+import json
+
+import numpy as np
+
+XGB_SOFTPROB = "xgb_softprob"
+XGB_LOGISTIC = "xgb_logistic"
+RANDOM_FOREST = "rf"
+
+# bumped whenever the arrays saved by save_compiled() change
+SAVE_FORMAT = 1
+
+
+class CompiledEnsemble:
+    '''A tree ensemble flattened into NumPy node arrays and evaluated for a whole batch at once.
+
+    Every tree's nodes are stored back to back in the same arrays, a node is
+    a feature, a threshold and its two children, and a leaf points back to
+    itself. A batch is evaluated by walking every row through every tree
+    together, one level per step, so the cost is a handful of gathers per
+    level instead of the per call overhead of XGBoost or scikit-learn.
+
+    predict() follows the library it was compiled from exactly:
+        XGBoost -- features are compared as float32 with value < threshold, missing
+                   values take the default branch, leaf values are summed tree by tree
+                   in float32 from the base margin and turned into probabilities the
+                   same way XGBClassifier.predict does
+        random forest -- features are cast to float32 and compared with value <= threshold,
+                         the normalized leaf class fractions are summed tree by tree and
+                         averaged like RandomForestClassifier.predict_proba
+
+    Like the models it replaces it has n_features_in_ and classes_, predict()
+    returns the index of the predicted class.
+
+    The node arrays are only ever read, so they can be memory-mapped from a
+    file written by save_compiled() (see load_compiled()) and shared by every
+    process using the model.
+
+    Methods:
+        predict(features) -- returns the predicted class index of every row
+        predict_proba(features) -- returns the probability of every class for every row
+        leaves(features) -- returns the leaf every row lands in, for every tree
+        arrays() -- returns everything needed to rebuild the ensemble as a dict
+    '''
+    def __init__(self, kind, roots, feature, threshold, children, default_left, leaf_values, max_depth, n_features, n_classes, tree_class=None, base_margin=0.0):
+        '''Constructor for the CompiledEnsemble, use compile_xgboost() or compile_random_forest() instead
+
+        Args:
+            kind {str} -- XGB_SOFTPROB, XGB_LOGISTIC or RANDOM_FOREST
+            roots {np.ndarray} -- node index of the root of every tree
+            feature {np.ndarray} -- feature index of every node
+            threshold {np.ndarray} -- split threshold of every node, as float64
+            children {np.ndarray} -- (n_nodes, 2) left and right child of every node
+            default_left {np.ndarray} -- whether a missing value goes left at every node
+            leaf_values {np.ndarray} -- leaf value (XGBoost) or class fractions (random forest) of every node
+            max_depth {int} -- depth of the deepest tree
+            n_features {int} -- number of features the model was trained on
+            n_classes {int} -- number of classes
+            tree_class {np.ndarray} -- class every tree contributes to, only used by XGB_SOFTPROB
+            base_margin {float} -- margin the XGBoost trees are summed onto
+        '''
+        self.kind = kind
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.default_left = default_left
+        self.leaf_values = leaf_values
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features
+        self.n_classes = n_classes
+        self.classes_ = np.arange(n_classes)
+        self.tree_class = tree_class
+        self.base_margin = base_margin
+
+        # the trees summed into each class margin, in boosting order
+        self._class_trees = [np.flatnonzero(tree_class == cls) for cls in range(n_classes)] if tree_class is not None else None
+
+
+    def arrays(self):
+        '''Returns the constructor arguments of the ensemble, see save_compiled()'''
+        return {
+            "kind": self.kind,
+            "roots": self.roots,
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "default_left": self.default_left,
+            "leaf_values": self.leaf_values,
+            "max_depth": self.max_depth,
+            "n_features": self.n_features_in_,
+            "n_classes": self.n_classes,
+            "tree_class": self.tree_class,
+            "base_margin": self.base_margin,
+        }
+
+
+    def leaves(self, features):
+        '''Walks every row through every tree
+
+        Args:
+            features {np.ndarray} -- (n, n_features) feature matrix
+
+        Returns:
+            nodes {np.ndarray} -- (n, n_trees) index of the leaf every row lands in
+        '''
+        # both libraries compare float32 features, widening them and the thresholds to float64 is exact
+        features = np.asarray(features, dtype=np.float32).astype(np.float64)
+        flat_features = features.ravel()
+        row_offsets = np.arange(len(features), dtype=np.intp)[:, None] * features.shape[1]
+        nodes = np.repeat(self.roots[None, :], len(features), axis=0)
+        missing = np.isnan(flat_features).any()
+        flat_children = self.children.ravel()
+
+        # take() with intp indices is the cheapest gather numpy has, this loop is the whole cost of predict()
+        for _ in range(self.max_depth):
+            values = flat_features.take(row_offsets + self.feature.take(nodes))
+            thresholds = self.threshold.take(nodes)
+            if self.kind == RANDOM_FOREST:
+                go_right = ~(values <= thresholds)
+            else:
+                go_right = ~(values < thresholds)
+
+            if missing:
+                go_right = np.where(np.isnan(values), ~self.default_left.take(nodes), go_right)
+
+            nodes = flat_children.take(nodes * 2 + go_right)
+
+        return nodes
+
+
+    def predict(self, features):
+        '''Predicts the class index of every row
+
+        Args:
+            features {np.ndarray} -- (n, n_features) feature matrix
+
+        Returns:
+            labels {np.ndarray} -- one class index per row
+        '''
+        if len(features) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        proba = self._proba(features)
+        if self.kind == XGB_LOGISTIC:
+            return (proba > 0.5).astype(np.int64)
+        return np.argmax(proba, axis=1)
+
+
+    def predict_proba(self, features):
+        '''Predicts the probability of every class for every row, like the library's predict_proba
+
+        Args:
+            features {np.ndarray} -- (n, n_features) feature matrix
+
+        Returns:
+            proba {np.ndarray} -- (n, n_classes) probabilities
+        '''
+        if len(features) == 0:
+            return np.empty((0, self.n_classes), dtype=np.float32)
+
+        proba = self._proba(features)
+        if self.kind == XGB_LOGISTIC:
+            return np.stack((np.float32(1) - proba, proba), axis=1)
+        return proba
+
+
+    def _proba(self, features):
+        '''(n, n_classes) probabilities, or the (n,) positive class probability of a logistic model'''
+        leaf_values = self.leaf_values.take(self.leaves(features), axis=0)
+
+        if self.kind == RANDOM_FOREST:
+            # cumsum adds the trees one at a time in order, like the forest does, rather than pairwise
+            return np.cumsum(leaf_values, axis=1)[:, -1] / len(self.roots)
+
+        base = np.full((len(leaf_values), 1), self.base_margin, dtype=np.float32)
+        if self.kind == XGB_LOGISTIC:
+            margin = np.cumsum(np.concatenate((base, leaf_values), axis=1), axis=1, dtype=np.float32)[:, -1]
+            return np.float32(1) / (np.float32(1) + np.exp(-margin))
+
+        margins = np.stack([
+            np.cumsum(np.concatenate((base, leaf_values.take(trees, axis=1)), axis=1), axis=1, dtype=np.float32)[:, -1]
+            for trees in self._class_trees
+        ], axis=1)
+
+        # softmax like XGBoost so rows whose probabilities round to a tie are broken the same way
+        exp = np.exp(margins - margins.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True, dtype=np.float32)
+
+
+def save_compiled(ensemble, path):
+    '''Saves a CompiledEnsemble uncompressed, so load_compiled() can memory-map its arrays
+
+    Args:
+        ensemble {CompiledEnsemble} -- the ensemble to save
+        path {str or Path} -- file the ensemble is written to
+    '''
+    import joblib
+    joblib.dump({"format": SAVE_FORMAT, "arrays": ensemble.arrays()}, path)
+
+
+def load_compiled(path, mmap_mode="r"):
+    '''Loads a CompiledEnsemble saved by save_compiled()
+
+    Args:
+        path {str or Path} -- file the ensemble was saved to
+        mmap_mode {str} -- 'r' memory-maps the node arrays read only, None reads them into memory
+
+    Raises:
+        ValueError -- if the file was saved in another format
+    '''
+    import joblib
+    saved = joblib.load(path, mmap_mode=mmap_mode)
+    if not isinstance(saved, dict) or saved.get("format") != SAVE_FORMAT:
+        raise ValueError(f"{path} is not a compiled ensemble of format {SAVE_FORMAT}")
+
+    # plain ndarray views of the maps, every operation on an np.memmap pays for the subclass
+    arrays = {name: np.asarray(value) if isinstance(value, np.ndarray) else value for name, value in saved["arrays"].items()}
+    return CompiledEnsemble(**arrays)
+
+
+def _max_depth(roots, children):
+    '''Depth of the deepest tree, leaves point to themselves'''
+    depth = 0
+    nodes = roots
+    while True:
+        next_nodes = children[nodes].ravel()
+        next_nodes = next_nodes[next_nodes != np.repeat(nodes, 2)]
+        if len(next_nodes) == 0:
+            return depth
+        depth += 1
+        nodes = next_nodes
+
+
+def compile_xgboost(model_path):
+    '''Compiles an XGBoost model saved as JSON, without importing xgboost
+
+    Args:
+        model_path {str or Path} -- path of the JSON model
+
+    Raises:
+        ValueError -- if the model uses something the evaluator does not support
+    '''
+    with open(model_path) as model_file:
+        learner = json.load(model_file)["learner"]
+
+    objective = learner["objective"]["name"]
+    booster = learner["gradient_booster"]
+    if booster["name"] != "gbtree" or objective not in ("multi:softprob", "multi:softmax", "binary:logistic"):
+        raise ValueError(f"Unsupported XGBoost model: {booster['name']} {objective}")
+
+    params = learner["learner_model_param"]
+    base_score = np.float32(float(params["base_score"].strip("[]").split(",")[0]))
+    if objective == "binary:logistic":
+        kind = XGB_LOGISTIC
+        n_classes = 2
+        # XGBoost keeps the base score as a probability and sums the trees onto its logit
+        base_margin = -np.log(np.float32(1) / base_score - np.float32(1))
+    else:
+        kind = XGB_SOFTPROB
+        n_classes = int(params["num_class"])
+        base_margin = base_score
+
+    trees = booster["model"]["trees"]
+    feature, threshold, children, default_left, leaf_values, roots = [], [], [], [], [], []
+    offset = 0
+
+    for tree in trees:
+        if any(tree["split_type"]):
+            raise ValueError("Categorical splits are not supported")
+
+        left = np.asarray(tree["left_children"], dtype=np.int64)
+        right = np.asarray(tree["right_children"], dtype=np.int64)
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        is_leaf = left == -1
+        own = np.arange(len(left))
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+        threshold.append(conditions.astype(np.float64))
+        children.append(np.stack((np.where(is_leaf, own, left), np.where(is_leaf, own, right)), axis=1) + offset)
+        default_left.append(np.asarray(tree["default_left"], dtype=bool))
+        # a leaf keeps its value in split_conditions
+        leaf_values.append(np.where(is_leaf, conditions, np.float32(0)))
+        offset += len(left)
+
+    children = np.concatenate(children).astype(np.intp)
+    roots = np.asarray(roots, dtype=np.intp)
+
+    return CompiledEnsemble(
+        kind=kind,
+        roots=roots,
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold),
+        children=children,
+        default_left=np.concatenate(default_left),
+        leaf_values=np.concatenate(leaf_values).astype(np.float32),
+        max_depth=_max_depth(roots, children),
+        n_features=int(params["num_feature"]),
+        n_classes=n_classes,
+        tree_class=np.asarray(booster["model"]["tree_info"], dtype=np.int32),
+        base_margin=np.float32(base_margin),
+    )
+
+
+def compile_random_forest(forest):
+    '''Compiles a fitted scikit-learn RandomForestClassifier
+
+    Args:
+        forest {RandomForestClassifier} -- the fitted forest
+
+    Raises:
+        ValueError -- if the forest has more than one output
+    '''
+    if getattr(forest, "n_outputs_", 1) != 1:
+        raise ValueError("Only single output forests are supported")
+
+    n_classes = len(forest.classes_)
+    feature, threshold, children, default_left, leaf_values, roots = [], [], [], [], [], []
+    offset = 0
+
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        is_leaf = left == -1
+        own = np.arange(tree.node_count)
+
+        # normalize the class fractions exactly like DecisionTreeClassifier.predict_proba
+        proba = tree.value[:, 0, :n_classes].copy()
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold.astype(np.float64))
+        children.append(np.stack((np.where(is_leaf, own, left), np.where(is_leaf, own, right)), axis=1) + offset)
+        missing_go_to_left = getattr(tree, "missing_go_to_left", None)
+        default_left.append(np.asarray(missing_go_to_left, dtype=bool) if missing_go_to_left is not None else np.zeros(tree.node_count, dtype=bool))
+        leaf_values.append(proba)
+        offset += tree.node_count
+
+    children = np.concatenate(children).astype(np.intp)
+    roots = np.asarray(roots, dtype=np.intp)
+
+    return CompiledEnsemble(
+        kind=RANDOM_FOREST,
+        roots=roots,
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold),
+        children=children,
+        default_left=np.concatenate(default_left),
+        leaf_values=np.concatenate(leaf_values),
+        max_depth=_max_depth(roots, children),
+        n_features=int(forest.n_features_in_),
+        n_classes=n_classes,
+    )
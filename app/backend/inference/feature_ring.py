@@ -0,0 +1,84 @@
+from threading import Lock
+
+import numpy as np
+
+class FeatureRing:
+    '''Fixed size ring of feature rows in a preallocated float32 matrix.
+
+    The matrix holds the ring twice, back to back, and every row is written to
+    both halves. The last n rows are then always one contiguous slice of the
+    matrix, oldest first, so they reach the model with at most one copy and
+    without gathering or parsing anything. Appending writes the row in place, nothing
+    is allocated after the ring is created.
+
+    view() is only safe while nothing is appended, e.g. on the thread that
+    appends, an append overwrites the oldest row of a full ring. Readers on
+    another thread should take a snapshot(), a single copy of the slice.
+
+    Methods:
+        append(row) -- writes a row, overwriting the oldest once the ring is full
+        view(n) -- returns a read only view of the last n rows, oldest first
+        snapshot(n) -- returns a copy of the last n rows, oldest first
+        clear() -- drops every row
+    '''
+    def __init__(self, capacity, n_features=8):
+        '''Constructor for the FeatureRing
+
+        Args:
+            capacity {int} -- maximum number of rows kept
+            n_features {int} -- number of features in a row
+        '''
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        self._rows = np.zeros((2 * capacity, n_features), dtype=np.float32)
+        self._lock = Lock()
+        # total number of rows ever appended
+        self.appended = 0
+
+
+    def __len__(self):
+        return min(self.appended, self.capacity)
+
+
+    def append(self, row):
+        '''Writes a row, overwriting the oldest row once the ring is full
+
+        Args:
+            row {sequence} -- n_features numbers, None is stored as nan
+        '''
+        with self._lock:
+            slot = self.appended % self.capacity
+            self._rows[slot] = row
+            self._rows[slot + self.capacity] = self._rows[slot]
+            self.appended += 1
+
+
+    def _slice(self, n):
+        '''Returns the slice of the matrix holding the last n rows'''
+        n = len(self) if n is None else min(n, len(self))
+        if n == 0:
+            return self._rows[:0]
+
+        end = (self.appended - 1) % self.capacity + 1 + self.capacity
+        return self._rows[end - n:end]
+
+
+    def view(self, n=None):
+        '''Returns a read only view of the last n rows (every row by default), oldest first'''
+        view = self._slice(n)
+        view.flags.writeable = False
+        return view
+
+
+    def snapshot(self, n=None):
+        '''Returns a copy of the last n rows (every row by default), oldest first'''
+        with self._lock:
+            return self._slice(n).copy()
+
+
+    def clear(self):
+        '''Drops every row, the matrix is kept'''
+        with self._lock:
+            self.appended = 0
@@ -0,0 +1,126 @@
+from threading import Lock
+from collections import OrderedDict
+
+import numpy as np
+
+INT16_MIN, INT16_MAX = np.iinfo(np.int16).min, np.iinfo(np.int16).max
+
+
+class PredictionMemo:
+    '''Bounded LRU memo of predicted labels keyed on the packed feature vector.
+
+    The vitals are whole numbers and age is in years, so a stable patient
+    produces the same feature vectors over and over. Every row made of whole
+    numbers that fit in an int16 is packed into a 16 byte key, rows already
+    seen skip the model entirely and only the distinct unseen rows of a batch
+    are predicted, in a single call. Rows with fractional values are always
+    predicted and counted as uncacheable.
+
+    The memo belongs to one model at a time, predicting with a different model
+    clears it, so a hot-swapped model never returns the old model's labels.
+
+    Methods:
+        predict(model, features) -- returns the labels of every row, predicting only the rows not memoized
+        clear() -- drops every memoized label
+        snapshot() -- returns the size and hit/miss counters as a dict
+    '''
+    def __init__(self, capacity=4096):
+        '''Constructor for the PredictionMemo
+
+        Args:
+            capacity {int} -- maximum number of feature vectors memoized
+        '''
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        self._labels = OrderedDict()
+        self._model = None
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+
+    def __len__(self):
+        return len(self._labels)
+
+
+    def predict(self, model, features):
+        '''Predicts the label of every row, using the memoized labels where possible
+
+        Args:
+            model -- anything with predict(features) returning one integer label per row, e.g. a LoadedModel
+            features {np.ndarray} -- (n, n_features) feature matrix
+
+        Returns:
+            labels {np.ndarray} -- one integer label per row
+        '''
+        features = np.asarray(features, dtype=float)
+        cacheable = np.all((features == np.rint(features)) & (features >= INT16_MIN) & (features <= INT16_MAX), axis=1)
+        # only cacheable rows are packed, casting nan or out of range values would warn
+        packed = np.where(cacheable[:, None], features, 0).astype(np.int16)
+        keys = [row.tobytes() if ok else None for row, ok in zip(packed, cacheable.tolist())]
+
+        labels = np.empty(len(features), dtype=np.int64)
+        missing = []
+
+        with self._lock:
+            if model is not self._model:
+                self._labels.clear()
+                self._model = model
+
+            for idx, key in enumerate(keys):
+                label = self._labels.get(key) if key is not None else None
+                if label is None:
+                    missing.append(idx)
+                else:
+                    self._labels.move_to_end(key)
+                    labels[idx] = label
+
+            self.hits += len(keys) - len(missing)
+            self.misses += sum(1 for idx in missing if keys[idx] is not None)
+            self.uncacheable += len(features) - int(cacheable.sum())
+
+        if not missing:
+            return labels
+
+        # a batch often repeats the same unseen vector, only predict each one once
+        unique_rows, inverse = np.unique(features[missing], axis=0, return_inverse=True)
+        predicted = np.asarray(model.predict(unique_rows)).astype(np.int64).ravel()[inverse.ravel()]
+        labels[missing] = predicted
+
+        with self._lock:
+            # the model may have been swapped while predicting, don't memoize its labels for the new one
+            if model is self._model:
+                for idx, label in zip(missing, predicted.tolist()):
+                    key = keys[idx]
+                    if key is not None:
+                        self._labels[key] = label
+                        self._labels.move_to_end(key)
+
+                while len(self._labels) > self.capacity:
+                    self._labels.popitem(last=False)
+
+        return labels
+
+
+    def clear(self):
+        '''Drops every memoized label, the counters are kept'''
+        with self._lock:
+            self._labels.clear()
+            self._model = None
+
+
+    def snapshot(self):
+        '''Returns the size, hit/miss counters and hit rate of the memo'''
+        with self._lock:
+            lookups = self.hits + self.misses + self.uncacheable
+            return {
+                "size": len(self._labels),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,280 @@
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.inference.compiled import compile_xgboost, compile_random_forest, save_compiled, load_compiled
+
+# model file of every (model type, binary) pair in the models directory
+MODEL_FILES = {
+    ("xgb", False): "unsupervised_data_xgboost.json",
+    ("xgb", True): "xgboost_binary_model.json",
+    ("rf", False): "random_forest_model.pkl",
+    ("rf", True): "random_forest_binary_model.pkl",
+}
+
+BACKENDS = ("library", "compiled")
+
+# the MLManager builds 8 features, the 7 feature models were trained before age was added
+FEATURE_COUNT = 8
+AGE_COLUMN = 6
+
+
+def load_xgb_model(model_path):
+    '''Loads an XGBoost model, from its UBJSON cache if it is up to date
+
+    The cache is written next to the JSON model (e.g. model.json -> model.ubj)
+    the first time the JSON model is loaded, and rewritten whenever the JSON
+    model is modified after it.
+
+    Args:
+        model_path {Path} -- path of the JSON model
+    '''
+    import xgboost as xgb
+
+    cache_path = model_path.with_suffix(".ubj")
+    model = xgb.XGBClassifier()
+
+    if cache_path.exists() and cache_path.stat().st_mtime >= model_path.stat().st_mtime:
+        try:
+            model.load_model(str(cache_path))
+            return model
+        except xgb.core.XGBoostError as e:
+            print(f"Ignoring unreadable model cache {cache_path}: {e}")
+
+    model.load_model(str(model_path))
+
+    try:
+        # write to a temporary file first so another process never loads a partial cache
+        temp_path = cache_path.with_suffix(f".{os.getpid()}.ubj")
+        model.save_model(str(temp_path))
+        os.replace(temp_path, cache_path)
+    except (OSError, xgb.core.XGBoostError) as e:
+        print(f"Failed to write the model cache {cache_path}: {e}")
+
+    return model
+
+
+def load_rf_model(model_path):
+    '''Loads a pickled scikit-learn random forest'''
+    import joblib
+    return joblib.load(model_path)
+
+
+def load_compiled_rf(model_path):
+    '''Loads a random forest as a CompiledEnsemble, memory-mapped from its cache if it is up to date
+
+    Unpickling the forest imports scikit-learn and gives every process its own
+    copy of the trees. The cache is written next to the pickle (e.g. model.pkl
+    -> model.compiled.joblib) the first time the forest is compiled, and
+    rewritten whenever the pickle is modified after it. It holds the compiled
+    node arrays uncompressed, they are memory-mapped read only, so loading
+    needs neither scikit-learn nor the pickle and every process scoring with
+    the model shares the same pages.
+
+    Args:
+        model_path {Path} -- path of the pickled forest
+    '''
+    cache_path = model_path.with_suffix(".compiled.joblib")
+
+    if cache_path.exists() and cache_path.stat().st_mtime >= model_path.stat().st_mtime:
+        try:
+            return load_compiled(cache_path, mmap_mode="r")
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable model cache {cache_path}: {e}")
+
+    ensemble = compile_random_forest(load_rf_model(model_path))
+
+    try:
+        # write to a temporary file first so another process never maps a partial cache
+        temp_path = cache_path.with_suffix(f".{os.getpid()}.joblib")
+        save_compiled(ensemble, temp_path)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Failed to write the model cache {cache_path}: {e}")
+        return ensemble
+
+    # map the cache rather than keeping this process' private copy of the arrays
+    return load_compiled(cache_path, mmap_mode="r")
+
+
+class LoadedModel:
+    '''A loaded model along with the features and labels it was trained with.
+
+    predict() always takes the MLManager's 8 feature rows and returns integer
+    labels, the models trained on 7 features get the age column dropped and
+    the models trained on string labels (e.g. 'high', 'low', 'normal') get
+    their labels mapped to their index in the sorted classes, which lines up
+    with the integer labels of the XGBoost models.
+    '''
+    def __init__(self, key, estimator, load_seconds=0.0, backend="library"):
+        '''Constructor for the LoadedModel
+
+        Args:
+            key {tuple} -- (model type, binary) the model is registered under
+            estimator -- the XGBoost or scikit-learn classifier, or its CompiledEnsemble
+            load_seconds {float} -- time it took to load the model
+            backend {str} -- 'library' or 'compiled'
+        '''
+        self.key = key
+        self.model_type, self.binary = key
+        self.estimator = estimator
+        self.backend = backend
+        self.load_seconds = load_seconds
+        self.n_features = int(getattr(estimator, "n_features_in_", FEATURE_COUNT))
+
+        classes = getattr(estimator, "classes_", None)
+        self._classes = classes if classes is not None and np.asarray(classes).dtype.kind not in "iu" else None
+
+
+    def predict(self, features):
+        '''Predicts the integer label of every row
+
+        Args:
+            features {np.ndarray} -- (n, 8) feature matrix built by the MLManager
+
+        Returns:
+            labels {np.ndarray} -- one integer label per row
+        '''
+        if self.n_features < features.shape[1]:
+            features = np.delete(features, AGE_COLUMN, axis=1)
+
+        labels = self.estimator.predict(features)
+        if self._classes is not None:
+            labels = np.searchsorted(self._classes, labels)
+
+        return np.asarray(labels).astype(np.int64).ravel()
+
+
+    def predict_proba(self, features):
+        '''Predicts the probability of every class for every row
+
+        Args:
+            features {np.ndarray} -- (n, 8) feature matrix built by the MLManager
+
+        Returns:
+            proba {np.ndarray} -- (n, n_classes) probabilities, column i is the probability of integer label i
+        '''
+        if self.n_features < features.shape[1]:
+            features = np.delete(features, AGE_COLUMN, axis=1)
+
+        # both libraries order the columns by the sorted classes, which is the integer label order
+        return np.asarray(self.estimator.predict_proba(features))
+
+
+    def __repr__(self):
+        return f"LoadedModel({self.model_type}, binary={self.binary}, backend={self.backend})"
+
+
+class ModelRegistry:
+    '''Bounded in-memory registry of loaded models with least recently used eviction.
+
+    Models are loaded the first time they are requested and kept until
+    capacity other models have been requested since. With the compiled
+    backend every model is compiled into a CompiledEnsemble, which predicts
+    exactly what the library would with a fraction of the per call overhead.
+    XGBoost models are read without importing xgboost and random forests are
+    memory-mapped from a compiled cache (see load_compiled_rf()).
+
+    Evicting a model only drops the registry's reference, anything still
+    holding it (e.g. the MLManager's active or shadow model) keeps it alive.
+
+    Methods:
+        get(model_type, binary) -- returns the model, loading it if it is not in the registry
+        loaded() -- returns the keys of the loaded models, least recently used first
+        evict(model_type, binary) -- drops a model from the registry
+    '''
+    def __init__(self, model_dir, capacity=2, backend="library"):
+        '''Constructor for the ModelRegistry
+
+        Args:
+            model_dir {str or Path} -- directory holding the model files
+            capacity {int} -- maximum number of models kept loaded
+            backend {str} -- 'library' predicts with XGBoost/scikit-learn, 'compiled' with a CompiledEnsemble
+        '''
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported inference backend: {backend}")
+
+        self.model_dir = Path(model_dir)
+        self.capacity = capacity
+        self.backend = backend
+        self._models = OrderedDict()
+        self._lock = Lock()
+        # one lock per key, held while that model is loaded
+        self._loading = {}
+
+
+    def get(self, model_type, binary=False):
+        '''Returns a model, loading it and evicting the least recently used model if needed
+
+        Raises:
+            FileNotFoundError -- if there is no such model
+        '''
+        key = (model_type.lower(), bool(binary))
+
+        model = self._lookup(key)
+        if model is not None:
+            return model
+
+        # load outside the registry lock so loading one model does not block
+        # requests for the others, the key's lock stops it being loaded twice
+        with self._lock:
+            loading = self._loading.setdefault(key, Lock())
+
+        with loading:
+            model = self._lookup(key)
+            if model is not None:
+                return model
+
+            model = self._load(key)
+            with self._lock:
+                self._models[key] = model
+                while len(self._models) > self.capacity:
+                    evicted, _ = self._models.popitem(last=False)
+                    print(f"Evicted the {evicted[0]} model (binary={evicted[1]}) from the model registry")
+
+            return model
+
+
+    def _lookup(self, key):
+        '''Returns a loaded model and marks it as the most recently used, None if it is not loaded'''
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+            return model
+
+
+    def _load(self, key):
+        '''Loads the model file of a key'''
+        if key not in MODEL_FILES:
+            raise FileNotFoundError(f"{key[0]} file not found")
+
+        model_path = self.model_dir / MODEL_FILES[key]
+        if not model_path.exists():
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        started = time.perf_counter()
+        if self.backend == "compiled":
+            estimator = compile_xgboost(model_path) if key[0] == "xgb" else load_compiled_rf(model_path)
+        else:
+            estimator = load_xgb_model(model_path) if key[0] == "xgb" else load_rf_model(model_path)
+
+        return LoadedModel(key, estimator, time.perf_counter() - started, self.backend)
+
+
+    def loaded(self):
+        '''Returns the (model type, binary) keys of the loaded models, least recently used first'''
+        with self._lock:
+            return list(self._models)
+
+
+    def evict(self, model_type, binary=False):
+        '''Drops a model from the registry'''
+        with self._lock:
+            self._models.pop((model_type.lower(), bool(binary)), None)
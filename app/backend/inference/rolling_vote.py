@@ -0,0 +1,60 @@
+from collections import deque
+
+class RollingVote:
+    '''Majority vote over the last window predicted labels, updated as labels enter and leave the window.
+
+    The count of every class is kept up to date on every push, so reading the
+    majority is O(1) instead of recounting the whole window. A tie keeps the
+    current majority, the label only changes once another class has strictly
+    more votes, which stops the published prediction flapping between classes.
+
+    Methods:
+        push(label) -- adds a label, evicting the oldest once the window is full
+        extend(labels) -- pushes every label in order
+        majority() -- returns the majority label or None if nothing was pushed
+    '''
+    def __init__(self, window, classes):
+        '''Constructor for the RollingVote
+
+        Args:
+            window {int} -- number of labels voting, should match the size of the inference cache
+            classes {int} -- number of classes, labels are 0 to classes - 1
+        '''
+        self._labels = deque(maxlen=window)
+        self.counts = [0] * classes
+        self._majority = None
+
+
+    def __len__(self):
+        return len(self._labels)
+
+
+    def push(self, label):
+        '''Adds a label to the window, evicting the oldest label once the window is full'''
+        counts = self.counts
+        evicted = None
+        if len(self._labels) == self._labels.maxlen:
+            evicted = self._labels[0]
+            counts[evicted] -= 1
+
+        self._labels.append(label)
+        counts[label] += 1
+
+        if self._majority is None or counts[label] > counts[self._majority]:
+            self._majority = label
+        elif evicted == self._majority:
+            # the majority lost a vote, another class may have overtaken it
+            leader = max(range(len(counts)), key=counts.__getitem__)
+            if counts[leader] > counts[self._majority]:
+                self._majority = leader
+
+
+    def extend(self, labels):
+        '''Pushes every label in order'''
+        for label in labels:
+            self.push(int(label))
+
+
+    def majority(self):
+        '''Returns the majority label of the window or None if nothing was pushed'''
+        return self._majority
@@ -0,0 +1,112 @@
+from threading import Event, Lock, Thread
+
+class BatchScheduler:
+    '''Collects the patients with new samples and hands them out on a fixed tick.
+
+    Scoring every patient on their own pays the per call overhead of the model
+    once per patient. The scheduler instead marks a patient when a sample is
+    cached for them and calls on_tick every tick, which takes the marked
+    patients (take()) and scores all of their windows with a single model
+    call, so the cost per patient drops as the census grows.
+
+    A tick takes patients in the order they were marked, until their windows
+    add up to max_batch_size rows. Patients that did not fit stay marked, in
+    front of the patients marked after them, and are taken first next tick.
+
+    Methods:
+        start() -- starts calling on_tick every tick
+        stop() -- stops the tick thread
+        mark(patient_key) -- records that a patient has new samples
+        discard(patient_key) -- forgets a patient
+        take(window_size) -- returns the patients to score this tick
+        pending() -- returns the number of marked patients
+    '''
+    def __init__(self, on_tick, tick=1.0, max_batch_size=5000):
+        '''Constructor for the BatchScheduler
+
+        Args:
+            on_tick {callable} -- called with no arguments every tick there are marked patients, from the tick thread
+            tick {float} -- seconds between ticks
+            max_batch_size {int} -- maximum number of rows taken in a tick, a single window larger than it is still taken
+        '''
+        if tick <= 0 or max_batch_size <= 0:
+            raise ValueError("tick and max_batch_size must be positive")
+
+        self.tick = tick
+        self.max_batch_size = max_batch_size
+        self._on_tick = on_tick
+        # dicts keep their insertion order, so the oldest marked patient comes first
+        self._marked = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="ml-scheduler", daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            if self._marked:
+                try:
+                    self._on_tick()
+                except Exception as e:
+                    print(f"Batch inference tick failed: {e}")
+
+
+    def mark(self, patient_key):
+        '''Records that a patient has new samples, a patient already marked keeps their place'''
+        if patient_key not in self._marked:
+            with self._lock:
+                self._marked.setdefault(patient_key, None)
+
+
+    def discard(self, patient_key):
+        with self._lock:
+            self._marked.pop(patient_key, None)
+
+
+    def take(self, window_size):
+        '''Takes the patients to score this tick, oldest marked first, up to max_batch_size rows
+
+        Args:
+            window_size {callable} -- returns the number of rows a patient's window has
+
+        Returns:
+            patient_keys {list} -- the patients taken, they are no longer marked
+        '''
+        taken = []
+        rows = 0
+
+        with self._lock:
+            for patient_key in list(self._marked):
+                size = window_size(patient_key)
+                if taken and rows + size > self.max_batch_size:
+                    break
+
+                del self._marked[patient_key]
+                if size:
+                    taken.append(patient_key)
+                    rows += size
+
+        return taken
+
+
+    def pending(self):
+        '''Returns the number of patients marked and not taken yet'''
+        return len(self._marked)
@@ -0,0 +1,71 @@
+from threading import Lock
+
+import numpy as np
+
+from backend.metrics import LatencyHistogram
+
+class ShadowStats:
+    '''Latency and agreement of a shadow model scoring the same batches as the active model.
+
+    Methods:
+        record(active_labels, shadow_labels, active_seconds, shadow_seconds) -- records a batch scored by both models
+        record_dropped() -- records a batch the shadow model was too busy to score
+        record_error(error) -- records a batch the shadow model failed to score
+        snapshot() -- returns the counters, agreement and latency percentiles as a dict
+    '''
+    def __init__(self, active, shadow):
+        '''Constructor for the ShadowStats
+
+        Args:
+            active {tuple} -- (model type, binary) of the active model
+            shadow {tuple} -- (model type, binary) of the shadow model
+        '''
+        self.active = active
+        self.shadow = shadow
+        self._lock = Lock()
+        self.batches = 0
+        self.samples = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self._active_latency = LatencyHistogram()
+        self._shadow_latency = LatencyHistogram()
+
+
+    def record(self, active_labels, shadow_labels, active_seconds, shadow_seconds):
+        '''Records a batch scored by both models'''
+        with self._lock:
+            self.batches += 1
+            self.samples += len(active_labels)
+            self.agreed += int(np.count_nonzero(np.asarray(active_labels) == np.asarray(shadow_labels)))
+            self._active_latency.record(active_seconds)
+            self._shadow_latency.record(shadow_seconds)
+
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+
+    def record_error(self, error):
+        with self._lock:
+            self.errors += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+
+
+    def snapshot(self):
+        '''Returns the counters, the fraction of samples both models agree on and their latencies per batch'''
+        with self._lock:
+            return {
+                "active": self.active,
+                "shadow": self.shadow,
+                "batches": self.batches,
+                "samples": self.samples,
+                "agreement": self.agreed / self.samples if self.samples else None,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "active_latency": self._active_latency.snapshot(),
+                "shadow_latency": self._shadow_latency.snapshot(),
+            }
@@ -0,0 +1,230 @@
+import json
+import time
+from threading import Lock
+
+from backend.metrics import LatencyHistogram
+
+class StageTimer:
+    '''Times the stages of a single inference request, see InferenceTelemetry.timer()'''
+    __slots__ = ("_telemetry", "kind", "started", "_last", "stages", "rows")
+
+    def __init__(self, telemetry, kind):
+        self._telemetry = telemetry
+        self.kind = kind
+        self.started = self._last = time.perf_counter()
+        self.stages = {}
+        self.rows = 0
+
+
+    def lap(self, stage, rows=None):
+        '''Ends a stage, the time since the previous lap (or the timer starting) is charged to it
+
+        Args:
+            stage {str} -- the stage that just ended, e.g. 'preprocess'
+            rows {int} -- number of rows the request scores, if the stage knows it
+        '''
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+        if rows is not None:
+            self.rows = rows
+
+
+    def finish(self, **fields):
+        '''Records the request, fields are added to its log line'''
+        self._telemetry._record(self, fields)
+
+
+class _NullTimer:
+    '''Stands in for a StageTimer while telemetry is disabled, every call does nothing'''
+    __slots__ = ()
+
+    def lap(self, stage, rows=None):
+        pass
+
+
+    def finish(self, **fields):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class InferenceTelemetry:
+    '''Thread safe stage timers and counters for the MLManager's inference paths.
+
+    Every inference request is timed stage by stage:
+        load -- the model was not loaded yet and was loaded inside the request
+        queued -- waiting on the inference worker
+        preprocess -- building or snapshotting the feature matrix
+        predict -- the model call, through the prediction memo
+        vote -- reducing the labels or probabilities to a prediction
+        post_process -- mapping the label to its label and suggested action
+    along with the number of rows it scored. Model loads and swaps are
+    counted separately with their load and warm-up times.
+
+    While disabled, timer() returns a shared do-nothing timer, so the cost to
+    the inference paths is a method call per stage. With log_lines every
+    request and model load is also logged as a single JSON line.
+
+    Methods:
+        timer(kind) -- returns the timer of a new request
+        record_load(model, load_seconds, warm_up_seconds, event) -- records a model load or swap
+        enable(log_lines) -- starts recording
+        disable() -- stops recording, the totals are kept
+        snapshot() -- returns the counters and stage latencies as a dict
+        summary() -- returns a one line summary for logging
+        reset() -- clears the counters and histograms
+    '''
+    STAGES = ("load", "queued", "preprocess", "predict", "vote", "post_process")
+
+    def __init__(self, enabled=False, log_lines=False, log=print):
+        '''Constructor for the InferenceTelemetry
+
+        Args:
+            enabled {bool} -- whether requests are recorded
+            log_lines {bool} -- whether every request and load is logged as a JSON line
+            log {callable} -- called with every log line
+        '''
+        self.enabled = enabled
+        self.log_lines = log_lines
+        self._log = log
+        self._lock = Lock()
+        self.reset()
+
+
+    def reset(self):
+        '''Clears the counters and histograms'''
+        with self._lock:
+            self._started = time.monotonic()
+            self._requests = {}
+            self._request_latency = {}
+            self._stages = {stage: LatencyHistogram() for stage in self.STAGES}
+            self._batch_sizes = {}
+            self._rows = 0
+            self._loads = {}
+            self._load_latency = LatencyHistogram()
+            self._last_load = None
+
+
+    def enable(self, log_lines=None):
+        if log_lines is not None:
+            self.log_lines = log_lines
+        self.enabled = True
+
+
+    def disable(self):
+        self.enabled = False
+
+
+    def timer(self, kind):
+        '''Returns the timer of a new request, it starts timing immediately
+
+        Args:
+            kind {str} -- the inference path, e.g. 'predict', 'batched', 'continuous' or 'tick'
+        '''
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, kind)
+
+
+    @staticmethod
+    def _batch_bucket(rows):
+        '''Power of two bucket of a batch size, e.g. 100 -> '64-127\''''
+        if rows <= 1:
+            return str(rows)
+        low = 1 << (rows.bit_length() - 1)
+        return f"{low}-{2 * low - 1}"
+
+
+    def _record(self, timer, fields):
+        '''Records a finished request'''
+        total = time.perf_counter() - timer.started
+
+        with self._lock:
+            self._requests[timer.kind] = self._requests.get(timer.kind, 0) + 1
+            latency = self._request_latency.get(timer.kind)
+            if latency is None:
+                latency = self._request_latency[timer.kind] = LatencyHistogram()
+            latency.record(total)
+
+            for stage, seconds in timer.stages.items():
+                histogram = self._stages.get(stage)
+                if histogram is None:
+                    histogram = self._stages[stage] = LatencyHistogram()
+                histogram.record(seconds)
+
+            self._rows += timer.rows
+            bucket = self._batch_bucket(timer.rows)
+            self._batch_sizes[bucket] = self._batch_sizes.get(bucket, 0) + 1
+
+        if self.log_lines:
+            self._log(json.dumps({
+                "event": "inference",
+                "kind": timer.kind,
+                "rows": timer.rows,
+                "total_ms": round(total * 1e3, 3),
+                "stages_ms": {stage: round(seconds * 1e3, 3) for stage, seconds in timer.stages.items()},
+                **fields,
+            }, default=str))
+
+
+    def record_load(self, model, load_seconds, warm_up_seconds, event="load"):
+        '''Records a model being loaded (or swapped in) and warmed up
+
+        Args:
+            model {tuple} -- (model type, binary) of the model
+            load_seconds {float} -- time spent loading the model
+            warm_up_seconds {float} -- time spent on the first prediction
+            event {str} -- 'load', 'swap' or 'shadow'
+        '''
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._loads[event] = self._loads.get(event, 0) + 1
+            self._load_latency.record(load_seconds + warm_up_seconds)
+            self._last_load = {"event": event, "model": model, "load_seconds": load_seconds, "warm_up_seconds": warm_up_seconds}
+
+        if self.log_lines:
+            self._log(json.dumps({
+                "event": "model_load",
+                "load_event": event,
+                "model": model,
+                "load_ms": round(load_seconds * 1e3, 3),
+                "warm_up_ms": round(warm_up_seconds * 1e3, 3),
+            }, default=str))
+
+
+    def snapshot(self):
+        '''Returns the request and row counters, batch sizes, per stage and per request latencies and loads'''
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {
+                "enabled": self.enabled,
+                "seconds": elapsed,
+                "requests": dict(self._requests),
+                "rows": self._rows,
+                "rows_per_sec": self._rows / elapsed,
+                "batch_sizes": dict(self._batch_sizes),
+                "stages": {stage: histogram.snapshot() for stage, histogram in self._stages.items()},
+                "request_latency": {kind: histogram.snapshot() for kind, histogram in self._request_latency.items()},
+                "loads": dict(self._loads),
+                "load_latency": self._load_latency.snapshot(),
+                "last_load": dict(self._last_load) if self._last_load else None,
+            }
+
+
+    def summary(self):
+        '''Returns a one line summary of the inference telemetry for logging'''
+        snapshot = self.snapshot()
+        stages = ", ".join(
+            f"{stage} p50 {latency['p50_ms']:.3f} ms p99 {latency['p99_ms']:.3f} ms"
+            for stage, latency in snapshot["stages"].items() if latency["count"]
+        )
+        return (
+            f"inference: {sum(snapshot['requests'].values())} requests, "
+            f"{snapshot['rows_per_sec']:.1f} rows/s, "
+            f"{sum(snapshot['loads'].values())} loads"
+            + (f", {stages}" if stages else "")
+        )
@@ -0,0 +1,114 @@
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+
+class InferenceWorker:
+    '''A dedicated thread running inference requests off the GUI thread, one at a time and in order.
+
+    Every request returns a concurrent.futures.Future. A request can be given
+    a coalesce key, queuing a request with the same key as one that has not
+    started yet cancels the older one, so repeated clicks or a fast stream of
+    samples never build up a backlog of stale work. Requests that have started
+    always run to completion.
+
+    Methods:
+        submit(fn, *args, key=None, **kwargs) -- queues fn(*args, **kwargs) and returns its future
+        pending() -- returns the number of requests waiting to run
+        shutdown(wait, cancel_pending) -- stops the worker thread
+    '''
+    def __init__(self, name="inference-worker"):
+        '''Constructor for the InferenceWorker, the thread is started on the first request
+
+        Args:
+            name {str} -- name of the worker thread
+        '''
+        self.name = name
+        self._requests = deque()
+        self._latest = {} # coalesce key to the future of the pending request with that key
+        self._condition = Condition()
+        self._thread = None
+        self._shutdown = False
+
+
+    def submit(self, fn, *args, key=None, **kwargs):
+        '''Queues a request to run on the worker thread
+
+        Args:
+            fn {callable} -- the function to run
+            key {hashable} -- coalesce key, a pending request with the same key is cancelled
+
+        Returns:
+            future {Future} -- resolves to the return value of fn, or is cancelled if superseded
+        '''
+        future = Future()
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot submit inference requests after shutdown")
+
+            if key is not None:
+                stale = self._latest.get(key)
+                if stale is not None:
+                    stale.cancel()
+                self._latest[key] = future
+
+            self._requests.append((future, key, fn, args, kwargs))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+        return future
+
+
+    def pending(self):
+        '''Returns the number of requests that have not started, including cancelled ones not yet discarded'''
+        with self._condition:
+            return len(self._requests)
+
+
+    def _run(self):
+        '''Runs requests until the worker is shut down'''
+        while True:
+            with self._condition:
+                while not self._requests and not self._shutdown:
+                    self._condition.wait()
+
+                if not self._requests:
+                    return
+
+                future, key, fn, args, kwargs = self._requests.popleft()
+                if key is not None and self._latest.get(key) is future:
+                    del self._latest[key]
+
+            # a cancelled request is skipped, otherwise it can no longer be cancelled
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+    def shutdown(self, wait=True, cancel_pending=True):
+        '''Stops the worker thread
+
+        Args:
+            wait {bool} -- wait for the running request to finish
+            cancel_pending {bool} -- cancel requests that have not started instead of running them
+        '''
+        with self._condition:
+            self._shutdown = True
+            if cancel_pending:
+                for future, *_ in self._requests:
+                    future.cancel()
+                self._requests.clear()
+                self._latest.clear()
+            self._condition.notify_all()
+            thread = self._thread
+
+        if wait and thread is not None:
+            thread.join()
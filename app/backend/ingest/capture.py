@@ -0,0 +1,184 @@
+import mmap
+import time
+import struct
+from pathlib import Path
+from threading import Lock
+
+# file layout:
+#   8 byte magic
+#   records, each a 16 byte little endian header (received_at float64, connection id uint32,
+#   frame length uint32) followed by the raw DER frame
+# every time the file is opened for writing a session marker is written, a header with
+# connection id 0 and no frame, connection ids restart at 1 in every session
+MAGIC = b"FSCAP\x00\x01\x00"
+RECORD_HEADER = struct.Struct("<dII")
+SESSION_MARKER = 0
+
+
+class CaptureWriter:
+    '''Appends raw framed vitals messages with their receive timestamps to a capture file.
+
+    The file is a flat sequence of fixed size headers and frames, so it can be
+    memory-mapped and replayed (see vitals_agent/replay.py) or scored offline
+    without decoding anything up front. Writes are buffered and safe to call
+    from several connection threads.
+
+    Opening an existing capture appends to it. Every writer starts a new
+    session with a marker record, connection ids are only unique within a
+    session and the gap between two sessions is not part of either.
+
+    Methods:
+        write(connection_id, received_at, frames) -- appends the frames of a single read
+        close() -- flushes and closes the file
+    '''
+    def __init__(self, path):
+        '''Constructor for the CaptureWriter, appends to the file if it already exists
+
+        Args:
+            path {str or Path} -- path of the capture file
+        '''
+        self.path = Path(path)
+        self._lock = Lock()
+        self._file = open(self.path, "ab")
+
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._file.write(RECORD_HEADER.pack(time.time(), SESSION_MARKER, 0))
+        self.records = 0
+
+
+    def write(self, connection_id, received_at, frames):
+        '''Appends every frame received in a single read
+
+        Args:
+            connection_id {int} -- the connection the frames were received on
+            received_at {float} -- unix timestamp of the read
+            frames {List[bytes or memoryview]} -- complete DER frames
+        '''
+        chunks = []
+        for frame in frames:
+            chunks.append(RECORD_HEADER.pack(received_at, connection_id, len(frame)))
+            chunks.append(frame)
+
+        with self._lock:
+            # connections can still be closing after the server stopped
+            if self._file.closed:
+                return
+
+            self._file.write(b"".join(chunks))
+            self.records += len(frames)
+
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class CaptureReader:
+    '''Memory-maps a capture file and iterates over its records without copying the frames.
+
+    A record cut short at the end of the file (e.g. the app was killed while
+    writing) is ignored. Iterating yields the records of every session in the
+    order they were written, records() also yields the session of each record
+    and sessions() groups them.
+
+    Usage:
+        with CaptureReader(path) as capture:
+            for received_at, connection_id, frame in capture:
+                ...
+    '''
+    def __init__(self, path):
+        '''Constructor for the CaptureReader
+
+        Args:
+            path {str or Path} -- path of the capture file
+
+        Raises:
+            ValueError -- if the file is not a capture file
+        '''
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        size = self.path.stat().st_size
+
+        if size < len(MAGIC):
+            self._file.close()
+            raise ValueError(f"{self.path} is not a vitals capture file")
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a vitals capture file")
+
+        self._view = memoryview(self._map)
+
+
+    def __iter__(self):
+        for _, received_at, connection_id, frame in self.records():
+            yield received_at, connection_id, frame
+
+
+    def records(self):
+        '''Yields (session, received_at, connection id, frame) of every record, sessions are numbered from 0'''
+        view = self._view
+        size = len(view)
+        offset = len(MAGIC)
+        header_size = RECORD_HEADER.size
+        session = 0
+        # captures written before session markers hold a single session without one
+        empty = True
+
+        while offset + header_size <= size:
+            received_at, connection_id, length = RECORD_HEADER.unpack_from(view, offset)
+            start = offset + header_size
+            end = start + length
+            if end > size:
+                break
+            offset = end
+
+            if connection_id == SESSION_MARKER:
+                # a session without any records does not count
+                if not empty:
+                    session += 1
+                    empty = True
+                continue
+
+            empty = False
+            yield session, received_at, connection_id, view[start:end]
+
+
+    def sessions(self):
+        '''Returns the records of every session, a list of (received_at, connection id, frame) lists'''
+        sessions = []
+        for session, received_at, connection_id, frame in self.records():
+            if session == len(sessions):
+                sessions.append([])
+            sessions[session].append((received_at, connection_id, frame))
+        return sessions
+
+
+    def close(self):
+        '''Releases the memory map, frames yielded by the reader must not be used afterwards'''
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        try:
+            self._map.close()
+        except BufferError:
+            # frames are still referenced, the map is released once they are garbage collected
+            pass
+        self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,121 @@
+from pyasn1.codec.ber.decoder import decode
+
+from vitals_data_models import VitalSigns
+
+# the order the observations are encoded in, this must match the VitalSigns schema
+VITAL_FIELDS = tuple(VitalSigns.componentType.getNameByPosition(idx) for idx in range(len(VitalSigns.componentType)))
+
+SEQUENCE_TAG = 0x30
+INTEGER_TAG = 0x02
+
+
+def fast_decode(frame):
+    '''Decodes a DER encoded VitalSigns frame without building a pyasn1 object tree.
+
+    The schema is fixed, a SEQUENCE of six NumericObservation SEQUENCEs which
+    each hold three INTEGERs (mdcCode, unitCode, value). This walks the tag and
+    length octets directly over a memoryview and pulls the 18 integers out
+    without copying the frame. Anything that does not match the schema
+    exactly returns None so the caller can fall back to the generic decoder.
+
+    Args:
+        frame {bytes or memoryview} -- a single complete DER frame
+
+    Returns:
+        integers {tuple or None} -- (mdcCode, unitCode, value) for each observation, flattened, in schema order
+    '''
+    view = memoryview(frame)
+    size = len(view)
+
+    pos, end = _read_header(view, 0, size, SEQUENCE_TAG)
+    if pos < 0 or end != size:
+        return None
+
+    integers = []
+    for _ in range(len(VITAL_FIELDS)):
+        pos, observation_end = _read_header(view, pos, end, SEQUENCE_TAG)
+        if pos < 0:
+            return None
+
+        for _ in range(3):
+            pos, integer_end = _read_header(view, pos, observation_end, INTEGER_TAG)
+            if pos < 0 or integer_end == pos:
+                return None
+
+            if integer_end - pos == 1:
+                # nearly every value fits in a single octet, avoid int.from_bytes
+                octet = view[pos]
+                integers.append(octet - 256 if octet & 0x80 else octet)
+            else:
+                integers.append(int.from_bytes(view[pos:integer_end], "big", signed=True))
+            pos = integer_end
+
+        if pos != observation_end:
+            return None
+
+    if pos != end:
+        return None
+
+    return tuple(integers)
+
+
+def _read_header(view, pos, limit, tag):
+    '''Reads the tag and length octets at pos
+
+    Returns:
+        (content start, content end) -- (-1, -1) if the tag or length is not what we expect
+    '''
+    if pos + 2 > limit or view[pos] != tag:
+        return -1, -1
+
+    length = view[pos + 1]
+    pos += 2
+
+    # long form length, the low bits hold the number of length octets
+    if length & 0x80:
+        octets = length & 0x7F
+        if octets == 0 or octets > 4 or pos + octets > limit:
+            return -1, -1
+
+        length = int.from_bytes(view[pos:pos + octets], "big")
+        pos += octets
+
+    if pos + length > limit:
+        return -1, -1
+
+    return pos, pos + length
+
+
+def generic_decode(frame):
+    '''Decodes a VitalSigns frame with the pyasn1 decoder
+
+    Returns:
+        integers {tuple} -- same layout as fast_decode()
+    '''
+    decoded_data, _ = decode(bytes(frame), VitalSigns())
+
+    integers = []
+    for field in VITAL_FIELDS:
+        observation = decoded_data[field]
+        integers.extend((int(observation['mdcCode']), int(observation['unitCode']), int(observation['value'])))
+
+    return tuple(integers)
+
+
+def decode_vitals(frame):
+    '''Decodes a VitalSigns frame, using the fast path and falling back to pyasn1 on anything unexpected
+
+    Args:
+        frame {bytes or memoryview} -- a single complete DER frame
+
+    Returns:
+        integers {tuple} -- (mdcCode, unitCode, value) for each observation, flattened, in schema order
+
+    Raises:
+        pyasn1.error.PyAsn1Error -- if the frame can not be decoded by either decoder
+    '''
+    integers = fast_decode(frame)
+    if integers is None:
+        integers = generic_decode(frame)
+
+    return integers
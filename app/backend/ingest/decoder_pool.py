@@ -0,0 +1,269 @@
+import os
+import time
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from backend.ingest.framing import FrameBuffer
+from backend.ingest.decoder import VITAL_FIELDS, decode_vitals
+
+# a decoded frame as it is handed back to the VitalsManager, values are in VITAL_FIELDS order
+RESULT_DTYPE = np.dtype([
+    ("connection_id", "<u4"),
+    ("status", "<u4"),
+    ("received_at", "<f8"),
+    ("read_at", "<f8"),
+    ("decode_seconds", "<f8"),
+    ("values", "<i4", (len(VITAL_FIELDS),)),
+])
+
+DECODED = 0
+FAILED = 1 # the frame could not be decoded
+CLOSED = 2 # the connection closed, every frame it sent was handed back before this record
+
+
+class SampleRing:
+    '''Single producer, single consumer ring of decoded frames in shared memory.
+
+    The ring is a 64 byte header holding the head and tail counters followed by
+    capacity RESULT_DTYPE records. Only the producer (a decoder process) writes
+    the records and the head, only the consumer (the VitalsManager) writes the
+    tail, so no lock is needed. The counters only ever grow, the slot of a
+    record is its counter modulo the capacity.
+
+    Methods:
+        put(records) -- appends records, waits for space if the ring is full
+        drain() -- returns a copy of every record not yet consumed
+        close() -- detaches from the shared memory, the creator also frees it
+    '''
+    HEADER_SIZE = 64
+
+    def __init__(self, capacity=65536, name=None):
+        '''Constructor for the SampleRing
+
+        Args:
+            capacity {int} -- number of records the ring holds
+            name {str} -- name of an existing ring to attach to, a new ring is created by default
+        '''
+        self.capacity = capacity
+        self._owner = name is None
+        self._shm = SharedMemory(name=name, create=self._owner, size=self.HEADER_SIZE + capacity * RESULT_DTYPE.itemsize)
+        self.name = self._shm.name
+
+        # head is the number of records ever written, tail the number ever consumed
+        self._counters = np.ndarray((2,), dtype=np.uint64, buffer=self._shm.buf)
+        self._records = np.ndarray((capacity,), dtype=RESULT_DTYPE, buffer=self._shm.buf, offset=self.HEADER_SIZE)
+        if self._owner:
+            self._counters[:] = 0
+
+
+    def __len__(self):
+        return int(self._counters[0] - self._counters[1])
+
+
+    def put(self, records):
+        '''Appends records to the ring, only called by the producer
+
+        Args:
+            records {np.ndarray} -- RESULT_DTYPE records, at most capacity of them
+        '''
+        count = len(records)
+        head = int(self._counters[0])
+
+        # the consumer is behind, wait for it to make room
+        while head + count - int(self._counters[1]) > self.capacity:
+            time.sleep(0.0005)
+
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        self._records[start:start + first] = records[:first]
+        self._records[:count - first] = records[first:]
+
+        # publish the records only once they are written
+        self._counters[0] = head + count
+
+
+    def drain(self):
+        '''Returns a copy of every record written since the last drain, only called by the consumer'''
+        head = int(self._counters[0])
+        tail = int(self._counters[1])
+        if head == tail:
+            return self._records[:0].copy()
+
+        start = tail % self.capacity
+        end = head % self.capacity
+        if start < end:
+            records = self._records[start:end].copy()
+        else:
+            records = np.concatenate((self._records[start:], self._records[:end]))
+
+        self._counters[1] = head
+        return records
+
+
+    def close(self):
+        '''Detaches from the shared memory, the ring that created it also frees it'''
+        # the numpy views must be released before the memory can be closed
+        self._counters = None
+        self._records = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _decode_frames(inbox, ring_name, capacity, doorbell):
+    '''Entry point of a decoder process
+
+    Takes (connection_id, received_at, read_at, frames) batches off the inbox,
+    decodes the frames and writes one record per frame to its ring. frames is
+    None once the connection closed and None instead of a batch stops the
+    process.
+    '''
+    ring = SampleRing(capacity, name=ring_name)
+    empty = (0,) * len(VITAL_FIELDS)
+
+    try:
+        while True:
+            batch = inbox.get()
+            if batch is None:
+                break
+
+            connection_id, received_at, read_at, frames = batch
+            if frames is None:
+                ring.put(np.array([(connection_id, CLOSED, received_at, read_at, 0.0, empty)], dtype=RESULT_DTYPE))
+                doorbell.release()
+                continue
+
+            # the frames are complete, they were concatenated by the VitalsManager to send them in one piece
+            records = []
+            for frame in FrameBuffer().feed(frames):
+                started = time.perf_counter()
+                try:
+                    integers = decode_vitals(frame)
+                    status, values = DECODED, integers[2::3]
+                except Exception:
+                    status, values = FAILED, empty
+
+                records.append((connection_id, status, received_at, read_at, time.perf_counter() - started, values))
+
+            for start in range(0, len(records), capacity):
+                ring.put(np.array(records[start:start + capacity], dtype=RESULT_DTYPE))
+            doorbell.release()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class DecoderPool:
+    '''Pool of decoder processes, the frames of a connection are always decoded by the same process.
+
+    Decoding is CPU bound and the GIL serializes it across threads, so with
+    many devices it competes with the Qt event loop. The pool moves it out of
+    the app process. Frames are sharded by connection id, which keeps the
+    frames of a connection in order, and every process hands its decoded frames
+    back through its own SampleRing in shared memory instead of pickling them.
+    A shared semaphore is released whenever a ring is written so the consumer
+    does not need to poll.
+
+    Methods:
+        start() -- starts the decoder processes
+        submit(connection_id, received_at, read_at, frames) -- sends the frames of a single read to be decoded
+        close_connection(connection_id) -- marks the end of a connection once its frames are decoded
+        drain(timeout) -- waits for and returns the decoded records
+        stop() -- stops the decoder processes and frees the rings
+    '''
+    def __init__(self, processes=None, ring_capacity=65536):
+        '''Constructor for the DecoderPool
+
+        Args:
+            processes {int} -- number of decoder processes, defaults to one less than the number of cores
+            ring_capacity {int} -- number of records each process can hand back before it has to wait
+        '''
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+        self.ring_capacity = ring_capacity
+        self._context = multiprocessing.get_context("spawn")
+        self._inboxes = []
+        self._rings = []
+        self._workers = []
+        self._doorbell = None
+
+
+    def start(self):
+        '''Starts the decoder processes'''
+        self._doorbell = self._context.Semaphore(0)
+
+        for index in range(self.processes):
+            inbox = self._context.Queue()
+            ring = SampleRing(self.ring_capacity)
+            worker = self._context.Process(
+                target=_decode_frames,
+                args=(inbox, ring.name, self.ring_capacity, self._doorbell),
+                name=f"vitals-decoder-{index}",
+                daemon=True,
+            )
+            worker.start()
+
+            self._inboxes.append(inbox)
+            self._rings.append(ring)
+            self._workers.append(worker)
+
+
+    def submit(self, connection_id, received_at, read_at, frames):
+        '''Sends the complete frames of a single read to the process decoding the connection
+
+        Args:
+            connection_id {int} -- the connection the frames were read from
+            received_at {float} -- unix timestamp of the read
+            read_at {float} -- perf_counter of the read, handed back untouched to measure latency
+            frames {List[bytes or memoryview]} -- complete DER frames
+        '''
+        self._inboxes[connection_id % self.processes].put((connection_id, received_at, read_at, b"".join(frames)))
+
+
+    def close_connection(self, connection_id):
+        '''Queues a CLOSED record for the connection behind its remaining frames'''
+        self._inboxes[connection_id % self.processes].put((connection_id, 0.0, 0.0, None))
+
+
+    def drain(self, timeout=0.1):
+        '''Waits for a ring to be written and returns every record available
+
+        Args:
+            timeout {float} -- seconds to wait for a decoder process
+
+        Returns:
+            records {List[np.ndarray]} -- the RESULT_DTYPE records of each ring that had any
+        '''
+        self._doorbell.acquire(timeout=timeout)
+        batches = []
+        for ring in self._rings:
+            records = ring.drain()
+            if len(records):
+                batches.append(records)
+        return batches
+
+
+    def stop(self, timeout=5):
+        '''Stops the decoder processes once their queued frames are decoded
+
+        Returns:
+            records {List[np.ndarray]} -- records decoded but not yet drained
+        '''
+        for inbox in self._inboxes:
+            inbox.put(None)
+
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+
+        batches = [records for records in (ring.drain() for ring in self._rings) if len(records)]
+        for ring in self._rings:
+            ring.close()
+        for inbox in self._inboxes:
+            inbox.close()
+
+        self._inboxes, self._rings, self._workers = [], [], []
+        return batches
@@ -0,0 +1,118 @@
+class FrameBuffer:
+    '''Reassembles DER encoded messages from a TCP byte stream.
+
+    TCP does not preserve message boundaries, a single recv() can hold several
+    messages or only part of one. Every VitalSigns message is a DER SEQUENCE,
+    so the tag and length octets at the start of each message tell us exactly
+    how many bytes belong to it. Complete messages are returned from feed(),
+    a partial message at the end of the buffer is kept until the next read.
+
+    Bytes that cannot start a message (wrong tag, indefinite or oversized
+    length) are skipped until the next SEQUENCE tag and counted as malformed.
+
+    Attributes:
+        frames {int} -- number of complete frames returned so far
+        malformed {int} -- number of malformed frames skipped so far
+
+    Methods:
+        feed(data) -- adds received bytes and returns every complete frame
+    '''
+    SEQUENCE_TAG = 0x30
+
+    def __init__(self, max_frame_size=4096):
+        '''Constructor for the FrameBuffer
+
+        Args:
+            max_frame_size {int} -- frames declaring a larger length are treated as malformed
+        '''
+        self._max_frame_size = max_frame_size
+        self._tail = b""
+        self.frames = 0
+        self.malformed = 0
+
+
+    @property
+    def pending(self):
+        '''Number of buffered bytes waiting for the rest of their frame'''
+        return len(self._tail)
+
+
+    def feed(self, data):
+        '''Adds received bytes to the buffer and returns every complete frame
+
+        Args:
+            data {bytes} -- bytes received from the socket
+
+        Returns:
+            frames {List[memoryview]} -- complete DER frames, views over an immutable buffer
+        '''
+        buffer = self._tail + data if self._tail else bytes(data)
+        view = memoryview(buffer)
+        size = len(buffer)
+        frames = []
+        offset = 0
+
+        while offset < size:
+            if buffer[offset] != self.SEQUENCE_TAG:
+                offset = self._resync(buffer, offset)
+                continue
+
+            header = self._read_header(buffer, offset, size)
+            if header is None:
+                # the length octets have not all arrived yet
+                break
+
+            if header == -1:
+                offset = self._resync(buffer, offset)
+                continue
+
+            header_size, body_size = header
+            end = offset + header_size + body_size
+            if end > size:
+                # partial frame, wait for the rest of it
+                break
+
+            frames.append(view[offset:end])
+            offset = end
+
+        self._tail = buffer[offset:]
+        self.frames += len(frames)
+        return frames
+
+
+    def _read_header(self, buffer, offset, size):
+        '''Reads the tag and length octets of the frame starting at offset
+
+        Returns:
+            header {tuple or int or None} -- (header size, body size), -1 if malformed or None if incomplete
+        '''
+        if offset + 1 >= size:
+            return None
+
+        first = buffer[offset + 1]
+
+        # short form, the length fits in the first octet
+        if first < 0x80:
+            return 2, first
+
+        # long form, the first octet holds the number of length octets. 0x80
+        # is the BER indefinite length which DER does not allow
+        octets = first & 0x7F
+        if octets == 0 or octets > 4:
+            return -1
+
+        if offset + 2 + octets > size:
+            return None
+
+        body_size = int.from_bytes(buffer[offset + 2:offset + 2 + octets], "big")
+        if body_size > self._max_frame_size:
+            return -1
+
+        return 2 + octets, body_size
+
+
+    def _resync(self, buffer, offset):
+        '''Skips to the next byte that could start a frame, counting the skipped bytes as one malformed frame'''
+        self.malformed += 1
+        next_offset = buffer.find(bytes([self.SEQUENCE_TAG]), offset + 1)
+        return len(buffer) if next_offset == -1 else next_offset
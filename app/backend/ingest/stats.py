@@ -0,0 +1,193 @@
+import time
+from threading import Lock
+
+from backend.metrics import LatencyHistogram
+
+class ConnectionStats:
+    '''Counters for a single device connection'''
+    __slots__ = ("peer", "connected_at", "messages", "bytes", "reads", "decode_failures", "framing_errors", "last_error")
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.connected_at = time.monotonic()
+        self.messages = 0
+        self.bytes = 0
+        self.reads = 0
+        self.decode_failures = 0
+        self.framing_errors = 0
+        self.last_error = None
+
+
+    def snapshot(self):
+        '''Returns the counters and rates of the connection as a dict'''
+        elapsed = max(time.monotonic() - self.connected_at, 1e-9)
+        return {
+            "peer": self.peer,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "reads": self.reads,
+            "malformed": self.decode_failures + self.framing_errors,
+            "decode_failures": self.decode_failures,
+            "framing_errors": self.framing_errors,
+            "last_error": self.last_error,
+            "seconds": elapsed,
+            "messages_per_sec": self.messages / elapsed,
+            "bytes_per_sec": self.bytes / elapsed,
+        }
+
+
+class IngestStats:
+    '''Thread safe counters and latency histograms for the vitals ingest path.
+
+    Every read from a device is recorded once, with the number of frames it
+    held and the time spent in each stage:
+        framing -- splitting the received bytes into frames and capturing them
+        decode -- decoding the frames into VitalSamples
+        route -- storing, handing to the sinks and emitting to the frontend
+    recv_to_emit is measured once per read, from the moment the read returned
+    to the moment its last sample was routed, every sample of the read has
+    waited at most that long. It is recorded once per read, so a large read
+    does not outweigh the small ones.
+
+    Methods:
+        open_connection(connection_id, peer) -- starts tracking a connection
+        close_connection(connection_id) -- stops tracking a connection, returns its final snapshot
+        record_read(...) -- records a single read from a connection
+        record_decoded(...) -- records frames decoded by another process after their read was recorded
+        record_decode_failure(connection_id, error) -- records a frame that failed to decode
+        connections() -- returns a snapshot of every open connection
+        snapshot() -- returns a snapshot of everything
+        reset() -- clears the totals and histograms, open connections are kept
+    '''
+    STAGES = ("framing", "decode", "route")
+
+    def __init__(self):
+        self._lock = Lock()
+        self._connections = {}
+        self.reset()
+
+
+    def reset(self):
+        '''Clears the totals and histograms, open connections are kept'''
+        with self._lock:
+            self._started = time.monotonic()
+            self._totals = {"connections": 0, "messages": 0, "bytes": 0, "decode_failures": 0, "framing_errors": 0}
+            self._stage_seconds = dict.fromkeys(self.STAGES, 0.0)
+            self._decode_latency = LatencyHistogram()
+            self._recv_to_emit = LatencyHistogram()
+
+
+    def open_connection(self, connection_id, peer):
+        with self._lock:
+            self._connections[connection_id] = ConnectionStats(peer)
+            self._totals["connections"] += 1
+
+
+    def close_connection(self, connection_id):
+        '''Stops tracking a connection
+
+        Returns:
+            snapshot {dict or None} -- the final counters of the connection
+        '''
+        with self._lock:
+            stats = self._connections.pop(connection_id, None)
+            return stats.snapshot() if stats else None
+
+
+    def record_read(self, connection_id, nbytes, messages, framing_errors, framing_seconds, decode_seconds, route_seconds, recv_to_emit):
+        '''Records a single read from a connection
+
+        Args:
+            connection_id {int} -- the connection read from
+            nbytes {int} -- number of bytes read
+            messages {int} -- number of frames decoded from the read
+            framing_errors {int} -- total framing errors on the connection so far
+            framing_seconds, decode_seconds, route_seconds {float} -- time spent in each stage
+            recv_to_emit {float} -- seconds from the read returning to its last sample being routed, recorded once
+        '''
+        with self._lock:
+            stats = self._connections.get(connection_id)
+            if stats:
+                stats.reads += 1
+                stats.bytes += nbytes
+                stats.messages += messages
+                self._totals["framing_errors"] += framing_errors - stats.framing_errors
+                stats.framing_errors = framing_errors
+
+            self._totals["bytes"] += nbytes
+            self._totals["messages"] += messages
+            self._stage_seconds["framing"] += framing_seconds
+            self._stage_seconds["decode"] += decode_seconds
+            self._stage_seconds["route"] += route_seconds
+
+            if messages:
+                self._decode_latency.record(decode_seconds / messages, messages)
+                self._recv_to_emit.record(recv_to_emit)
+
+
+    def record_decoded(self, connection_id, messages, decode_seconds, route_seconds, recv_to_emit):
+        '''Records the frames of a read decoded outside of the read, the read itself is recorded with record_read(messages=0)
+
+        Args:
+            connection_id {int} -- the connection the frames were read from
+            messages {int} -- number of frames decoded
+            decode_seconds, route_seconds {float} -- time spent in each stage
+            recv_to_emit {float} -- seconds from the read returning to its last sample being routed, recorded once
+        '''
+        with self._lock:
+            stats = self._connections.get(connection_id)
+            if stats:
+                stats.messages += messages
+
+            self._totals["messages"] += messages
+            self._stage_seconds["decode"] += decode_seconds
+            self._stage_seconds["route"] += route_seconds
+
+            if messages:
+                self._decode_latency.record(decode_seconds / messages, messages)
+                self._recv_to_emit.record(recv_to_emit)
+
+
+    def record_decode_failure(self, connection_id, error):
+        '''Records a frame that could not be decoded'''
+        with self._lock:
+            self._totals["decode_failures"] += 1
+            stats = self._connections.get(connection_id)
+            if stats:
+                stats.decode_failures += 1
+                stats.last_error = f"{type(error).__name__}: {error}"
+
+
+    def connections(self):
+        '''Returns a snapshot of every open connection keyed by connection id'''
+        with self._lock:
+            return {connection_id: stats.snapshot() for connection_id, stats in self._connections.items()}
+
+
+    def snapshot(self):
+        '''Returns the totals, stage times, latency histograms and open connections as a dict'''
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {
+                "seconds": elapsed,
+                "open_connections": len(self._connections),
+                "totals": dict(self._totals),
+                "messages_per_sec": self._totals["messages"] / elapsed,
+                "bytes_per_sec": self._totals["bytes"] / elapsed,
+                "stage_seconds": dict(self._stage_seconds),
+                "decode_latency": self._decode_latency.snapshot(),
+                "recv_to_emit_latency": self._recv_to_emit.snapshot(),
+                "connections": {connection_id: stats.snapshot() for connection_id, stats in self._connections.items()},
+            }
+
+
+    def summary(self):
+        '''Returns a one line summary of the ingest stats for logging'''
+        snapshot = self.snapshot()
+        latency = snapshot["recv_to_emit_latency"]
+        return (
+            f"ingest: {snapshot['open_connections']} connections, "
+            f"{snapshot['messages_per_sec']:.1f} msg/s, "
+            f"{snapshot['totals']['decode_failures'] + snapshot['totals']['framing_errors']} malformed, "
+            f"recv-to-emit p50 {latency['p50_ms']:.3f} ms p99 {latency['p99_ms']:.3f} ms"
+        )
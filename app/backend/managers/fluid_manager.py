@@ -1,18 +1,30 @@
 from datetime import datetime
 
+from sqlalchemy import func, inspect
+
 from database_models import Fluid, FluidRecord
 
 class FluidManager:
     '''Fluid Manager class used for managing everything involving fluids and 
     fluid records with the database.
+
+    The totals administered to a patient are summed by the database, grouped
+    by fluid, the first time they are requested and then kept as running
+    totals that add_record() updates, so reading them does not depend on how
+    many records the patient has.
     
     Methods:
         get_all_fluids(): Returns a list of names of all fluids found in the db
         add_record(patient_id, fluid_name, amount_ml) - adds a fluidrecord to a patient
         get_total_fluid_volume(patient_id) - returns the total fluid volume administered to a patient
+        get_fluid_totals(patient) - returns the volume administered to a patient per fluid
+        forget_totals(patients) - drops the running totals of deleted patients
     '''
     def __init__(self, db_manager): 
         self._db = db_manager
+        # patient id -> total volume (mL) and patient id -> {fluid name: volume (mL)}
+        self._totals = {}
+        self._fluid_totals = {}
 
 
     def add_record(self, patient, fluid_name, amount_ml):
@@ -41,13 +53,18 @@ class FluidManager:
 
                 # create a new fluid record and assign it to the patient and fluid
                 new_fluid_record = FluidRecord(fluid_time_given=datetime.now(), amount_ml=amount_ml, fluid=fluid, patient=patient)
+                # the relationships' back_populates add the record to both collections,
+                # appending to them here would load every record of the fluid and the patient
                 db.add(new_fluid_record)
-
-                fluid.fluid_records.append(new_fluid_record)
-                patient.fluid_records.append(new_fluid_record)
-
                 db.commit()
 
+                # only patients whose totals were already summed have running totals to update
+                patient_id = self._patient_id(patient)
+                if patient_id in self._totals:
+                    self._totals[patient_id] += amount_ml
+                    fluid_totals = self._fluid_totals[patient_id]
+                    fluid_totals[fluid_name] = fluid_totals.get(fluid_name, 0) + amount_ml
+
                 print("Successfully created fluid record")
                 return True
         
@@ -67,17 +84,81 @@ class FluidManager:
             sum {int} -- total fluid volume (mL) administered to the patient    
         '''
         try:
-            records = patient.fluid_records
-            
+            patient_id = self._load_totals(patient)
+
             if fluid:
-                records = [record for record in records if record.fluid.name == fluid]
-                
-            return sum([record.amount_ml for record in records])
+                return self._fluid_totals[patient_id].get(fluid, 0)
+
+            return self._totals[patient_id]
                 
         except Exception as e:
             print(f"Failed to get the total fluid volume {e}")
 
 
+    def get_fluid_totals(self, patient):
+        '''Returns the volume of every fluid administered to a specific patient
+
+        Args:
+            patient {Patient} -- The patient for whom the fluid volumes are administered to
+
+        Returns:
+            totals {Dict[str, float]} -- fluid name -> total volume (mL), only fluids the patient was given
+        '''
+        try:
+            return dict(self._fluid_totals[self._load_totals(patient)])
+
+        except Exception as e:
+            print(f"Failed to get the fluid totals {e}")
+
+
+    def forget_totals(self, patients=None):
+        '''Drops the running totals of patients, e.g. after they are deleted, they are summed again if requested
+
+        Args:
+            patients {Patient or List[Patient]} -- the patient(s) to forget, every patient by default
+        '''
+        if patients is None:
+            self._totals.clear()
+            self._fluid_totals.clear()
+            return
+
+        for patient in patients if isinstance(patients, list) else [patients]:
+            self._totals.pop(self._patient_id(patient), None)
+            self._fluid_totals.pop(self._patient_id(patient), None)
+
+
+    @staticmethod
+    def _patient_id(patient):
+        '''Returns the id of a patient without refreshing them, reading patient.id after a commit reloads the whole row'''
+        identity = inspect(patient).identity
+        return identity[0] if identity else patient.id
+
+
+    def _load_totals(self, patient):
+        '''Sums the volume of every fluid administered to a patient in the database, unless their running totals are already kept
+
+        Returns:
+            patient_id {int} -- the id the patient's totals are kept under
+        '''
+        patient_id = self._patient_id(patient)
+        if patient_id in self._totals:
+            return patient_id
+
+        with self._db.session_context() as db:
+            rows = (
+                db.query(Fluid.name, func.coalesce(func.sum(FluidRecord.amount_ml), 0))
+                .select_from(FluidRecord)
+                .outerjoin(Fluid, FluidRecord.fluid_id == Fluid.id)
+                .filter(FluidRecord.patient_id == patient_id)
+                .group_by(Fluid.name)
+                .all()
+            )
+
+        self._fluid_totals[patient_id] = {name: total for name, total in rows}
+        self._totals[patient_id] = sum(total for _, total in rows)
+        return patient_id
+
+
     def get_all_fluid_names(self):
         '''Queries the database gets a list of all fluid names stored.
 
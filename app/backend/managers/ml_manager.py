@@ -1,106 +1,634 @@
+import time
 from pathlib import Path
-from collections import deque, Counter
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 
-import xgboost as xgb
-import joblib
 import numpy as np
 
 from PyQt6.QtCore import pyqtSignal, QObject
 
+from vitals_data_models import VitalSample
+from backend.inference.worker import InferenceWorker
+from backend.inference.rolling_vote import RollingVote
+from backend.inference.registry import ModelRegistry
+from backend.inference.shadow import ShadowStats
+from backend.inference.memo import PredictionMemo
+from backend.inference.feature_ring import FeatureRing
+from backend.inference.scheduler import BatchScheduler
+from backend.inference.telemetry import InferenceTelemetry, NULL_TIMER
+
+# order of the features the models were trained with
+FEATURE_NAMES = (
+    'respiratoryRate',
+    'heartRate',
+    'meanArterialPressure',
+    'diastolicBP',
+    'systolicBP',
+    'spo2',
+    'age',
+    'pulsePressure',
+)
+
+# label and suggested action of every predicted class, for the binary (True) and ternary (False) models
+PREDICTION_MAPPINGS = {
+    True: {
+        0 : {'label' : 'abnormal blood volume', 'suggested_action':'evaluate and consider action'},
+        1 : {'label' : 'euvolemic', 'suggested_action':'maintain current status'},
+    },
+    False: {
+        0 : {'label' : 'hypervolemia', 'suggested_action':'consider fluid removal'},
+        1 : {'label' : 'hypovolemia', 'suggested_action':'consider fluid administration'},
+        2 : {'label' : 'euvolemia', 'suggested_action':'maintain current status'}
+    },
+}
+UNKNOWN_PREDICTION = {"label": "N/A", "suggested_action": "N/A"}
+
 class MLManager(QObject):
     '''ML Manager class whose job is to load in a specified model, and perform
     inference.
+
+    Every patient has their own inference cache keyed by their patient key
+    (MRN), samples for a patient that is not on screen are still cached so
+    inference can be run for any monitored patient. The cache is a
+    FeatureRing, the features of a sample are written into its preallocated
+    float32 matrix when the sample arrives, so inference never parses samples.
+
+    Loading the model and predicting can take long enough to freeze the
+    window, request_batched_inference() runs them on a dedicated worker
+    thread instead and delivers the result through prediction_ready, along
+    with the patient key it was requested for, the patient on screen may have
+    changed by the time it arrives.
+
+    With continuous inference enabled every sample is scored on the worker as
+    it enters a patient's cache, in micro-batches, and a RollingVote over the
+    cache window keeps the patient's majority label current. The label is
+    published through patient_prediction_ready at most once per publish
+    interval per patient.
+
+    With the batch scheduler enabled instead, every patient with new samples
+    is scored on a fixed tick: the cache windows of all of them are stacked
+    and scored with one predict_proba call, split back per patient and voted
+    on (a majority of the predicted labels, or a soft vote over the mean
+    probabilities), and each patient's prediction is published through
+    patient_prediction_ready.
+
+    xgboost and joblib are only imported when the model is loaded, and
+    load_model_async() loads and warms the model on the worker at launch so
+    the window can show before the model is ready. XGBoost models are cached
+    next to their JSON file in the binary UBJSON format, which loads several
+    times faster, and the cache is regenerated whenever the JSON file is newer.
+
+    Models are held in a ModelRegistry so several can stay loaded. The active
+    model can be swapped at runtime with set_active_model(), and a shadow
+    model set with set_shadow_model() scores every batch the active model
+    scores, on its own thread off the critical path, to compare their latency
+    and agreement (see shadow_stats()).
+
+    Predictions of the active model are memoized on the feature vector by a
+    PredictionMemo, feature vectors a patient already produced skip the model.
+    With backend='compiled' the models are evaluated by a CompiledEnsemble,
+    a pure NumPy tree evaluator with the same predictions and a lower latency
+    on small batches, and xgboost is never imported.
     
+    Every inference path can be timed stage by stage (load, queued,
+    preprocess, predict, vote, post_process) with counters for requests,
+    batch sizes and model loads, see InferenceTelemetry. It is disabled by
+    default and costs next to nothing until enabled.
+
     Attributes:
-        model: The loaded machine learning model
+        model {LoadedModel}: The active machine learning model
+        telemetry {InferenceTelemetry}: Stage timers and counters of the inference paths
     '''
-    prediction_ready = pyqtSignal(dict)
+    prediction_ready = pyqtSignal(object, dict)
+    patient_prediction_ready = pyqtSignal(object, dict)
 
-    def __init__(self, model_type='xgb', binary=False, max_cache_size=100):
+    def __init__(self, model_type='xgb', binary=False, max_cache_size=100, max_models=2, model_dir=None, memo_size=4096, backend="library", telemetry=False):
         '''Initalize the MLManager instance (runs only once)
         
         Args:
             model_type {str} -- The type of model to load. Currently supports 'xgb' and 'rf'. Default is 'xgb'.
             binary {bool} -- Whether binary or ternary classificaiton model should be loaded. Default is Ternary.
-            max_cache_size {int} -- The maximum size of the cache for batched inference.
+            max_cache_size {int} -- The maximum size of the cache for batched inference, per patient.
+            max_models {int} -- The maximum number of models kept loaded in the registry.
+            model_dir {str or Path} -- The directory holding the models, defaults to app/models.
+            memo_size {int} -- The maximum number of feature vectors whose prediction is memoized, 0 disables the memo.
+            backend {str} -- 'library' predicts with XGBoost/scikit-learn, 'compiled' with the NumPy tree evaluator.
+            telemetry {bool} -- Whether the inference stages are timed from the start, see enable_telemetry().
         '''        
         super().__init__()
         self.model = None
         self._model_type = model_type.lower()
         self._binary_predictor = binary
 
-        # cahce for batched inference
-        self._data_cache = deque(maxlen=max_cache_size)
+        # cahce for batched inference, one per patient
+        self._max_cache_size = max_cache_size
+        self._caches = {}
+        self._caches_lock = Lock()
+
+        # inference requests from the gui run here, the model is only loaded once
+        self._worker = InferenceWorker(name="ml-inference")
+        self._model_lock = Lock()
+        self.startup_times = {}
+        self.telemetry = InferenceTelemetry(enabled=telemetry)
+
+        # continuous inference state, samples waiting to be scored and the rolling vote of every patient
+        self._continuous = False
+        self._micro_batch = 1
+        self._publish_interval = 5.0
+        # number of samples of every patient not scored yet, they are the newest rows of the patient's cache
+        self._pending = {}
+        self._pending_lock = Lock()
+        self._votes = {}
+        self._last_published = {}
+
+        # cross-patient batch scheduler state, the label of every patient scored on a tick
+        self._scheduler = None
+        self._vote = "majority"
+        self._tick_labels = {}
 
         # filepath for the dir holding all models should be ~/Fluid-Solutions/app/models
-        self._model_dir = Path(__file__).parent.parent.parent.joinpath("models")
+        self._model_dir = Path(model_dir) if model_dir else Path(__file__).parent.parent.parent.joinpath("models")
         if not self._model_dir.exists():
             print(f"Directory containing the model file not found {self._model_dir}")
 
+        self._registry = ModelRegistry(self._model_dir, capacity=max_models, backend=backend)
+        self._memo = PredictionMemo(memo_size) if memo_size else None
+
+        # the shadow model scores on its own thread, one batch at a time
+        self._shadow_model = None
+        self._shadow_stats = None
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-shadow")
+        self._shadow_busy = False
+
 
     def load_model(self):
         '''Load the specified model if not already loaded'''
         if self.model:
             return
-        
+
+        with self._model_lock:
+            # another thread may have loaded it while we waited
+            if self.model:
+                return
+
+            started = time.perf_counter()
+            try:
+                model = self._load_model()
+            except Exception as e:
+                raise RuntimeError(f"Failed to load {self._model_type} model: {e}")
+
+            # the first prediction initializes the predictor, pay for it here rather than on the first request
+            loaded = time.perf_counter()
+            model.predict(np.zeros((1, 8)))
+            warmed = time.perf_counter()
+
+            self.startup_times = {"load": loaded - started, "warm_up": warmed - loaded}
+            self.model = model
+            self.telemetry.record_load(model.key, loaded - started, warmed - loaded)
+            print(f"Loaded the {self._model_type} model in {warmed - started:.3f}s (load {loaded - started:.3f}s, warm-up {warmed - loaded:.3f}s)")
+
+
+    def load_model_async(self):
+        '''Loads and warms the model on the inference worker, requests queued after it wait for the model
+
+        Returns:
+            future {Future} -- resolves once the model is loaded, holds the exception if it failed to load
+        '''
+        future = self._worker.submit(self.load_model, key="load_model")
+        future.add_done_callback(self._report_load_failure)
+        return future
+
+
+    @staticmethod
+    def _report_load_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(future.exception())
+
+
+    def _load_model(self):
+        '''Util method to get the appropriate model from the registry, loading it if needed'''
+        return self._registry.get(self._model_type, self._binary_predictor)
+
+
+    def set_active_model(self, model_type, binary=False):
+        '''Swaps the active model without a restart
+
+        The model is loaded and warmed on the inference worker, requests
+        already queued are scored by the previous model and requests queued
+        after this one by the new model.
+
+        Returns:
+            future {Future} -- resolves to the new active model once it is swapped in
+        '''
+        future = self._worker.submit(self._swap_model, model_type.lower(), bool(binary), key="set_active_model")
+        future.add_done_callback(self._report_load_failure)
+        return future
+
+
+    def _swap_model(self, model_type, binary):
+        '''Runs on the inference worker, loads and warms a model and makes it the active model'''
+        started = time.perf_counter()
         try:
-            self.model = self._load_model()
+            model = self._registry.get(model_type, binary)
         except Exception as e:
-            raise RuntimeError(f"Failed to load {self._model_type} model: {e}")
+            raise RuntimeError(f"Failed to load {model_type} model: {e}")
+        loaded = time.perf_counter()
+        model.predict(np.zeros((1, 8)))
+        self.telemetry.record_load(model.key, loaded - started, time.perf_counter() - loaded, event="swap")
 
+        with self._model_lock:
+            labels_changed = binary != self._binary_predictor
+            self.model = model
+            if self._memo is not None:
+                self._memo.clear()
+            self._model_type = model_type
+            self._binary_predictor = binary
 
-    def _load_model(self):
-        '''Util method to load the appropriate model.'''        
-        if self._model_type == "xgb":
-            # model_file = "xgboost_model.json" if not self._binary_predictor else "xgboost_binary_model.json"
-            model_file = "unsupervised_data_xgboost.json" if not self._binary_predictor else "xgboost_binary_model.json"
-            model_path = self._model_dir / model_file
+            # the shadow model is now compared against the new active model
+            if self._shadow_model is not None:
+                self._shadow_stats = ShadowStats(model.key, self._shadow_model.key)
 
-            if not model_path.exists():
-                raise FileNotFoundError(f"Model file not found: {model_path}")
+        # the rolling votes and tick labels hold labels of the previous model, which mean something else now
+        if labels_changed:
+            self._votes.clear()
+            self._tick_labels.clear()
+            self._last_published.clear()
 
-            model = xgb.XGBClassifier()
-            model.load_model(str(model_path))
+        print(f"Active model is now {model}")
+        return model
+
+
+    def set_shadow_model(self, model_type, binary=False):
+        '''Scores every batch the active model scores with a second model as well, off the critical path
+
+        Returns:
+            future {Future} -- resolves to the shadow model once it is loaded
+        '''
+        def load():
+            started = time.perf_counter()
+            model = self._registry.get(model_type, binary)
+            loaded = time.perf_counter()
+            model.predict(np.zeros((1, 8)))
+            self.telemetry.record_load(model.key, loaded - started, time.perf_counter() - loaded, event="shadow")
+            with self._model_lock:
+                active = self.model.key if self.model else (self._model_type, self._binary_predictor)
+                self._shadow_stats = ShadowStats(active, model.key)
+                self._shadow_model = model
             return model
 
-        elif self._model_type == "rf":
-            # load in the rf model from the saved model
-            model_file = "random_forest_model.pkl" if not self._binary_predictor else "random_forest_binary_model.pkl"
-            model_path = self._model_dir / model_file
+        future = self._shadow_executor.submit(load)
+        future.add_done_callback(self._report_load_failure)
+        return future
 
-            if not model_path.exists():
-                raise FileNotFoundError(f"Model file not found: {model_path}")
-            
-            return joblib.load(f'{self._model_dir}/{model_file}.pkl')
 
-        else:
-            raise FileNotFoundError(f"{self._model_type} file not found")
+    def clear_shadow_model(self):
+        '''Stops shadow scoring and drops the shadow model's stats'''
+        with self._model_lock:
+            self._shadow_model = None
+            self._shadow_stats = None
+
+
+    def shadow_stats(self):
+        '''Returns the latency and agreement of the shadow model, see ShadowStats.snapshot(), None if there is none'''
+        return self._shadow_stats.snapshot() if self._shadow_stats else None
+
+
+    def _submit_shadow(self, features, labels, active_seconds):
+        '''Hands a batch scored by the active model to the shadow model, dropping it if the shadow model is still busy'''
+        shadow, stats = self._shadow_model, self._shadow_stats
+        if shadow is None:
+            return
+
+        if self._shadow_busy:
+            stats.record_dropped()
+            return
+
+        self._shadow_busy = True
+        self._shadow_executor.submit(self._score_shadow, shadow, stats, features, labels, active_seconds)
+
+
+    def _score_shadow(self, shadow, stats, features, labels, active_seconds):
+        '''Runs on the shadow thread, scores a batch with the shadow model and records how it compares'''
+        try:
+            started = time.perf_counter()
+            shadow_labels = shadow.predict(features)
+            stats.record(labels, shadow_labels, active_seconds, time.perf_counter() - started)
+        except Exception as e:
+            stats.record_error(e)
+        finally:
+            self._shadow_busy = False
+
+
+    def cache(self, patient_key=None):
+        '''Returns the inference cache (FeatureRing) for a patient, creating it if it does not exist'''
+        cache = self._caches.get(patient_key)
+        if cache is None:
+            with self._caches_lock:
+                cache = self._caches.get(patient_key)
+                if cache is None:
+                    cache = self._caches[patient_key] = FeatureRing(self._max_cache_size, len(FEATURE_NAMES))
+        return cache
+
+
+    def add_to_cache(self, data, patient_key=None):
+        '''Writes the features of the datapoint into the patient's cache for batched inference
+
+        Args:
+            data {VitalSample, dict or list} -- the datapoint
+            patient_key {str} -- the patient the datapoint belongs to
+        '''
+        cache = self.cache(patient_key)
+        row = self._feature_row(data)
+
+        if not self._continuous:
+            cache.append(row)
+            scheduler = self._scheduler
+            if scheduler is not None:
+                scheduler.mark(patient_key)
+            return
+
+        # counted under the same lock the worker takes the pending rows with, so every row is scored once
+        with self._pending_lock:
+            cache.append(row)
+            pending = self._pending[patient_key] = self._pending.get(patient_key, 0) + 1
+
+        # a request still queued for the patient is replaced, the new one scores everything pending
+        if pending >= self._micro_batch:
+            self._worker.submit(self._score_pending, patient_key, key=("continuous", patient_key))
+
+
+    def remove_cache(self, patient_key):
+        '''Drops the cache and continuous inference state of a patient who is no longer monitored'''
+        with self._caches_lock:
+            self._caches.pop(patient_key, None)
+
+        with self._pending_lock:
+            self._pending.pop(patient_key, None)
+        self._votes.pop(patient_key, None)
+        self._last_published.pop(patient_key, None)
+
+        scheduler = self._scheduler
+        if scheduler is not None:
+            scheduler.discard(patient_key)
+        self._tick_labels.pop(patient_key, None)
+
+
+    def enable_continuous_inference(self, micro_batch=1, publish_interval=5.0):
+        '''Scores every sample as it is added to a cache and publishes each patient's rolling majority
+
+        Args:
+            micro_batch {int} -- number of samples a patient accumulates before they are scored
+            publish_interval {float} -- minimum seconds between publishing the prediction of a patient
+        '''
+        self.disable_batch_scheduler()
+        self._micro_batch = max(1, micro_batch)
+        self._publish_interval = publish_interval
+        self._continuous = True
+
+
+    def disable_continuous_inference(self):
+        '''Stops scoring samples as they are cached, the rolling votes are dropped'''
+        self._continuous = False
+        with self._pending_lock:
+            self._pending.clear()
+        self._votes.clear()
+        self._last_published.clear()
+
+
+    def enable_batch_scheduler(self, tick=1.0, max_batch_size=5000, vote="majority"):
+        '''Scores the cache window of every patient with new samples together, once per tick
+
+        Replaces continuous inference if it was enabled.
+
+        Args:
+            tick {float} -- seconds between ticks
+            max_batch_size {int} -- maximum number of rows scored in a tick, patients that don't fit wait for the next tick
+            vote {str} -- 'majority' of the predicted labels or 'soft', the class with the highest mean probability
+        '''
+        if vote not in ("majority", "soft"):
+            raise ValueError(f"Unsupported vote: {vote}")
+
+        self.disable_continuous_inference()
+        self.disable_batch_scheduler()
+        self._vote = vote
+        # a tick still queued on the worker is replaced, the next one scores everyone marked since
+        self._scheduler = BatchScheduler(lambda: self._worker.submit(self._score_tick, key="tick"), tick=tick, max_batch_size=max_batch_size)
+        self._scheduler.start()
 
 
-    def add_to_cache(self, data):
-        '''Add the datapoint to the cache for batched inference'''
-        self._data_cache.append(data)
+    def disable_batch_scheduler(self):
+        '''Stops the batch scheduler, the labels of the last tick are dropped'''
+        scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None:
+            scheduler.stop()
+        self._tick_labels.clear()
 
 
-    def run_batched_inference(self):
-        '''Run batched inference on the cached data'''
+    def _score_tick(self):
+        '''Runs on the inference worker, scores the windows of the patients taken this tick with one model call
+
+        Returns:
+            labels {dict} -- the label of every patient scored
+        '''
+        scheduler = self._scheduler
+        if scheduler is None:
+            return {}
+
+        timer = self.telemetry.timer("tick")
+        patient_keys = scheduler.take(lambda patient_key: len(self._caches.get(patient_key) or ()))
+        windows = [(patient_key, self._snapshot_cache(patient_key)) for patient_key in patient_keys]
+        windows = [(patient_key, window) for patient_key, window in windows if len(window)]
+        if not windows:
+            return {}
+
+        features = np.concatenate([window for _, window in windows])
+        timer.lap("preprocess", rows=len(features))
+        proba = self._predict_proba(features, timer)
+        bounds = np.cumsum([len(window) for _, window in windows])[:-1]
+
+        labels = {}
+        for (patient_key, _), window_proba in zip(windows, np.split(proba, bounds)):
+            if self._vote == "soft":
+                labels[patient_key] = int(np.argmax(window_proba.mean(axis=0)))
+            else:
+                labels[patient_key] = self._majority_vote(np.argmax(window_proba, axis=1))
+        timer.lap("vote")
+
+        for patient_key, label in labels.items():
+            self._tick_labels[patient_key] = label
+            self.patient_prediction_ready.emit(patient_key, self._post_process(label))
+        timer.lap("post_process")
+        timer.finish(patients=len(labels))
+
+        return labels
+
+
+    def _predict_proba(self, features, timer=NULL_TIMER):
+        '''Predicts the probability of every class for every row of a feature matrix with a single model call'''
         if self.model is None:
             self.load_model()
+            timer.lap("load")
 
-        if len(self._data_cache) == 0:
-            return
+        proba = self.model.predict_proba(features)
+        timer.lap("predict", rows=len(features))
+        return proba
+
+
+    def current_prediction(self, patient_key=None):
+        '''Returns the current rolling majority (or last tick) prediction of a patient, None if nothing was scored for them'''
+        vote = self._votes.get(patient_key)
+        if vote is not None and vote.majority() is not None:
+            return self._post_process(vote.majority())
+
+        label = self._tick_labels.get(patient_key)
+        return self._post_process(label) if label is not None else None
+
+
+    def _score_pending(self, patient_key):
+        '''Runs on the inference worker, scores the samples a patient accumulated and updates their rolling vote
+
+        Returns:
+            label {int or None} -- the patient's majority label
+        '''
+        timer = self.telemetry.timer("continuous")
+        with self._pending_lock:
+            pending = self._pending.pop(patient_key, 0)
+            cache = self._caches.get(patient_key)
+            if not pending or cache is None:
+                return None
+
+            # rows that already left the cache would have left the rolling vote as well
+            features = cache.snapshot(pending)
+        timer.lap("preprocess", rows=len(features))
+
+        labels = self._predict_labels(features, timer)
+
+        vote = self._votes.get(patient_key)
+        if vote is None:
+            vote = self._votes[patient_key] = RollingVote(self._max_cache_size, classes=2 if self._binary_predictor else 3)
+        vote.extend(labels)
+        timer.lap("vote")
+
+        now = time.monotonic()
+        if now - self._last_published.get(patient_key, float("-inf")) >= self._publish_interval:
+            self._last_published[patient_key] = now
+            self.patient_prediction_ready.emit(patient_key, self._post_process(vote.majority()))
+            timer.lap("post_process")
+
+        timer.finish(patient=patient_key)
+        return vote.majority()
+
+
+    def run_batched_inference(self, patient_key=None):
+        '''Run batched inference on the cached data of a patient, on the calling thread
+
+        The whole cache is predicted with one call to the model, the final
+        prediction is a majority vote over the predicted labels.
+        '''
+        # snapshot the cache, samples are appended from the ingest thread
+        timer = self.telemetry.timer("batched")
+        features = self._snapshot_cache(patient_key)
+        timer.lap("preprocess")
+        prediction = self._batched_prediction(features, timer)
+        if prediction is not None:
+            self.prediction_ready.emit(patient_key, prediction)
+
+
+    def request_batched_inference(self, patient_key=None):
+        '''Run batched inference on the cached data of a patient on the inference worker
+
+        The cache is snapshot when the request is made. A request for the same
+        patient that has not started yet is cancelled, only the newest snapshot
+        is scored. The prediction is emitted through prediction_ready with the
+        patient key, which is delivered on the gui thread.
+
+        Returns:
+            future {Future} -- resolves to the prediction, or None if the cache was empty
+        '''
+        timer = self.telemetry.timer("batched")
+        features = self._snapshot_cache(patient_key)
+        timer.lap("preprocess")
+        return self._worker.submit(self._emit_batched_prediction, patient_key, features, timer, key=("batched", patient_key))
+
+
+    def _snapshot_cache(self, patient_key):
+        '''Returns a copy of the feature rows cached for a patient, oldest first'''
+        cache = self._caches.get(patient_key)
+        if cache is None:
+            return np.empty((0, len(FEATURE_NAMES)), dtype=np.float32)
+        return cache.snapshot()
 
-        # batched inference using majority voting to determine the final prediction
-        predictions = []
-        print(f"The length of the cache is: {len(self._data_cache)}")
-        for vitals_data in self._data_cache:
-            curr_prediction = self._raw_predict(vitals_data)
-            predictions.append(curr_prediction)
 
-        if predictions:
-            # use a majority vote to determine the final prediction
-            most_common_pred = Counter(predictions).most_common(1)[0][0]
-            self.prediction_ready.emit(self._post_process(most_common_pred))
+    def _emit_batched_prediction(self, patient_key, features, timer=NULL_TIMER):
+        '''Runs on the inference worker, predicts the snapshot and emits the result for the patient'''
+        timer.lap("queued")
+        prediction = self._batched_prediction(features, timer)
+        if prediction is not None:
+            self.prediction_ready.emit(patient_key, prediction)
+        return prediction
+
+
+    def _batched_prediction(self, features, timer=NULL_TIMER):
+        '''Predicts every row of a cache snapshot with a single model call and returns the post-processed majority vote'''
+        if len(features) == 0:
+            return None
+
+        print(f"The length of the cache is: {len(features)}")
+        predictions = self._predict_labels(features, timer)
+
+        # use a majority vote to determine the final prediction
+        label = self._majority_vote(predictions)
+        timer.lap("vote")
+        prediction = self._post_process(label)
+        timer.lap("post_process")
+        timer.finish()
+        return prediction
+
+
+    def _predict_labels(self, features, timer=NULL_TIMER):
+        '''Predicts the label of every row of a feature matrix with a single model call
+
+        Args:
+            features {np.ndarray} -- (n, 8) feature matrix, e.g. a cache snapshot
+            timer {StageTimer} -- timer of the request, the load and predict stages are charged to it
+
+        Returns:
+            labels {np.ndarray} -- one integer label per row
+        '''
+        if self.model is None:
+            self.load_model()
+            timer.lap("load")
+
+        started = time.perf_counter()
+        labels = self._model_predict(features)
+        timer.lap("predict", rows=len(features))
+
+        if self._shadow_model is not None:
+            self._submit_shadow(features, labels, time.perf_counter() - started)
+
+        return labels
+
+
+    def shutdown(self):
+        '''Stops the batch scheduler, the inference worker and the shadow thread, pending requests are cancelled'''
+        self.disable_batch_scheduler()
+        self._worker.shutdown(wait=True)
+        self._shadow_executor.shutdown(wait=True, cancel_futures=True)
+
+
+    @staticmethod
+    def _majority_vote(predictions):
+        '''Returns the most common label, ties go to the label predicted first
+
+        Args:
+            predictions {np.ndarray} -- non negative integer labels
+        '''
+        votes = np.bincount(predictions)
+        tied = np.flatnonzero(votes == votes.max())
+        if len(tied) == 1:
+            return int(tied[0])
+
+        return int(predictions[np.isin(predictions, tied)][0])
 
 
     def predict(self, data):
@@ -114,74 +642,102 @@ class MLManager(QObject):
             where label = low, high, normal (or normal vs. not normal) 
             and suggested action = administer fluid etc...
         '''
-        if self.model is None:
-            self.load_model()
-
+        timer = self.telemetry.timer("predict")
         try: 
-            prediction = self._raw_predict(data)
-            return self._post_process(prediction)
+            prediction = self._raw_predict(data, timer)
+            result = self._post_process(prediction)
+            timer.lap("post_process")
+            timer.finish()
+            return result
         except Exception as e:
             print(f"Failed to make prediction {e}")
 
 
-    def _raw_predict(self, data):
+    def _raw_predict(self, data, timer=NULL_TIMER):
         '''Perform inference using the loaded model without post-processing'''
         if self.model is None:
             self.load_model()
+            timer.lap("load")
 
         preprocess_data = self._preprocess(data)
-        return self.model.predict(preprocess_data)[0]
+        timer.lap("preprocess")
+        prediction = self._model_predict(preprocess_data)[0]
+        timer.lap("predict", rows=len(preprocess_data))
+        return prediction
+
+
+    def _model_predict(self, features):
+        '''Predicts the labels of a feature matrix with the active model, through the memo if it is enabled'''
+        if self._memo is not None:
+            return self._memo.predict(self.model, features)
+
+        return self.model.predict(features)
+
+
+    def enable_telemetry(self, log_lines=False):
+        '''Starts timing the inference stages
+
+        Args:
+            log_lines {bool} -- whether every request and model load is also printed as a JSON line
+        '''
+        self.telemetry.enable(log_lines=log_lines)
+
+
+    def disable_telemetry(self):
+        '''Stops timing the inference stages, what was recorded is kept'''
+        self.telemetry.disable()
+
+
+    def inference_stats(self):
+        '''Returns the inference telemetry, see InferenceTelemetry.snapshot(), along with the memo stats'''
+        stats = self.telemetry.snapshot()
+        stats["memo"] = self.memo_stats()
+        return stats
+
+
+    def memo_stats(self):
+        '''Returns the size and hit/miss counters of the prediction memo, None if it is disabled'''
+        return self._memo.snapshot() if self._memo is not None else None
 
     
     def _post_process(self, prediction):
         '''Post-process a prediction made by the model'''
-        if self._binary_predictor:
-            prediction_mapping  = {
-                0 : {'label' : 'abnormal blood volume', 'suggested_action':'evaluate and consider action'},
-                1 : {'label' : 'euvolemic', 'suggested_action':'maintain current status'},
-            }
-        else:
-            prediction_mapping  = {
-                0 : {'label' : 'hypervolemia', 'suggested_action':'consider fluid removal'},
-                1 : {'label' : 'hypovolemia', 'suggested_action':'consider fluid administration'},
-                2 : {'label' : 'euvolemia', 'suggested_action':'maintain current status'}
-            }
+        prediction_mapping = PREDICTION_MAPPINGS[bool(self._binary_predictor)]
+        return dict(prediction_mapping.get(prediction, UNKNOWN_PREDICTION))
 
-        return prediction_mapping.get(prediction, {"label": "N/A", "suggested_action": "N/A"})
 
+    @staticmethod
+    def _feature_row(data):
+        '''Returns the features of a datapoint in the order the models expect, see _preprocess()'''
+        if isinstance(data, VitalSample):
+            return (data.respiratoryRate, data.heartRate, data.meanArterialPressure, data.diastolicBP,
+                    data.systolicBP, data.spo2, data.age or 0, data.pulsePressure)
 
-    def _preprocess(self, data):
+        return MLManager._preprocess(data)[0]
+
+
+    @staticmethod
+    def _preprocess(data):
         '''Preprocess the inference data to match the model's expected input format.
     
         The function ensures data is structured correctly for inference.
-        It currently handles list inputs and will be extended to support dictionaries.
+        It handles VitalSample, dict and list inputs.
         
         expected array shape for the batched inference is:
         [[14. 91. 90. 63. 81. 96.  0. 18.]]
 
         Args:
-            data (list or dict): Input data to preprocess.
+            data (VitalSample, list or dict): Input data to preprocess.
         '''
-        feature_map = {
-            0: 'respiratoryRate',
-            1: 'heartRate',
-            2: 'meanArterialPressure',
-            3: 'diastolicBP',
-            4: 'systolicBP',
-            5: 'spo2',
-            6: 'age',
-            7: 'pulsePressure'
-        }
-
-        if isinstance(data, dict):
-            features = []
-            for idx, feature_name in feature_map.items():
-                # manually put the features into their correct positions
-                features.insert(idx, float(data.get(feature_name, 0)))
-
-            # reshape the array to match the model's expected input
-            array = np.array(features).reshape(1, -1)
-            return array
+        if isinstance(data, VitalSample):
+            # the sample already holds numbers, no parsing needed
+            features = [getattr(data, feature_name) or 0 for feature_name in FEATURE_NAMES]
+            return np.array(features, dtype=float).reshape(1, -1)
+
+        elif isinstance(data, dict):
+            # put the features into their correct positions and reshape to match the model's expected input
+            features = [float(data.get(feature_name, 0)) for feature_name in FEATURE_NAMES]
+            return np.array(features).reshape(1, -1)
 
         # must convert data to numpy array and check its dimensions to match
         # what we trained the model with
@@ -191,13 +747,13 @@ class MLManager(QObject):
             if array.ndim == 1:
                 array = array.reshape(1, -1)
 
-            if array.shape[1] != len(feature_map):
+            if array.shape[1] != len(FEATURE_NAMES):
                 print("inputted list has incorrect size")
 
             return array
 
         else:
-            raise TypeError("Inputted data for preprocessing must be list or dict")
+            raise TypeError("Inputted data for preprocessing must be VitalSample, list or dict")
 
 
 if __name__ == "__main__":
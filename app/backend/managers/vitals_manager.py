@@ -1,11 +1,21 @@
 import socket
+import struct
+import asyncio
+import time
+from datetime import datetime
+from itertools import count
 from threading import Thread
 from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from PyQt6.QtCore import pyqtSignal, QObject
-from pyasn1.codec.ber.decoder import decode
 
-from vitals_data_models import VitalSigns
+from vitals_data_models import VitalSample
+from backend.ingest.framing import FrameBuffer
+from backend.ingest.capture import CaptureWriter
+from backend.ingest.stats import IngestStats
+from backend.ingest.decoder import decode_vitals
+from backend.ingest.decoder_pool import DecoderPool, DECODED, FAILED, CLOSED
 
 class VitalsManager(QObject):
     '''
@@ -16,92 +26,524 @@ class VitalsManager(QObject):
     mimic IEEE 11073 Protocol (Medical Device Communication) as it is an 
     international standard for medical device communication. This class 
     very loosly follows this standard, implementing asn.1 modeled communication.
+
+    TCP does not preserve message boundaries, so every connection reassembles
+    its DER messages with a FrameBuffer before they are decoded.
+
+    Devices are bound to patients with bind_device(). Samples from a bound
+    device are stamped with the patient's age and handed to every sink (e.g.
+    the ML cache) whether or not the patient is on screen. Only samples for
+    the focused patient, the one being displayed, are emitted through
+    vitals_data. Devices that are not bound follow the focused patient, which
+    keeps the single monitor setup working without any bindings. Samples that
+    can not be routed to a patient are dropped.
+
+    When ack is enabled every complete frame is acknowledged with its 4 byte
+    big endian sequence number on the connection (starting at 1), sent once
+    the frame has been decoded and routed. The vitals agent's load mode uses
+    these to measure latency.
+
+    When capture_path is set every complete frame is appended, with its receive
+    timestamp and connection, to a capture file that vitals_agent/replay.py can
+    re-send to a VitalsManager.
+
+    Three ingest modes are supported:
+        threaded -- every connected device is handled by a worker from a thread pool,
+                    limiting the number of simultaneous devices to max_workers
+        async -- every connected device is served by a single asyncio event loop
+                 running in a daemon thread, allowing hundreds of simultaneous devices
+        process -- devices are served by the event loop like async mode, but the frames
+                   are decoded by a DecoderPool of processes sharded by connection. The
+                   decoded samples come back through shared memory and are routed by a
+                   consumer thread, so decoding no longer competes with the GUI for the GIL
+
+    Methods:
+        start_server() -- binds the socket and starts accepting devices
+        stop_server() -- stops accepting devices and closes all connections
+        connection_throughput() -- returns the message/byte rates of every open connection
+        get_stats() -- returns the ingest counters, stage times and latency histograms
+        bind_device(source_id, patient) -- routes the samples of a device to a patient
+        unbind_device(source_id) -- removes the binding of a device
+        forget_patient(patient_key) -- drops the device bindings of a patient
+        focus_patient(patient) -- sets the patient whose samples are emitted to the frontend
+        add_sink(callback) -- registers a callback receiving every routed sample
     '''
-    vitals_data = pyqtSignal(dict)
+    RECV_SIZE = 65536
+
+    vitals_data = pyqtSignal(object)
 
-    def __init__(self, host="0.0.0.0", port=8080, max_workers=5):        
+    def __init__(self, host="0.0.0.0", port=8080, max_workers=5, mode="threaded", ack=False, capture_path=None, decoders=None):
+        '''Constructor for the VitalsManager
+
+        Args:
+            host {str} -- interface the server binds to
+            port {int} -- port the server listens on, 0 picks a free port
+            max_workers {int} -- maximum number of simultaneous devices in threaded mode
+            mode {str} -- ingest mode, either 'threaded', 'async' or 'process'
+            ack {bool} -- acknowledge every frame with its sequence number
+            capture_path {str} -- file the raw frames are captured to, nothing is captured by default
+            decoders {int} -- number of decoder processes in process mode, defaults to one less than the number of cores
+        '''
         super().__init__()
         self.host = host
         self.port = port
         self.server_socket = None
         self._running = False
+        self._ack = ack
+        self._capture_path = capture_path
+        self._capture = None
+
+        self._mode = mode.lower()
+        if self._mode not in ("threaded", "async", "process"):
+            raise ValueError(f"Unsupported ingest mode: {mode}")
 
         # allow up to 5 threads/connecitons simultaneously
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
 
+        # event loop state, only used in async mode
+        self._loop = None
+        self._loop_thread = None
+        self._stop_event = None
+
+        # decoder processes and the connection state the consumer thread needs, only used in process mode
+        self._decoders = DecoderPool(decoders) if self._mode == "process" else None
+        self._consumer_thread = None
+        self._sources = {}
+        self._writers = {}
+        self._sequences = {}
+
+        # per connection counters and latency histograms
+        self._connection_ids = count(1)
+        self.stats = IngestStats()
+
+        # device to patient routing, bindings map a device to (patient key, age)
+        self._bindings = {}
+        self._focused_binding = None
+        self._sinks = []
+
 
     def start_server(self):
         '''Starts the server to listen for medical devices'''
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen()
-        
+
+        # update the port in case the OS picked one for us
+        self.port = self.server_socket.getsockname()[1]
         self._running = True
 
+        if self._capture_path:
+            self._capture = CaptureWriter(self._capture_path)
+
+        if self._decoders:
+            self._decoders.start()
+            self._consumer_thread = Thread(target=self._consume_decoded, daemon=True)
+            self._consumer_thread.start()
+
         # run the server in a separate daemon so it does not block the mian thread
-        socket_thread = Thread(target=self._listen, daemon=True)
+        if self._mode in ("async", "process"):
+            self._loop = asyncio.new_event_loop()
+            self._stop_event = asyncio.Event()
+            target = self._run_event_loop
+        else:
+            target = self._listen
+
+        socket_thread = Thread(target=target, daemon=True)
         socket_thread.start()
+        self._loop_thread = socket_thread
 
 
     def _listen(self):
-        '''Listen for incoming clients'''
+        '''Listen for incoming clients, each client is handled by the thread pool'''
         while self._running:
             try:
                 # timeout after 5 seconds, avoid blocking
                 self.server_socket.settimeout(5)
                 conn, addr = self.server_socket.accept()
-                self._handle_clients(conn)
-            
+                self.executor.submit(self._handle_clients, conn, addr)
+
             except socket.timeout:
                 continue
             except Exception as e:
-                print(f"Error while handling client connection: {e}")
+                if self._running:
+                    print(f"Error while handling client connection: {e}")
 
-    
-    def _handle_clients(self, connection):
+
+    def _handle_clients(self, connection, address=None):
         '''Hanldes a client connection'''
         # if no data is received within 5 seconds, close the connection
-        connection.settimeout(5) 
-        
+        connection.settimeout(5)
+        connection_id, source_id = self._open_connection(address)
+        framer = FrameBuffer()
+
         try:
             while self._running:
                 # receive data from the medical device
-                data = connection.recv(1024)
+                data = connection.recv(self.RECV_SIZE)
                 if not data:
                     break
 
-                # convert the data to a dict, then emit to the frontend
-                output_data = self._process_data(data)
-                if output_data:
-                    self.vitals_data.emit(output_data)
+                acks = self._handle_data(connection_id, source_id, framer, data)
+                if acks:
+                    connection.sendall(acks)
         except (socket.timeout, ConnectionError):
             print("Connection error")
         finally:
-            print("Closing connection")
+            self._close_connection(connection_id)
             connection.close()
 
 
-    def _process_data(self, encoded_data):
-        '''Processes incoming pyasn1 data and converts it to a dict for further processing
-        
+    def _run_event_loop(self):
+        '''Runs the asyncio event loop serving every device, blocks until stop_server is called'''
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            self._loop.run_until_complete(self._serve_async())
+        finally:
+            self._loop.close()
+
+
+    async def _serve_async(self):
+        '''Serves every device on the event loop until the stop event is set'''
+        server = await asyncio.start_server(self._handle_stream, sock=self.server_socket)
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            server.close()
+
+            # cancel every open connection so they close gracefully
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    async def _handle_stream(self, reader, writer):
+        '''Coroutine handling a single device connection on the event loop'''
+        connection_id, source_id = self._open_connection(writer.get_extra_info("peername"))
+        framer = FrameBuffer()
+        if self._decoders:
+            self._sources[connection_id] = source_id
+            self._writers[connection_id] = writer
+
+        try:
+            while self._running:
+                # if no data is received within 5 seconds, close the connection
+                data = await asyncio.wait_for(reader.read(self.RECV_SIZE), timeout=5)
+                if not data:
+                    break
+
+                if self._decoders:
+                    # acks are sent by the consumer thread once the frames are decoded
+                    self._dispatch_data(connection_id, framer, data)
+                    continue
+
+                acks = self._handle_data(connection_id, source_id, framer, data)
+                if acks:
+                    writer.write(acks)
+        except (asyncio.TimeoutError, ConnectionError):
+            print("Connection error")
+        finally:
+            if self._decoders:
+                # the connection is closed by the consumer thread once its last frames are routed
+                self._decoders.close_connection(connection_id)
+            else:
+                self._close_connection(connection_id)
+            writer.close()
+
+
+    def _handle_data(self, connection_id, source_id, framer, data):
+        '''Splits the received data into frames, decodes each frame, updates the connection counters and emits to the frontend
+
+        Returns:
+            acks {bytes} -- the acks to send back for the complete frames, empty if ack is disabled
+        '''
+        read_at = time.perf_counter()
+        received_at = time.time()
+        frames = framer.feed(data)
+
+        if self._capture and frames:
+            self._capture.write(connection_id, received_at, frames)
+
+        # convert every complete frame to a VitalSample, a frame that fails to decode counts as malformed
+        framed_at = time.perf_counter()
+        decoded = []
+        for frame in frames:
+            output_data = self._process_data(frame, source_id, received_at, connection_id)
+            if output_data:
+                decoded.append(output_data)
+
+        decoded_at = time.perf_counter()
+        if decoded:
+            self._route(source_id, decoded)
+
+        routed_at = time.perf_counter()
+        self.stats.record_read(
+            connection_id,
+            nbytes=len(data),
+            messages=len(decoded),
+            framing_errors=framer.malformed,
+            framing_seconds=framed_at - read_at,
+            decode_seconds=decoded_at - framed_at,
+            route_seconds=routed_at - decoded_at,
+            recv_to_emit=routed_at - read_at,
+        )
+
+        if not self._ack or not frames:
+            return b""
+
+        # framer.frames already includes this batch, number the frames from the first one in it
+        first = framer.frames - len(frames) + 1
+        return b"".join(struct.pack("!I", sequence & 0xFFFFFFFF) for sequence in range(first, framer.frames + 1))
+
+
+    def _dispatch_data(self, connection_id, framer, data):
+        '''Splits the received data into frames and hands them to the decoder processes, only used in process mode'''
+        read_at = time.perf_counter()
+        received_at = time.time()
+        frames = framer.feed(data)
+
+        if self._capture and frames:
+            self._capture.write(connection_id, received_at, frames)
+
+        if frames:
+            self._decoders.submit(connection_id, received_at, read_at, frames)
+
+        # the frames are decoded and routed by the consumer thread, which records the rest of the read
+        self.stats.record_read(
+            connection_id,
+            nbytes=len(data),
+            messages=0,
+            framing_errors=framer.malformed,
+            framing_seconds=time.perf_counter() - read_at,
+            decode_seconds=0.0,
+            route_seconds=0.0,
+            recv_to_emit=0.0,
+        )
+
+
+    def _consume_decoded(self):
+        '''Routes the samples decoded by the decoder processes until the server is stopped'''
+        while self._running:
+            for records in self._decoders.drain(timeout=0.1):
+                self._handle_decoded(records)
+
+
+    def _handle_decoded(self, records):
+        '''Routes the records of a ring, every read is routed, acknowledged and recorded separately
+
         Args:
-            encoded_data {bytes} -- pyasn1 encoded data
-            
-        Return:
-            data {dict} -- the data decoded and wrapped into a dict
+            records {np.ndarray} -- RESULT_DTYPE records from a single decoder process, in the order they were decoded
         '''
+        # the records of a read are consecutive and share the connection and read time, a CLOSED record has no read time
+        connection_ids, read_at = records["connection_id"], records["read_at"]
+        breaks = np.flatnonzero((connection_ids[1:] != connection_ids[:-1]) | (read_at[1:] != read_at[:-1])) + 1
+
+        for read in np.split(records, breaks):
+            connection_id = int(read["connection_id"][0])
+            if read["status"][0] == CLOSED:
+                self._sources.pop(connection_id, None)
+                self._writers.pop(connection_id, None)
+                self._sequences.pop(connection_id, None)
+                self._close_connection(connection_id)
+                continue
+
+            source_id = self._sources.get(connection_id, f"connection-{connection_id}")
+            received_at = float(read["received_at"][0])
+
+            samples = []
+            for status, values in zip(read["status"].tolist(), read["values"].tolist()):
+                if status == DECODED:
+                    samples.append(VitalSample(*values, received_at=received_at, source_id=source_id))
+                elif status == FAILED:
+                    self.stats.record_decode_failure(connection_id, ValueError("frame could not be decoded by the decoder process"))
+
+            routed_started = time.perf_counter()
+            if samples:
+                self._route(source_id, samples)
+
+            routed_at = time.perf_counter()
+            self.stats.record_decoded(
+                connection_id,
+                messages=len(samples),
+                decode_seconds=float(read["decode_seconds"].sum()),
+                route_seconds=routed_at - routed_started,
+                recv_to_emit=routed_at - float(read["read_at"][0]),
+            )
+
+            if self._ack:
+                self._send_acks(connection_id, len(read))
+
+
+    def _send_acks(self, connection_id, frames):
+        '''Acknowledges the next frames of a connection from the consumer thread, only used in process mode'''
+        first = self._sequences.get(connection_id, 0) + 1
+        self._sequences[connection_id] = first + frames - 1
+
+        writer = self._writers.get(connection_id)
+        if writer is None or self._loop.is_closed():
+            return
+
+        acks = b"".join(struct.pack("!I", sequence & 0xFFFFFFFF) for sequence in range(first, first + frames))
         try:
-            decoded_data, _ = decode(encoded_data, VitalSigns())
-            data = {} 
+            self._loop.call_soon_threadsafe(self._write_acks, writer, acks)
+        except RuntimeError:
+            # the event loop closed while the acks were built
+            pass
+
+
+    @staticmethod
+    def _write_acks(writer, acks):
+        if not writer.is_closing():
+            writer.write(acks)
+
+
+    def _route(self, source_id, samples):
+        '''Routes decoded samples to their patient's sinks and the frontend'''
+        # a binding can be on the exact peer address or on the device host
+        binding = self._bindings.get(source_id) or self._bindings.get(source_id.rsplit(":", 1)[0])
+        focused = self._focused_binding
+        if binding is None:
+            binding = focused
+
+        if binding is None:
+            # nobody to route to
+            return
+
+        patient_key, age = binding
+        for sample in samples:
+            sample.age = age
+
+        for sink in self._sinks:
+            for sample in samples:
+                sink(sample, patient_key)
+
+        # only the patient on screen is sent to the frontend
+        if focused is not None and focused[0] == patient_key:
+            for sample in samples:
+                self.vitals_data.emit(sample)
+
+
+    @staticmethod
+    def _binding(patient):
+        '''Util method to build the (patient key, age) binding for a patient, keyed by MRN'''
+        age = None
+        if patient.dob:
+            age = int((datetime.now().date() - patient.dob).days/365.25)
+
+        return patient.patient_mrn, age
+
+
+    def bind_device(self, source_id, patient):
+        '''Routes every sample received from a device to a patient
+
+        Args:
+            source_id {str} -- the device, either its "host:port" peer address or just its host
+            patient {Patient} -- the patient the device is monitoring
+        '''
+        self._bindings[source_id] = self._binding(patient)
+
+
+    def unbind_device(self, source_id):
+        '''Removes the binding of a device, its samples follow the focused patient again'''
+        self._bindings.pop(source_id, None)
+
+
+    def forget_patient(self, patient_key):
+        '''Drops the device bindings of a patient, e.g. once they are deleted
+
+        Args:
+            patient_key {str} -- the patient's MRN
+        '''
+        for source_id, binding in list(self._bindings.items()):
+            if binding[0] == patient_key:
+                self._bindings.pop(source_id, None)
+
+
+    def bound_devices(self, patient=None):
+        '''Returns the devices bound to a patient, or every binding if no patient is given'''
+        if patient is None:
+            return {source_id: binding[0] for source_id, binding in self._bindings.items()}
+
+        return [source_id for source_id, binding in self._bindings.items() if binding[0] == patient.patient_mrn]
 
-            # loop throuhg the data sent (pyasn1 bytes) and place it into a dict for further processing
-            for field in decoded_data:
-                data[field] = str(decoded_data[field]['value'])
 
-            return data
+    def focus_patient(self, patient):
+        '''Sets the patient being displayed, only their samples are emitted through vitals_data
+
+        Args:
+            patient {Patient or None} -- the displayed patient, None stops emitting to the frontend
+        '''
+        self._focused_binding = self._binding(patient) if patient is not None else None
+
+
+    def add_sink(self, callback):
+        '''Registers a callback that receives every sample routed to a patient
+
+        The callback is called from the ingest thread as callback(sample, patient_key)
+        '''
+        self._sinks.append(callback)
+
+
+    def _process_data(self, encoded_data, source_id=None, received_at=None, connection_id=None):
+        '''Processes incoming pyasn1 data and converts it to a VitalSample for further processing
+
+        Args:
+            encoded_data {bytes or memoryview} -- a single pyasn1 encoded frame
+            source_id {str} -- the device the frame was received from
+            received_at {float} -- unix timestamp the frame was received at, defaults to now
+            connection_id {int} -- the connection decode failures are recorded against
+
+        Return:
+            data {VitalSample} -- the decoded vitals, None if the frame could not be decoded
+        '''
+        try:
+            # fast path decoder, falls back to pyasn1 if the frame does not match the schema
+            integers = decode_vitals(encoded_data)
         except Exception as e:
+            self.stats.record_decode_failure(connection_id, e)
             return None
 
+        # each observation is encoded as (mdcCode, unitCode, value), only the values are sent on
+        return VitalSample(*integers[2::3], received_at=received_at or time.time(), source_id=source_id)
+
+
+    def _open_connection(self, address):
+        '''Registers a new connection and returns its id and peer address'''
+        connection_id = next(self._connection_ids)
+        peer = f"{address[0]}:{address[1]}" if address else f"connection-{connection_id}"
+        self.stats.open_connection(connection_id, peer)
+
+        return connection_id, peer
+
+
+    def _close_connection(self, connection_id):
+        '''Removes a connection and prints its throughput'''
+        stats = self.stats.close_connection(connection_id)
+
+        if stats:
+            print(f"Closing connection {stats['peer']} ({stats['messages']} messages, {stats['messages_per_sec']:.1f} msg/s, {stats['malformed']} malformed)")
+
+
+    def connection_throughput(self):
+        '''Returns the throughput of every open connection
+
+        Returns:
+            throughput {dict} -- connection id mapped to its message and byte counts and rates
+        '''
+        return self.stats.connections()
+
+
+    def get_stats(self):
+        '''Returns the ingest stats, see IngestStats.snapshot()
+
+        Returns:
+            stats {dict} -- totals, per stage times, decode and recv-to-emit latency percentiles and per connection counters
+        '''
+        return self.stats.snapshot()
+
 
     def stop_server(self):
         '''Stops the server'''
@@ -109,6 +551,13 @@ class VitalsManager(QObject):
             self._running = False
             print("Stopping the socket server for the vitals manager")
 
+            if self._mode in ("async", "process"):
+                # the event loop owns the socket, let it close the server and connections
+                if not self._loop.is_closed():
+                    self._loop.call_soon_threadsafe(self._stop_event.set)
+                if self._loop_thread:
+                    self._loop_thread.join(timeout=5)
+
             try:
                 # stops the socket from sending and receing data immediately
                 self.server_socket.shutdown(socket.SHUT_RDWR)
@@ -118,4 +567,14 @@ class VitalsManager(QObject):
 
             self.server_socket.close()
             self.executor.shutdown(wait=False)
+
+            if self._decoders:
+                # route whatever the decoder processes finish after the consumer thread stopped
+                if self._consumer_thread:
+                    self._consumer_thread.join(timeout=5)
+                for records in self._decoders.stop():
+                    self._handle_decoded(records)
+
+            if self._capture:
+                self._capture.close()
             print("Stopped vitals manager")
@@ -0,0 +1,65 @@
+import math
+
+class LatencyHistogram:
+    '''Log-spaced histogram of latencies in seconds.
+
+    Recording is O(1) and the memory used is fixed no matter how many values
+    are recorded. Percentiles are accurate to the bucket width, about 12% with
+    the default 20 buckets per decade.
+
+    Methods:
+        record(seconds, count) -- adds a latency, count times
+        percentile(pct) -- returns the latency below which pct percent of the values fall
+        snapshot() -- returns the count, mean, max and p50/p90/p99 as a dict
+    '''
+    def __init__(self, min_seconds=1e-6, max_seconds=100.0, buckets_per_decade=20):
+        self._min = min_seconds
+        self._scale = buckets_per_decade / math.log(10)
+        self._buckets = [0] * (int(math.log(max_seconds / min_seconds) * self._scale) + 2)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    def record(self, seconds, count=1):
+        '''Adds a latency to the histogram, count times'''
+        if seconds <= self._min:
+            idx = 0
+        else:
+            idx = min(int(math.log(seconds / self._min) * self._scale) + 1, len(self._buckets) - 1)
+
+        self._buckets[idx] += count
+        self.count += count
+        self.total += seconds * count
+        if seconds > self.max:
+            self.max = seconds
+
+
+    def percentile(self, pct):
+        '''Returns the upper bound of the bucket holding the pct percentile, 0 if nothing was recorded'''
+        if not self.count:
+            return 0.0
+
+        target = self.count * pct / 100
+        seen = 0
+        for idx, bucket in enumerate(self._buckets):
+            seen += bucket
+            if seen >= target and bucket:
+                # the last bucket holds everything above the range
+                if idx == len(self._buckets) - 1:
+                    return self.max
+                return min(self._min * math.exp(idx / self._scale), self.max)
+
+        return self.max
+
+
+    def snapshot(self):
+        '''Returns a summary of the histogram, latencies are in milliseconds'''
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
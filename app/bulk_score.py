@@ -0,0 +1,353 @@
+'''Scores historical vitals offline with the same models and post-processing as the MLManager.
+
+The input is either a CSV file with a header naming the features (the keys
+MLManager._preprocess() takes: respiratoryRate, heartRate, meanArterialPressure,
+diastolicBP, systolicBP, spo2, age, pulsePressure) or a capture file recorded
+with app.py --capture. age may be missing (--age is used instead) and
+pulsePressure is derived from the blood pressures when it is missing. Rows
+still missing a vital, e.g. a blank or unparseable CSV value, are not scored
+and are written as N/A.
+
+The input is streamed in chunks of --chunk-size rows which are parsed, scored
+and written in order by a pool of processes, each of which loads the model
+once. At most two chunks per process are in flight, so memory stays bounded
+however large the input is.
+
+To run from the app directory:
+    python3 bulk_score.py vitals.csv predictions.csv --model xgb --processes 4
+    python3 bulk_score.py vitals.fscap predictions.csv --age 60 --backend compiled
+'''
+import os
+import csv
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from backend.ingest.capture import MAGIC, CaptureReader
+from backend.ingest.decoder import decode_vitals
+from backend.inference.memo import PredictionMemo
+from backend.inference.registry import ModelRegistry
+from backend.managers.ml_manager import FEATURE_NAMES, PREDICTION_MAPPINGS, UNKNOWN_PREDICTION
+from vitals_data_models import VitalSample
+
+MODEL_DIR = Path(__file__).parent.joinpath("models")
+
+# label written for rows that could not be scored, e.g. a captured frame that does not decode or a row missing a vital
+FAILED = -1
+
+# where every VitalSample field (in schema order) goes in a feature row
+SAMPLE_COLUMNS = [FEATURE_NAMES.index(field) for field in VitalSample.FIELDS]
+AGE = FEATURE_NAMES.index('age')
+PULSE_PRESSURE = FEATURE_NAMES.index('pulsePressure')
+SYSTOLIC = FEATURE_NAMES.index('systolicBP')
+DIASTOLIC = FEATURE_NAMES.index('diastolicBP')
+
+# the model and memo of a worker process, set by _init_worker()
+_model = None
+_memo = None
+
+
+def _init_worker(model_type, binary, backend, model_dir, memo_size):
+    '''Runs once in every worker process, loads and warms the model'''
+    global _model, _memo
+    _model = ModelRegistry(model_dir, capacity=1, backend=backend).get(model_type, binary)
+    _model.predict(np.zeros((1, len(FEATURE_NAMES))))
+    _memo = PredictionMemo(memo_size) if memo_size else None
+
+
+def _predict(features, scored=None):
+    '''Predicts the label of every row, rows not in scored get FAILED'''
+    labels = np.full(len(features), FAILED, dtype=np.int64)
+    if scored is None:
+        scored = np.ones(len(features), dtype=bool)
+    if not scored.any():
+        return labels
+
+    rows = features[scored]
+    labels[scored] = _memo.predict(_model, rows) if _memo is not None else _model.predict(rows)
+    return labels
+
+
+def _fill_derived(features, age):
+    '''Fills in the age of rows without one and the pulse pressure of rows without one'''
+    missing_age = np.isnan(features[:, AGE])
+    features[missing_age, AGE] = age
+
+    missing_pulse = np.isnan(features[:, PULSE_PRESSURE])
+    features[missing_pulse, PULSE_PRESSURE] = features[missing_pulse, SYSTOLIC] - features[missing_pulse, DIASTOLIC]
+
+
+def _parse_float(value):
+    try:
+        return float(value) if value.strip() else np.nan
+    except ValueError:
+        return np.nan
+
+
+def score_csv_chunk(lines, columns, age):
+    '''Runs in a worker, parses and scores a chunk of CSV lines
+
+    Args:
+        lines {List[str]} -- CSV lines without the header
+        columns {List[int or None]} -- CSV column of every feature, None if the CSV does not have it
+        age {float} -- age of the rows without one
+
+    Returns:
+        labels {np.ndarray} -- one label per line, FAILED if the line is missing a vital
+    '''
+    features = np.full((len(lines), len(FEATURE_NAMES)), np.nan, dtype=np.float32)
+    present = [idx for idx, column in enumerate(columns) if column is not None]
+    usecols = [columns[idx] for idx in present]
+
+    try:
+        # numpy's C parser handles the common case of a clean numeric chunk
+        features[:, present] = np.loadtxt(lines, delimiter=",", quotechar='"', usecols=usecols, dtype=np.float32, ndmin=2)
+    except ValueError:
+        # a blank or unparseable value somewhere in the chunk, only its row fails rather than the whole chunk
+        for row_idx, row in enumerate(csv.reader(lines)):
+            for idx, column in zip(present, usecols):
+                features[row_idx, idx] = _parse_float(row[column]) if column < len(row) else np.nan
+
+    _fill_derived(features, age)
+    return _predict(features, ~np.isnan(features).any(axis=1))
+
+
+def score_capture_chunk(frames, age):
+    '''Runs in a worker, decodes and scores a chunk of captured frames
+
+    Args:
+        frames {List[bytes]} -- raw DER frames
+        age {float} -- age of every sample, captures do not carry it
+
+    Returns:
+        labels {np.ndarray} -- one label per frame, FAILED if the frame does not decode or is missing a vital
+    '''
+    features = np.full((len(frames), len(FEATURE_NAMES)), np.nan, dtype=np.float32)
+    decoded = np.zeros(len(frames), dtype=bool)
+
+    for idx, frame in enumerate(frames):
+        try:
+            features[idx, SAMPLE_COLUMNS] = decode_vitals(frame)[2::3]
+            decoded[idx] = True
+        except Exception:
+            continue
+
+    _fill_derived(features, age)
+    return _predict(features, decoded & ~np.isnan(features).any(axis=1))
+
+
+def read_csv_chunks(csv_file, chunk_size):
+    '''Yields the lines of a CSV file chunk_size at a time, the header has to be read already'''
+    chunk = []
+    for line in csv_file:
+        if not line.strip():
+            continue
+
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def read_capture_chunks(capture, chunk_size):
+    '''Yields (received_at, connection ids, frames) of a capture chunk_size records at a time'''
+    received, connections, frames = [], [], []
+    for received_at, connection_id, frame in capture:
+        received.append(received_at)
+        connections.append(connection_id)
+        # frames are pickled to the workers, copy them out of the memory map
+        frames.append(bytes(frame))
+
+        if len(frames) == chunk_size:
+            yield received, connections, frames
+            received, connections, frames = [], [], []
+
+    if frames:
+        yield received, connections, frames
+
+
+def csv_columns(header, id_column=None):
+    '''Finds the CSV column of every feature
+
+    Args:
+        header {List[str]} -- the CSV header
+        id_column {str} -- column copied to the output next to each prediction, e.g. the patient MRN
+
+    Returns:
+        (columns, id_index) -- CSV column of every feature (None if missing) and of the id column
+
+    Raises:
+        ValueError -- if a vital or the id column is missing
+    '''
+    header = [name.strip() for name in header]
+    columns = [header.index(name) if name in header else None for name in FEATURE_NAMES]
+
+    missing = [name for name, column in zip(FEATURE_NAMES, columns) if column is None and name not in ('age', 'pulsePressure')]
+    if missing:
+        raise ValueError(f"CSV is missing the columns: {', '.join(missing)}")
+
+    if id_column is not None and id_column not in header:
+        raise ValueError(f"CSV is missing the id column: {id_column}")
+
+    return columns, header.index(id_column) if id_column is not None else None
+
+
+class _InlineExecutor:
+    '''Runs the chunks in the calling process, for --processes 0'''
+    def __init__(self, initializer, initargs):
+        initializer(*initargs)
+
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def score(input_path, output_path, model_type="xgb", binary=False, backend="library", chunk_size=10000, processes=None,
+          age=0, id_column=None, report_interval=5.0, model_dir=MODEL_DIR, memo_size=4096):
+    '''Scores every row of a CSV or capture file and writes the predictions to a CSV file
+
+    Args:
+        input_path {str or Path} -- CSV or capture file
+        output_path {str or Path} -- CSV file the predictions are written to
+        model_type {str} -- 'xgb' or 'rf'
+        binary {bool} -- whether the binary or ternary model is used
+        backend {str} -- 'library' or 'compiled', see ModelRegistry
+        chunk_size {int} -- rows parsed and scored together
+        processes {int} -- worker processes, defaults to one less than the number of cores, 0 scores in this process
+        age {float} -- age of the rows without one
+        id_column {str} -- CSV column copied to the output, e.g. the patient MRN
+        report_interval {float} -- seconds between progress reports, 0 only reports the total
+        model_dir {str or Path} -- directory holding the models
+        memo_size {int} -- feature vectors memoized by every worker, 0 disables the memo
+
+    Returns:
+        summary {dict} -- rows scored, rows that failed, seconds and rows per second
+    '''
+    input_path = Path(input_path)
+    if processes is None:
+        processes = max(1, (os.cpu_count() or 2) - 1)
+
+    with open(input_path, "rb") as input_file:
+        is_capture = input_file.read(len(MAGIC)) == MAGIC
+
+    initargs = (model_type, bool(binary), backend, Path(model_dir), memo_size)
+    if processes > 0:
+        executor = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=initargs)
+    else:
+        executor = _InlineExecutor(_init_worker, initargs)
+
+    mapping = PREDICTION_MAPPINGS[bool(binary)]
+    outcomes = {label: (info['label'], info['suggested_action']) for label, info in mapping.items()}
+    unknown = (UNKNOWN_PREDICTION['label'], UNKNOWN_PREDICTION['suggested_action'])
+    max_in_flight = max(1, 2 * processes)
+
+    rows = failed = 0
+    started = last_report = time.perf_counter()
+    in_flight = deque()
+
+    def write_next(writer):
+        '''Waits for the oldest chunk in flight and writes its predictions'''
+        nonlocal rows, failed, last_report
+        future, context = in_flight.popleft()
+        labels = future.result().tolist()
+
+        if is_capture:
+            writer.writerows(
+                (rows + idx, received_at, connection_id) + outcomes.get(label, unknown)
+                for idx, (received_at, connection_id, label) in enumerate(zip(*context, labels))
+            )
+        elif context is not None:
+            writer.writerows((rows + idx, key) + outcomes.get(label, unknown) for idx, (key, label) in enumerate(zip(context, labels)))
+        else:
+            writer.writerows((rows + idx,) + outcomes.get(label, unknown) for idx, label in enumerate(labels))
+
+        rows += len(labels)
+        failed += labels.count(FAILED)
+
+        now = time.perf_counter()
+        if report_interval and now - last_report >= report_interval:
+            last_report = now
+            print(f"Scored {rows} rows ({rows / (now - started):.0f} rows/s)")
+
+    try:
+        with open(output_path, "w", newline="") as output_file:
+            writer = csv.writer(output_file)
+
+            if is_capture:
+                writer.writerow(("row", "received_at", "connection_id", "label", "suggested_action"))
+                with CaptureReader(input_path) as capture:
+                    for received, connections, frames in read_capture_chunks(capture, chunk_size):
+                        in_flight.append((executor.submit(score_capture_chunk, frames, age), (received, connections)))
+                        if len(in_flight) >= max_in_flight:
+                            write_next(writer)
+            else:
+                with open(input_path, newline="") as csv_file:
+                    columns, id_index = csv_columns(next(csv.reader([csv_file.readline()])), id_column)
+                    writer.writerow(("row",) + ((id_column,) if id_column is not None else ()) + ("label", "suggested_action"))
+
+                    for lines in read_csv_chunks(csv_file, chunk_size):
+                        ids = [row[id_index] if id_index < len(row) else "" for row in csv.reader(lines)] if id_index is not None else None
+                        in_flight.append((executor.submit(score_csv_chunk, lines, columns, age), ids))
+                        if len(in_flight) >= max_in_flight:
+                            write_next(writer)
+
+            while in_flight:
+                write_next(writer)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    summary = {"rows": rows, "failed": failed, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0}
+    print(f"Scored {rows} rows in {seconds:.2f}s ({summary['rows_per_second']:.0f} rows/s), {failed} failed")
+    return summary
+
+
+def parse_arguments(args=None):
+    '''Parses the bulk scoring arguments
+
+    Kwargs:
+        args {List[str]} -- list of args to parse, default is cli args (sys.argv)
+    '''
+    parser = argparse.ArgumentParser(description="Score historical vitals offline")
+    parser.add_argument("input", help="CSV file of vitals or a capture file recorded with app.py --capture")
+    parser.add_argument("output", help="CSV file the predictions are written to")
+    parser.add_argument("--model", choices=["xgb", "rf"], default="xgb", help="Model to score with")
+    parser.add_argument("--binary", action="store_true", default=False, help="Use the binary instead of the ternary model")
+    parser.add_argument("--backend", choices=["library", "compiled"], default="library", help="Predict with XGBoost/scikit-learn or the compiled NumPy tree evaluator")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows parsed and scored together")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, one less than the number of cores by default, 0 scores in this process")
+    parser.add_argument("--age", type=float, default=0, help="Age of the rows without one, captures never have one")
+    parser.add_argument("--id-column", default=None, help="CSV column copied to the output next to each prediction, e.g. the patient MRN")
+    parser.add_argument("--report-interval", type=float, default=5.0, metavar="SECONDS", help="Seconds between progress reports, 0 only reports the total")
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    score(
+        args.input,
+        args.output,
+        model_type=args.model,
+        binary=args.binary,
+        backend=args.backend,
+        chunk_size=args.chunk_size,
+        processes=args.processes,
+        age=args.age,
+        id_column=args.id_column,
+        report_interval=args.report_interval,
+    )
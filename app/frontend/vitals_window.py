@@ -1,5 +1,4 @@
 import sys
-from datetime import datetime
 
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtCore import QTimer, QDateTime, pyqtSlot
@@ -19,7 +18,8 @@ class VitalsWindow(BaseWindow):
         self._fluid_manager = fluid_manager
         self._vitals_manager = vitals_manager
         self._ml_manager = ml_manager
-        self._ml_manager.load_model()
+        # load the model in the background so the window does not wait for it
+        self._ml_manager.load_model_async()
 
         # used to better represent the open/close state of the popup
         self.popup = None
@@ -32,8 +32,10 @@ class VitalsWindow(BaseWindow):
         self.popup_button.clicked.connect(self._open_popup)
         
         # connect the pyqt signal for the ml manager to run the inference
-        self._ml_manager.prediction_ready.connect(self._update_inference_fields)
-        self.inference_button.clicked.connect(self._ml_manager.run_batched_inference)
+        # results arrive after the request, only show them if their patient is still displayed
+        self._ml_manager.prediction_ready.connect(self._update_patient_prediction)
+        self._ml_manager.patient_prediction_ready.connect(self._update_patient_prediction)
+        self.inference_button.clicked.connect(self._run_inference)
         
         # setup ui components
         self._setup_units()
@@ -120,6 +122,12 @@ class VitalsWindow(BaseWindow):
             return
 
         current_patient = self.patient_state.current_patient
+
+        # only the displayed patient's vitals are sent to this window
+        self._vitals_manager.focus_patient(current_patient)
+        self._pp_max = None
+        self._pp_min = None
+
         self.volume_status_value.setText("")
         self.suggested_action_value.setText("")
         self.name_value.setText(f"{current_patient.firstname} {current_patient.lastname}")
@@ -128,29 +136,43 @@ class VitalsWindow(BaseWindow):
 
 
     # slot supposedly increases memory efficieny and performance
-    @pyqtSlot(dict)
-    def _update_vitals(self, vitals_data):
-        '''Update the vitals being shown on the page'''
-        if not vitals_data:
+    @pyqtSlot(object)
+    def _update_vitals(self, vitals_sample):
+        '''Update the vitals being shown on the page
+
+        Args:
+            vitals_sample {VitalSample} -- the latest vitals received from the vitals manager
+        '''
+        if not vitals_sample:
             return
 
         # Update vital sign display values
-        self.heart_rate_value.setText(str(vitals_data.get("heartRate", "")))
-        self.map_value.setText(str(vitals_data.get("meanArterialPressure", "")))
-        self.rr_value.setText(str(vitals_data.get("respiratoryRate", "")))
-        self.blood_pressure_value.setText(f"{vitals_data.get('systolicBP', '')} / {vitals_data.get('diastolicBP', '')}")
-        self.spo2_value.setText(str(vitals_data.get("spo2", "")))
-
-        ppv = self._calculate_ppv(
-            vitals_data.get('systolicBP', ''), 
-            vitals_data.get('diastolicBP', '')
-        )
+        self.heart_rate_value.setText(str(vitals_sample.heartRate))
+        self.map_value.setText(str(vitals_sample.meanArterialPressure))
+        self.rr_value.setText(str(vitals_sample.respiratoryRate))
+        self.blood_pressure_value.setText(f"{vitals_sample.systolicBP} / {vitals_sample.diastolicBP}")
+        self.spo2_value.setText(str(vitals_sample.spo2))
+
+        ppv = self._calculate_ppv(vitals_sample.systolicBP, vitals_sample.diastolicBP)
         self.ppv_value.setText(ppv)
 
-        # add pulse pressure and age for inference (not sent with the mocker)
-        vitals_data['pulsePressure'] = int(vitals_data['systolicBP']) - int(vitals_data['diastolicBP'])
-        vitals_data['age'] = int((datetime.now().date() - self.patient_state.current_patient.dob).days/365.25)
-        self._ml_manager.add_to_cache(vitals_data)
+
+    def _run_inference(self):
+        '''Run batched inference for the displayed patient, the vitals manager routes their samples to the ml cache
+
+        Inference runs on the ml manager's worker thread, the result comes back through prediction_ready
+        '''
+        if self.patient_state.current_patient is None:
+            return
+
+        self._ml_manager.request_batched_inference(self.patient_state.current_patient.patient_mrn)
+
+
+    def _update_patient_prediction(self, patient_key, prediction):
+        '''set the suggested actions from a requested or continuous inference, only if the prediction is for the displayed patient'''
+        current_patient = self.patient_state.current_patient
+        if current_patient is not None and current_patient.patient_mrn == patient_key:
+            self._update_inference_fields(prediction)
 
 
     def _update_inference_fields(self, prediction): 
@@ -166,7 +188,7 @@ class VitalsWindow(BaseWindow):
             return ""
         
         # calculate the current pulse pressure
-        current_pp = int(systolic) - int(diastolic)
+        current_pp = systolic - diastolic
 
         if self._pp_max is None or self._pp_min is None:
             # no ppv if it is the first reading, return zero and update the min and max
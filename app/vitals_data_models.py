@@ -15,4 +15,49 @@ class VitalSigns(univ.Sequence):
         namedtype.NamedType('respiratoryRate', NumericObservation()),
         namedtype.NamedType('systolicBP', NumericObservation()),
         namedtype.NamedType('diastolicBP', NumericObservation()),
-    )
\ No newline at end of file
+    )
+
+class VitalSample:
+    '''Compact, typed record of a single set of vitals received from a device.
+
+    Decoded values are kept as numbers from the decoder to the frontend and the
+    ML cache, __slots__ keeps every sample a single small allocation rather
+    than a dict of strings.
+
+    Attributes:
+        heartRate, meanArterialPressure, spo2, respiratoryRate, systolicBP, diastolicBP {int} -- the vitals
+        received_at {float} -- unix timestamp the sample was received at
+        source_id {str} -- the device (connection) the sample was received from
+        age {int} -- age of the patient in years, filled in once the patient is known
+    '''
+    # same order as the VitalSigns schema
+    FIELDS = ('heartRate', 'meanArterialPressure', 'spo2', 'respiratoryRate', 'systolicBP', 'diastolicBP')
+
+    __slots__ = FIELDS + ('received_at', 'source_id', 'age')
+
+    def __init__(self, heartRate, meanArterialPressure, spo2, respiratoryRate, systolicBP, diastolicBP, received_at=0.0, source_id=None, age=None):
+        self.heartRate = heartRate
+        self.meanArterialPressure = meanArterialPressure
+        self.spo2 = spo2
+        self.respiratoryRate = respiratoryRate
+        self.systolicBP = systolicBP
+        self.diastolicBP = diastolicBP
+        self.received_at = received_at
+        self.source_id = source_id
+        self.age = age
+
+
+    @property
+    def pulsePressure(self):
+        '''Pulse pressure derived from the systolic and diastolic blood pressure'''
+        return self.systolicBP - self.diastolicBP
+
+
+    def to_dict(self):
+        '''Returns the vitals as a dict keyed by the field names'''
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+    def __repr__(self):
+        vitals = ", ".join(f"{field}={getattr(self, field)}" for field in self.FIELDS)
+        return f"VitalSample({vitals}, source_id={self.source_id!r})"
@@ -0,0 +1,65 @@
+'''Benchmark comparing one batched inference per patient with the batch scheduler's single call per tick.
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/bench_batch_scheduler.py --model xgb --census 1 10 50 100
+'''
+import os
+import sys
+import timeit
+import argparse
+
+# add the app directory to the system path to allow the modules to be imported
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+import numpy as np
+
+from backend.managers.ml_manager import MLManager
+
+# plausible ranges of every feature, in the MLManager's feature order
+LOW = [5, 40, 40, 30, 70, 80, 18, 10]
+HIGH = [40, 150, 130, 110, 200, 100, 95, 90]
+
+
+def per_patient(manager, windows):
+    '''One predict call and majority vote per patient, like a batched inference request per patient'''
+    return [manager._majority_vote(manager.model.predict(window)) for window in windows]
+
+
+def per_tick(manager, windows):
+    '''One predict_proba call over every window, split back per patient, like MLManager._score_tick'''
+    proba = manager.model.predict_proba(np.concatenate(windows))
+    bounds = np.cumsum([len(window) for window in windows])[:-1]
+    return [manager._majority_vote(np.argmax(rows, axis=1)) for rows in np.split(proba, bounds)]
+
+
+def run(model_type, backend, census_sizes, window, number):
+    manager = MLManager(model_type=model_type, max_cache_size=window, backend=backend)
+    manager.load_model()
+    rng = np.random.default_rng(0)
+
+    print(f"{'patients':>8} {'per patient ms':>15} {'per tick ms':>12} {'us/patient (tick)':>18} {'speedup':>8}")
+    for census in census_sizes:
+        windows = [np.rint(rng.uniform(LOW, HIGH, (window, len(LOW)))).astype(np.float32) for _ in range(census)]
+        assert per_patient(manager, windows) == per_tick(manager, windows)
+
+        timings = []
+        for func in (per_patient, per_tick):
+            best = min(timeit.repeat(lambda: func(manager, windows), number=number, repeat=5))
+            timings.append(best / number * 1e3)
+
+        print(f"{census:>8} {timings[0]:>15.2f} {timings[1]:>12.2f} {timings[1] / census * 1e3:>18.0f} {timings[0] / timings[1]:>7.1f}x")
+
+    manager.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="xgb", choices=["xgb", "rf"], help="Model to benchmark")
+    parser.add_argument("--backend", default="library", choices=["library", "compiled"], help="Inference backend")
+    parser.add_argument("--census", type=int, nargs="+", default=[1, 10, 50, 100], help="Numbers of patients scored per tick")
+    parser.add_argument("--window", type=int, default=100, help="Cached rows per patient")
+    parser.add_argument("--number", type=int, default=3, help="Ticks per repeat")
+    args = parser.parse_args()
+    run(args.model, args.backend, args.census, args.window, args.number)
@@ -0,0 +1,81 @@
+'''Benchmark comparing per-sample inference with a single predict call over the stacked samples and over the ML cache's feature rows.
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/bench_batched_inference.py --model xgb --cache-size 100
+'''
+import os
+import sys
+import timeit
+import argparse
+from collections import Counter
+
+# add the app directory to the system path to allow the modules to be imported
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+import numpy as np
+
+from vitals_data_models import VitalSample
+from backend.managers.ml_manager import MLManager
+
+
+def build_cache(manager, size, seed=0):
+    '''Fills the cache of a patient with random but plausible vitals, returns the samples'''
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(size):
+        systolic = int(rng.integers(80, 170))
+        diastolic = int(rng.integers(40, 100))
+        sample = VitalSample(
+            int(rng.integers(50, 130)), (systolic + 2 * diastolic) // 3, int(rng.integers(88, 100)),
+            int(rng.integers(10, 30)), systolic, diastolic, age=int(rng.integers(20, 90)),
+        )
+        manager.add_to_cache(sample, "bench")
+        samples.append(sample)
+    return samples
+
+
+def loop_path(manager, samples):
+    '''The original run_batched_inference, a predict call per cached sample'''
+    predictions = [manager._raw_predict(sample) for sample in samples]
+    return manager._post_process(Counter(predictions).most_common(1)[0][0])
+
+
+def stacked_path(manager, samples):
+    '''The samples stacked into a feature matrix on every call and a single predict call'''
+    features = np.array([manager._feature_row(sample) for sample in samples], dtype=float)
+    predictions = np.asarray(manager.model.predict(features)).astype(np.int64).ravel()
+    return manager._post_process(manager._majority_vote(predictions))
+
+
+def cached_path(manager, samples):
+    '''The feature rows written into the cache as the samples arrived and a single predict call'''
+    features = manager.cache("bench").view()
+    predictions = np.asarray(manager.model.predict(features)).astype(np.int64).ravel()
+    return manager._post_process(manager._majority_vote(predictions))
+
+
+def run(model_type, cache_size, number):
+    # without the memo so every path pays for the model
+    manager = MLManager(model_type=model_type, max_cache_size=cache_size, memo_size=0)
+    manager.load_model()
+    samples = build_cache(manager, cache_size)
+    assert loop_path(manager, samples) == stacked_path(manager, samples) == cached_path(manager, samples)
+
+    results = {}
+    for name, func in (("per sample", loop_path), ("stacked", stacked_path), ("cached", cached_path)):
+        best = min(timeit.repeat(lambda: func(manager, samples), number=number, repeat=5))
+        results[name] = best / number * 1e3
+        print(f"{name:<12} {results[name]:9.3f} ms/inference  ({cache_size} cached samples)")
+
+    print(f"\nspeedup: {results['per sample'] / results['cached']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="xgb", choices=["xgb", "rf"], help="Model to benchmark")
+    parser.add_argument("--cache-size", type=int, default=100, help="Number of cached samples per inference")
+    parser.add_argument("--number", type=int, default=10, help="Number of inferences per repeat")
+    args = parser.parse_args()
+    run(args.model, args.cache_size, args.number)
@@ -0,0 +1,55 @@
+'''Benchmark comparing the XGBoost/scikit-learn models with their compiled NumPy evaluator.
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/bench_compiled.py --batch-sizes 1 10 100
+'''
+import os
+import sys
+import timeit
+import argparse
+
+# add the app directory to the system path to allow the modules to be imported
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+import numpy as np
+
+from backend.inference.registry import ModelRegistry, MODEL_FILES
+
+MODEL_DIR = os.path.join(APP_DIR, "models")
+
+# plausible ranges of every feature, in the MLManager's feature order
+LOW = [5, 40, 40, 30, 70, 80, 18, 10]
+HIGH = [40, 150, 130, 110, 200, 100, 95, 90]
+
+
+def run(batch_sizes, number):
+    library = ModelRegistry(MODEL_DIR, capacity=len(MODEL_FILES))
+    compiled = ModelRegistry(MODEL_DIR, capacity=len(MODEL_FILES), backend="compiled")
+    rng = np.random.default_rng(0)
+
+    print(f"{'model':<20} {'rows':>6} {'library ms':>12} {'compiled ms':>12} {'speedup':>8}")
+    for model_type, binary in MODEL_FILES:
+        library_model = library.get(model_type, binary)
+        compiled_model = compiled.get(model_type, binary)
+        name = f"{model_type} binary={binary}"
+
+        for size in batch_sizes:
+            features = np.rint(rng.uniform(LOW, HIGH, (size, 8)))
+            assert np.array_equal(library_model.predict(features), compiled_model.predict(features))
+
+            timings = []
+            for model in (library_model, compiled_model):
+                best = min(timeit.repeat(lambda: model.predict(features), number=number, repeat=5))
+                timings.append(best / number * 1e3)
+
+            print(f"{name:<20} {size:>6} {timings[0]:>12.3f} {timings[1]:>12.3f} {timings[0] / timings[1]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100], help="Rows per predict call")
+    parser.add_argument("--number", type=int, default=20, help="Number of predict calls per repeat")
+    args = parser.parse_args()
+    run(args.batch_sizes, args.number)
@@ -0,0 +1,98 @@
+'''Benchmark comparing the pyasn1 decode path with the fast path DER decoder.
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/bench_decoder.py
+'''
+import os
+import sys
+import timeit
+import argparse
+import tracemalloc
+
+# add the app directory to the system path to allow the modules to be imported
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from pyasn1.codec.ber.decoder import decode
+from pyasn1.codec.der.encoder import encode
+
+from vitals_data_models import VitalSigns, NumericObservation, VitalSample
+from backend.ingest.decoder import fast_decode, VITAL_FIELDS
+
+
+def build_message():
+    '''Encodes a VitalSigns message the same way the vitals agent does'''
+    mdc_codes = {
+        'heartRate': (18402, 264864),
+        'meanArterialPressure': (18949, 266016),
+        'spo2': (150456, 262144),
+        'respiratoryRate': (18945, 266016),
+        'systolicBP': (18947, 266016),
+        'diastolicBP': (18948, 266016),
+    }
+    values = {'heartRate': 80, 'meanArterialPressure': 90, 'spo2': 98, 'respiratoryRate': 14, 'systolicBP': 120, 'diastolicBP': 80}
+
+    message = VitalSigns()
+    for name, (mdc_code, unit_code) in mdc_codes.items():
+        observation = NumericObservation()
+        observation.setComponentByName('mdcCode', mdc_code)
+        observation.setComponentByName('unitCode', unit_code)
+        observation.setComponentByName('value', values[name])
+        message.setComponentByName(name, observation)
+
+    return encode(message)
+
+
+def pyasn1_path(message):
+    '''The original VitalsManager._process_data implementation'''
+    decoded_data, _ = decode(message, VitalSigns())
+    return {field: str(decoded_data[field]['value']) for field in decoded_data}
+
+
+def fast_path(message):
+    '''The fast path decoder, building the same dict'''
+    integers = fast_decode(memoryview(message))
+    return {field: str(value) for field, value in zip(VITAL_FIELDS, integers[2::3])}
+
+
+def sample_path(message):
+    '''The fast path decoder, building a VitalSample'''
+    integers = fast_decode(memoryview(message))
+    return VitalSample(*integers[2::3], received_at=0.0, source_id="bench")
+
+
+def retained_bytes(func, message, samples=10000):
+    '''Measures the memory retained per decoded sample'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [func(message) for _ in range(samples)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return retained / samples
+
+
+def run(number):
+    message = build_message()
+    assert pyasn1_path(message) == fast_path(message)
+
+    results = {}
+    for name, func in (("pyasn1", pyasn1_path), ("fast path", fast_path), ("VitalSample", sample_path), ("fast_decode only", fast_decode)):
+        best = min(timeit.repeat(lambda: func(message), number=number, repeat=5))
+        results[name] = best / number * 1e6
+        print(f"{name:<18} {results[name]:8.2f} us/message  {1e6 / results[name]:>10.0f} messages/s")
+
+    print(f"\nspeedup: {results['pyasn1'] / results['fast path']:.1f}x")
+
+    # memory held by every sample while it sits in the ui/ml cache
+    print(f"\ndict of str    {retained_bytes(fast_path, message):8.0f} bytes/sample")
+    print(f"VitalSample    {retained_bytes(sample_path, message):8.0f} bytes/sample")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="Number of messages decoded per repeat")
+    run(parser.parse_args().number)
@@ -0,0 +1,35 @@
+'''Benchmark comparing the pyasn1 encoder with the template encoder used by the vitals agent.
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/bench_encoder.py
+'''
+import os
+import sys
+import timeit
+import argparse
+
+# add the vitals agent directory to the system path to allow the agent to be imported
+AGENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../vitals_agent"))
+if AGENT_DIR not in sys.path:
+    sys.path.append(AGENT_DIR)
+
+from agent import encode_vitals, encode_vitals_fast, generate_mock_vitals
+
+
+def run(number):
+    samples = [generate_mock_vitals() for _ in range(number)]
+    assert all(encode_vitals(sample) == encode_vitals_fast(sample) for sample in samples[:1000])
+
+    results = {}
+    for name, func in (("pyasn1", encode_vitals), ("template", encode_vitals_fast)):
+        best = min(timeit.repeat(lambda: [func(sample) for sample in samples], number=1, repeat=3))
+        results[name] = best / number * 1e6
+        print(f"{name:<10} {results[name]:8.2f} us/message  {1e6 / results[name]:>10.0f} messages/s")
+
+    print(f"\nspeedup: {results['pyasn1'] / results['template']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5000, help="Number of messages encoded per repeat")
+    run(parser.parse_args().number)
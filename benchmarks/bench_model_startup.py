@@ -0,0 +1,71 @@
+'''Benchmark of the cold start of the ML manager, before and after deferring the model load.
+
+Every measurement runs in a fresh interpreter so nothing is already imported or cached.
+    before -- importing the ml manager imported xgboost and joblib, then the window
+              loaded the JSON model before it could show
+    after -- the window only waits for importing the ml manager and building it,
+             the model is loaded from the UBJSON cache and warmed in the background
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/bench_model_startup.py --repeat 5
+'''
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+
+BEFORE = '''
+import time, json
+started = time.perf_counter()
+import numpy as np
+import xgboost as xgb
+import joblib
+imported = time.perf_counter()
+model = xgb.XGBClassifier()
+model.load_model("models/unsupervised_data_xgboost.json")
+model.predict(np.zeros((1, 8)))
+print(json.dumps({"blocking": time.perf_counter() - started, "import": imported - started, "load": time.perf_counter() - imported}))
+'''
+
+AFTER = '''
+import time, json
+started = time.perf_counter()
+from backend.managers.ml_manager import MLManager
+manager = MLManager(model_type="xgb")
+ready = time.perf_counter()
+manager.load_model_async().result()
+print(json.dumps({"blocking": ready - started, "background": time.perf_counter() - ready, **manager.startup_times}))
+manager.shutdown()
+'''
+
+
+def measure(code, repeat):
+    '''Runs code in a fresh interpreter repeat times and returns the median of every timing it prints'''
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+
+
+def run(repeat):
+    # make sure the UBJSON cache exists so the after numbers are for a normal launch
+    measure(AFTER, 1)
+
+    before = measure(BEFORE, repeat)
+    after = measure(AFTER, repeat)
+
+    print(f"before: window blocked {before['blocking']:.3f}s (imports {before['import']:.3f}s, JSON load and first predict {before['load']:.3f}s)")
+    print(f"after:  window blocked {after['blocking']:.3f}s, model ready {after['background']:.3f}s later in the background "
+          f"(load {after['load']:.3f}s, warm-up {after['warm_up']:.3f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters per measurement")
+    run(parser.parse_args().repeat)
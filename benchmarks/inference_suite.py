@@ -0,0 +1,233 @@
+'''Reproducible MLManager inference benchmark suite.
+
+Every model (xgb/rf, binary/ternary) and backend (library/compiled) is
+measured in a fresh process so load time includes the imports and peak RSS
+belongs to that model alone. For each one the suite records:
+    load -- seconds to import, load and warm the model (MLManager.load_model())
+    predict -- p50/p99 latency of MLManager.predict() on a single sample
+    batched -- p50/p99 latency of a batched inference (predict, majority vote, post-process) over 1/10/100/1000 cached rows
+    peak_rss_mb -- peak resident memory of the process
+
+The features are seeded random but plausible vitals and the prediction memo is
+disabled, so every call pays for the model.
+
+To run from the Fluid-Solutions directory:
+    python3 benchmarks/inference_suite.py --output baseline.json
+    python3 benchmarks/inference_suite.py --output current.json --compare baseline.json --threshold 0.2
+
+With --compare, every latency, load time and peak RSS more than --threshold
+(a fraction) worse than the baseline is reported and the exit code is 1.
+'''
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import subprocess
+from importlib import metadata
+
+# add the app directory to the system path to allow the modules to be imported
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+import numpy as np
+
+BATCH_SIZES = (1, 10, 100, 1000)
+MODELS = (("xgb", False), ("xgb", True), ("rf", False), ("rf", True))
+BACKENDS = ("library", "compiled")
+
+# plausible ranges of every feature, in the MLManager's feature order
+LOW = [5, 40, 40, 30, 70, 80, 18, 10]
+HIGH = [40, 150, 130, 110, 200, 100, 95, 90]
+
+
+def percentiles(seconds):
+    '''Returns the p50 and p99 of a list of durations, in milliseconds'''
+    p50, p99 = np.percentile(np.asarray(seconds) * 1e3, [50, 99])
+    return {"p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+def time_calls(func, repeats, warm_up=5):
+    '''Calls func warm_up times, then times repeats calls of it'''
+    for _ in range(warm_up):
+        func()
+
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def measure(model_type, binary, backend, repeats, seed=0):
+    '''Runs in a fresh process, benchmarks a single model and backend
+
+    Returns:
+        results {dict} -- load time, latencies and peak RSS, see the module docstring
+    '''
+    started = time.perf_counter()
+    from backend.managers.ml_manager import MLManager
+
+    manager = MLManager(model_type=model_type, binary=binary, max_cache_size=max(BATCH_SIZES), memo_size=0, backend=backend)
+    manager.load_model()
+    load_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed)
+    features = np.rint(rng.uniform(LOW, HIGH, (max(BATCH_SIZES), len(LOW)))).astype(np.float32)
+
+    def batched(rows):
+        # MLManager._batched_prediction() without its logging
+        return manager._post_process(manager._majority_vote(manager._predict_labels(rows)))
+
+    single = features[0].tolist()
+    results = {
+        "model_type": model_type,
+        "binary": binary,
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "load_breakdown": manager.startup_times,
+        "predict": percentiles(time_calls(lambda: manager.predict(single), repeats)),
+        "batched": {
+            str(size): percentiles(time_calls(lambda: batched(features[:size]), repeats))
+            for size in BATCH_SIZES
+        },
+    }
+
+    manager.shutdown()
+    # ru_maxrss is in kilobytes on linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["peak_rss_mb"] = peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return results
+
+
+def environment():
+    '''Versions and hardware the results were measured on'''
+    versions = {}
+    for package in ("numpy", "xgboost", "scikit-learn", "joblib"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def run_suite(models, backends, repeats):
+    '''Measures every model and backend, each in its own process'''
+    runs = []
+    for model_type, binary in models:
+        for backend in backends:
+            print(f"Benchmarking {model_type} binary={binary} backend={backend}", file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), "--child", model_type, str(binary), backend, "--repeats", str(repeats)]
+            result = subprocess.run(command, cwd=APP_DIR, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"Benchmark of {model_type} binary={binary} backend={backend} failed:\n{result.stderr}")
+
+            # the model loading is logged to stdout, the results are the last line
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeats": repeats, "environment": environment(), "runs": runs}
+
+
+def metrics(run):
+    '''Flattens a run into {metric name: value}, every metric is better when lower'''
+    flat = {"load_seconds": run["load_seconds"], "peak_rss_mb": run["peak_rss_mb"]}
+    for name, value in run["predict"].items():
+        flat[f"predict.{name}"] = value
+    for size, latency in run["batched"].items():
+        for name, value in latency.items():
+            flat[f"batched.{size}.{name}"] = value
+    return flat
+
+
+def compare(results, baseline, threshold):
+    '''Compares results against a baseline
+
+    Args:
+        results {dict} -- results of run_suite()
+        baseline {dict} -- results of an earlier run_suite()
+        threshold {float} -- fraction a metric may get worse by before it is a regression
+
+    Returns:
+        regressions {List[dict]} -- every metric more than threshold worse than the baseline
+    '''
+    key = lambda run: (run["model_type"], run["binary"], run["backend"])
+    baseline_runs = {key(run): metrics(run) for run in baseline["runs"]}
+
+    regressions = []
+    for run in results["runs"]:
+        before = baseline_runs.get(key(run))
+        if before is None:
+            continue
+
+        for name, value in metrics(run).items():
+            previous = before.get(name)
+            if previous and value > previous * (1 + threshold):
+                regressions.append({
+                    "model_type": run["model_type"],
+                    "binary": run["binary"],
+                    "backend": run["backend"],
+                    "metric": name,
+                    "baseline": previous,
+                    "current": value,
+                    "change": value / previous - 1,
+                })
+
+    return regressions
+
+
+def print_summary(results):
+    print(f"{'model':<22} {'backend':<9} {'load s':>7} {'rss MB':>7} {'predict p50':>12}" + "".join(f" {'b' + str(size) + ' p50/p99':>16}" for size in BATCH_SIZES))
+    for run in results["runs"]:
+        batched = "".join(f" {run['batched'][str(size)]['p50_ms']:>7.2f}/{run['batched'][str(size)]['p99_ms']:<8.2f}" for size in BATCH_SIZES)
+        name = f"{run['model_type']} binary={run['binary']}"
+        print(f"{name:<22} {run['backend']:<9} {run['load_seconds']:>7.2f} {run['peak_rss_mb']:>7.0f} {run['predict']['p50_ms']:>12.3f}{batched}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    parser.add_argument("--compare", default=None, metavar="BASELINE", help="JSON results of an earlier run to flag regressions against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Fraction a metric may get worse by before it is flagged")
+    parser.add_argument("--models", nargs="+", choices=["xgb", "rf"], default=["xgb", "rf"], help="Model types to benchmark")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS), help="Backends to benchmark")
+    parser.add_argument("--repeats", type=int, default=100, help="Timed calls per latency measurement")
+    parser.add_argument("--child", nargs=3, default=None, metavar=("MODEL", "BINARY", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        model_type, binary, backend = args.child
+        print(json.dumps(measure(model_type, binary == "True", backend, args.repeats)))
+        sys.exit(0)
+
+    models = [model for model in MODELS if model[0] in args.models]
+    results = run_suite(models, args.backends, args.repeats)
+    print_summary(results)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['model_type']} binary={regression['binary']} {regression['backend']} "
+                f"{regression['metric']}: {regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['change']:+.0%})"
+            )
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}")
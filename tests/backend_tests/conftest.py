@@ -0,0 +1,43 @@
+import pytest
+from pyasn1.codec.der.encoder import encode
+
+from app.vitals_data_models import VitalSigns, NumericObservation
+
+# same mdc and unit codes the vitals agent sends
+MDC_CODES = {
+    'heartRate': (18402, 264864),
+    'meanArterialPressure': (18949, 266016),
+    'spo2': (150456, 262144),
+    'respiratoryRate': (18945, 266016),
+    'systolicBP': (18947, 266016),
+    'diastolicBP': (18948, 266016),
+}
+
+
+@pytest.fixture
+def sample_vitals():
+    '''A single set of vitals in the format the vitals agent sends'''
+    return {
+        "heartRate": 80,
+        "meanArterialPressure": 90,
+        "spo2": 98,
+        "respiratoryRate": 14,
+        "systolicBP": 120,
+        "diastolicBP": 80,
+    }
+
+
+@pytest.fixture
+def encode_vitals():
+    '''Returns a function that DER encodes a dict of vitals the same way the vitals agent does'''
+    def _encode(vitals):
+        message = VitalSigns()
+        for name, (mdc_code, unit_code) in MDC_CODES.items():
+            observation = NumericObservation()
+            observation.setComponentByName('mdcCode', mdc_code)
+            observation.setComponentByName('unitCode', unit_code)
+            observation.setComponentByName('value', vitals[name])
+            message.setComponentByName(name, observation)
+        return encode(message)
+
+    return _encode
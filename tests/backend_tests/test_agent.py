@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.backend.managers.vitals_manager import VitalsManager
+from vitals_agent.agent import LoadStats, ramp_rate, run_load, parse_arguments, encode_vitals, encode_vitals_fast, generate_mock_vitals, MDC_CODES
+
+
+def test_fast_encoder_mock_vitals():
+    for _ in range(500):
+        vitals = generate_mock_vitals()
+        assert encode_vitals_fast(vitals) == encode_vitals(vitals)
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 255, 256, -1, -128, -129, 70000, 2 ** 63, 10 ** 60])
+def test_fast_encoder_matches_pyasn1(value):
+    '''Values outside the single octet template still match pyasn1 byte for byte'''
+    vitals = {field: value for field in MDC_CODES}
+    vitals["spo2"] = 98
+
+    assert encode_vitals_fast(vitals) == encode_vitals(vitals)
+
+
+@pytest.mark.parametrize("profile, elapsed, expected", [
+    ("constant", 0, 100),
+    ("constant", 50, 100),
+    ("linear", 0, 1),
+    ("linear", 5, 50.5),
+    ("linear", 20, 100),
+    ("step", 0, 1),
+    ("step", 25, 4),
+    ("step", 200, 100),
+])
+def test_ramp_rate(profile, elapsed, expected):
+    assert ramp_rate(profile, 100, elapsed, ramp_seconds=10, start_rate=1) == pytest.approx(expected)
+
+
+def test_parse_arguments():
+    args = parse_arguments([])
+    assert args.command is None
+    assert args.host == "host.docker.internal"
+
+    args = parse_arguments(["load", "--host", "localhost", "--port", "9000", "--devices", "50", "--ack"])
+    assert args.command == "load"
+    assert (args.host, args.port, args.devices, args.ack) == ("localhost", 9000, 50, True)
+
+    # options given before the command are not reset by the command's defaults
+    args = parse_arguments(["--host", "monitor", "--port", "9001", "load"])
+    assert (args.host, args.port) == ("monitor", 9001)
+
+
+def test_latency_reservoir_is_bounded():
+    stats = LoadStats()
+    for idx in range(3 * LoadStats.RESERVOIR_SIZE):
+        stats.record_latency(idx / 1000)
+
+    assert stats.acked == 3 * LoadStats.RESERVOIR_SIZE
+    assert len(stats.latencies) == LoadStats.RESERVOIR_SIZE
+    # a uniform sample of the whole run, not just its start
+    assert max(stats.latencies) > 2 * LoadStats.RESERVOIR_SIZE / 1000
+
+
+@pytest.mark.parametrize("mode", ["async", "process"])
+def test_load_with_acks(qtbot, mode):
+    '''The load mode drives many devices and measures latency from the vitals manager acks'''
+    manager = VitalsManager(host="127.0.0.1", port=0, mode=mode, ack=True, decoders=2)
+    manager.start_server()
+
+    try:
+        args = parse_arguments([
+            "load", "--host", "127.0.0.1", "--port", str(manager.port),
+            "--devices", "20", "--rate", "50", "--duration", "1", "--report-interval", "10", "--ack",
+        ])
+        stats = asyncio.run(run_load(args))
+    finally:
+        manager.stop_server()
+
+    assert stats.errors == 0
+    assert stats.sent > 20 * 10
+    assert stats.acked > 0.9 * stats.sent
+    assert all(latency >= 0 for latency in stats.latencies)
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from app.backend.inference.scheduler import BatchScheduler
+
+
+def test_take_oldest_first_within_budget():
+    '''Patients are taken in the order they were marked until the batch is full, the rest wait their turn'''
+    scheduler = BatchScheduler(lambda: None, tick=1, max_batch_size=250)
+    sizes = {"a": 100, "b": 100, "c": 100, "empty": 0, "big": 400}
+    for patient_key in ("a", "b", "a", "c", "big"):
+        scheduler.mark(patient_key)
+
+    assert scheduler.take(sizes.get) == ["a", "b"]
+    assert scheduler.pending() == 2
+
+    # a window larger than the batch is still taken on its own
+    scheduler.mark("empty")
+    assert scheduler.take(sizes.get) == ["c"]
+    assert scheduler.take(sizes.get) == ["big"]
+    assert scheduler.take(sizes.get) == []
+    assert scheduler.pending() == 0
+
+    scheduler.mark("a")
+    scheduler.discard("a")
+    assert scheduler.take(sizes.get) == []
+
+    with pytest.raises(ValueError):
+        BatchScheduler(lambda: None, tick=0)
+
+
+def test_ticks_only_with_marked_patients():
+    ticked = threading.Event()
+    scheduler = BatchScheduler(ticked.set, tick=0.01)
+    scheduler.start()
+    try:
+        assert not ticked.wait(0.1)
+        scheduler.mark("a")
+        assert ticked.wait(2)
+    finally:
+        scheduler.stop()
@@ -0,0 +1,87 @@
+import csv
+
+import numpy as np
+
+from app.backend.ingest.capture import CaptureWriter
+from app.backend.managers.ml_manager import MLManager
+from bulk_score import score
+from vitals_data_models import VitalSample
+
+
+def make_samples(count, seed=0):
+    '''Random but plausible vitals'''
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(count):
+        systolic = int(rng.integers(80, 170))
+        diastolic = int(rng.integers(40, 100))
+        samples.append(VitalSample(
+            int(rng.integers(50, 130)), (systolic + 2 * diastolic) // 3, int(rng.integers(88, 100)),
+            int(rng.integers(10, 30)), systolic, diastolic, age=int(rng.integers(20, 90)),
+        ))
+    return samples
+
+
+def expected_labels(samples, binary=False):
+    '''The labels the MLManager predicts for every sample'''
+    manager = MLManager(model_type="xgb", binary=binary, memo_size=0)
+    manager.load_model()
+    labels = manager.model.predict(np.vstack([manager._preprocess(sample) for sample in samples]))
+    return [manager._post_process(label)["label"] for label in labels]
+
+
+def read_output(path):
+    with open(path, newline="") as output_file:
+        return list(csv.DictReader(output_file))
+
+
+def test_csv_in_processes(tmp_path):
+    '''Chunks are scored by worker processes and written in input order with the MLManager's labels'''
+    samples = make_samples(250)
+    input_path = tmp_path / "vitals.csv"
+    with open(input_path, "w", newline="") as input_file:
+        writer = csv.writer(input_file)
+        writer.writerow(["mrn", "heartRate", "meanArterialPressure", "spo2", "respiratoryRate", "systolicBP", "diastolicBP", "age"])
+        for idx, sample in enumerate(samples):
+            writer.writerow([f"MRN{idx}"] + [getattr(sample, field) for field in VitalSample.FIELDS] + [sample.age])
+
+    summary = score(input_path, tmp_path / "out.csv", chunk_size=64, processes=2, id_column="mrn", report_interval=0)
+
+    rows = read_output(tmp_path / "out.csv")
+    assert summary["rows"] == 250 and summary["failed"] == 0
+    assert [row["mrn"] for row in rows] == [f"MRN{idx}" for idx in range(250)]
+    assert [row["label"] for row in rows] == expected_labels(samples)
+
+
+def test_capture_and_missing_values(tmp_path, encode_vitals):
+    '''Captured frames are decoded and scored with --age, frames that don't decode are reported as failed'''
+    samples = make_samples(30, seed=1)
+    for sample in samples:
+        sample.age = 60
+
+    capture_path = tmp_path / "vitals.fscap"
+    capture = CaptureWriter(capture_path)
+    capture.write(1, 100.0, [encode_vitals(sample.to_dict()) for sample in samples[:20]])
+    capture.write(2, 101.0, [b"\x30\x03\x02\x01\x01"])
+    capture.write(1, 102.0, [encode_vitals(sample.to_dict()) for sample in samples[20:]])
+    capture.close()
+
+    summary = score(capture_path, tmp_path / "out.csv", binary=True, chunk_size=8, processes=0, age=60, report_interval=0)
+
+    rows = read_output(tmp_path / "out.csv")
+    assert summary["rows"] == 31 and summary["failed"] == 1
+    assert rows[20]["label"] == "N/A" and rows[20]["connection_id"] == "2"
+    assert [row["label"] for row in rows[:20] + rows[21:]] == expected_labels(samples, binary=True)
+
+    # a row with a blank or unparseable vital is reported as failed, the rest of its chunk is scored
+    input_path = tmp_path / "blank.csv"
+    input_path.write_text(
+        "respiratoryRate,heartRate,meanArterialPressure,diastolicBP,systolicBP,spo2\n"
+        "14,80,90,80,120,98\n"
+        "14,,90,80,120,\n"
+        "14,80,90,80,120,n/a\n"
+        "16,75,85,70,115,97\n"
+    )
+    summary = score(input_path, tmp_path / "blank_out.csv", processes=0, report_interval=0)
+    assert summary["rows"] == 4 and summary["failed"] == 2
+    assert [row["label"] == "N/A" for row in read_output(tmp_path / "blank_out.csv")] == [False, True, True, False]
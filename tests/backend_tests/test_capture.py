@@ -0,0 +1,104 @@
+import socket
+import asyncio
+
+import pytest
+
+from app.backend.ingest.capture import CaptureWriter, CaptureReader, MAGIC
+from app.backend.managers.vitals_manager import VitalsManager
+from vitals_agent.replay import replay
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "vitals.fscap"
+    writer = CaptureWriter(path)
+    writer.write(1, 100.0, [b"\x30\x00", memoryview(b"\x30\x01\x00")])
+    writer.write(2, 101.5, [b"\x30\x02\x01\x00"])
+    writer.close()
+
+    with CaptureReader(path) as capture:
+        records = [(received_at, connection_id, bytes(frame)) for received_at, connection_id, frame in capture]
+
+    assert records == [
+        (100.0, 1, b"\x30\x00"),
+        (100.0, 1, b"\x30\x01\x00"),
+        (101.5, 2, b"\x30\x02\x01\x00"),
+    ]
+
+
+def test_sessions(tmp_path):
+    '''Every writer appending to a capture starts a new session, connection ids restart in each'''
+    path = tmp_path / "vitals.fscap"
+    for received_at in (100.0, 5000.0):
+        writer = CaptureWriter(path)
+        writer.write(1, received_at, [b"\x30\x00"])
+        writer.write(2, received_at + 1, [b"\x30\x01\x00"])
+        writer.close()
+
+    # a writer that captured nothing does not add a session
+    CaptureWriter(path).close()
+
+    with CaptureReader(path) as capture:
+        assert len(list(capture)) == 4
+        assert [session for session, *_ in capture.records()] == [0, 0, 1, 1]
+        sessions = [[(received_at, connection_id) for received_at, connection_id, _ in records] for records in capture.sessions()]
+
+    assert sessions == [[(100.0, 1), (101.0, 2)], [(5000.0, 1), (5001.0, 2)]]
+
+
+def test_truncated_record_ignored(tmp_path):
+    path = tmp_path / "vitals.fscap"
+    writer = CaptureWriter(path)
+    writer.write(1, 100.0, [b"\x30\x00", b"\x30\x01\x00"])
+    writer.close()
+
+    # cut the last frame short
+    path.write_bytes(path.read_bytes()[:-1])
+
+    with CaptureReader(path) as capture:
+        assert len(list(capture)) == 1
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "vitals.fscap"
+    path.write_bytes(b"not a capture file")
+
+    with pytest.raises(ValueError):
+        CaptureReader(path)
+
+
+def test_capture_and_replay(qtbot, tmp_path, encode_vitals, sample_vitals):
+    '''Frames captured by one VitalsManager are replayed at max speed to another'''
+    path = tmp_path / "vitals.fscap"
+    message = encode_vitals(sample_vitals)
+
+    recorder = VitalsManager(host="127.0.0.1", port=0, mode="async", capture_path=path)
+    recorder.start_server()
+
+    try:
+        clients = [socket.create_connection(("127.0.0.1", recorder.port)) for _ in range(3)]
+        for client in clients:
+            client.sendall(message * 10)
+        qtbot.waitUntil(lambda: recorder._capture.records == 30, timeout=5000)
+        for client in clients:
+            client.close()
+    finally:
+        recorder.stop_server()
+
+    assert path.read_bytes().startswith(MAGIC)
+    capture = CaptureReader(path)
+    (records,) = capture.sessions()
+    assert len(records) == 30
+    assert len({record[1] for record in records}) == 3
+
+    target = VitalsManager(host="127.0.0.1", port=0, mode="async")
+    target.start_server()
+    try:
+        sent, _ = asyncio.run(replay(records, "127.0.0.1", target.port, speed=0))
+        assert sent == 30
+
+        qtbot.waitUntil(lambda: target.get_stats()["totals"]["messages"] == 30, timeout=5000)
+        assert target.get_stats()["totals"]["decode_failures"] == 0
+    finally:
+        target.stop_server()
+        del records
+        capture.close()
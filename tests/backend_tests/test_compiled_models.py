@@ -0,0 +1,102 @@
+import os
+import sys
+import shutil
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.backend.inference.registry import ModelRegistry, MODEL_FILES
+from app.backend.inference.compiled import compile_xgboost, compile_random_forest
+
+APP_DIR = Path(__file__).parent.parent.parent / "app"
+MODEL_DIR = APP_DIR / "models"
+
+# plausible ranges of every feature, in the MLManager's feature order
+LOW = [5, 40, 40, 30, 70, 80, 18, 10]
+HIGH = [40, 150, 130, 110, 200, 100, 95, 90]
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return ModelRegistry(MODEL_DIR, capacity=len(MODEL_FILES))
+
+
+@pytest.mark.parametrize("key", list(MODEL_FILES))
+def test_matches_library_predictions(registry, key):
+    '''The compiled ensemble predicts exactly what XGBoost/scikit-learn predict, with and without missing values'''
+    estimator = registry.get(*key).estimator
+    if key[0] == "xgb":
+        compiled = compile_xgboost(MODEL_DIR / MODEL_FILES[key])
+    else:
+        compiled = compile_random_forest(estimator)
+
+    rng = np.random.default_rng(0)
+    n_features = estimator.n_features_in_
+    rounded = np.rint(rng.uniform(LOW[:n_features], HIGH[:n_features], (5000, n_features)))
+    fractional = rng.uniform(0, 200, (5000, n_features))
+    missing = rounded.copy()
+    missing[rng.random(missing.shape) < 0.1] = np.nan
+
+    for features in (rounded, fractional, missing, rounded[:1]):
+        expected = np.asarray(estimator.predict(features))
+        if expected.dtype.kind not in "iu":
+            expected = np.searchsorted(estimator.classes_, expected)
+        assert np.array_equal(compiled.predict(features), expected)
+
+
+def test_compiled_registry(registry):
+    '''The compiled backend predicts through the same LoadedModel interface as the library backend'''
+    compiled = ModelRegistry(MODEL_DIR, backend="compiled")
+    features = np.rint(np.random.default_rng(1).uniform(LOW, HIGH, (100, 8)))
+
+    for key in (("xgb", False), ("rf", True)):
+        assert np.array_equal(compiled.get(*key).predict(features), registry.get(*key).predict(features))
+
+    with pytest.raises(ValueError):
+        ModelRegistry(MODEL_DIR, backend="onnx")
+
+
+def test_compiled_xgb_does_not_import_xgboost():
+    code = (
+        "import sys; from backend.managers.ml_manager import MLManager; "
+        "manager = MLManager(backend='compiled'); manager.load_model(); print('xgboost' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-1] == "False"
+
+
+def test_compiled_rf_cache(registry, tmp_path):
+    '''The compiled forest is cached next to the pickle and memory-mapped read only from then on'''
+    model_path = tmp_path / MODEL_FILES[("rf", True)]
+    shutil.copy(MODEL_DIR / model_path.name, model_path)
+    cache_path = model_path.with_suffix(".compiled.joblib")
+    features = np.rint(np.random.default_rng(2).uniform(LOW, HIGH, (500, 8)))
+    expected = registry.get("rf", True).predict(features)
+
+    ModelRegistry(tmp_path, backend="compiled").get("rf", True)
+    assert cache_path.exists()
+
+    cached = ModelRegistry(tmp_path, backend="compiled").get("rf", True)
+    assert not cached.estimator.children.flags.writeable
+    assert np.array_equal(cached.predict(features), expected)
+
+    # loading the cache needs neither scikit-learn nor the pickle
+    code = (
+        "import sys; from pathlib import Path; from backend.inference.registry import ModelRegistry; "
+        f"ModelRegistry(Path({str(tmp_path)!r}), backend='compiled').get('rf', True); print('sklearn' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-1] == "False"
+
+    # an unreadable cache is rewritten
+    cache_path.write_bytes(b"not a cache")
+    assert np.array_equal(ModelRegistry(tmp_path, backend="compiled").get("rf", True).predict(features), expected)
+    assert cache_path.stat().st_size > 100
+
+    # a cache older than the pickle is rewritten
+    stale = cache_path.stat().st_mtime - 10
+    os.utime(cache_path, (stale, stale))
+    ModelRegistry(tmp_path, backend="compiled").get("rf", True)
+    assert cache_path.stat().st_mtime > stale
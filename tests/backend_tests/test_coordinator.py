@@ -0,0 +1,33 @@
+from unittest.mock import MagicMock
+
+from app.backend.coordinator import Coordinator
+
+
+def make_coordinator(inactive):
+    patient_manager = MagicMock()
+    patient_manager.get_all_patients.return_value = inactive + [MagicMock(patient_mrn="active")]
+    api_manager = MagicMock()
+    api_manager.get_inactive_patients.return_value = inactive
+    return Coordinator(MagicMock(), api_manager, patient_manager, MagicMock(), MagicMock())
+
+
+def test_removing_patients_drops_their_state():
+    '''The vitals history and inference cache of deleted patients are dropped with them'''
+    inactive = [MagicMock(patient_mrn="1"), MagicMock(patient_mrn="2")]
+    coordinator = make_coordinator(inactive)
+    coordinator.remove_inactive_patients()
+
+    coordinator._patient_manager.delete_patient.assert_called_once_with(inactive)
+    assert [call.args for call in coordinator._vitals_manager.forget_patient.call_args_list] == [("1",), ("2",)]
+    assert [call.args for call in coordinator._ml_manager.remove_cache.call_args_list] == [("1",), ("2",)]
+
+
+def test_bind_device():
+    coordinator = make_coordinator([])
+    patient = MagicMock(patient_mrn="1")
+    coordinator._patient_manager.get_patient_by_mrn.side_effect = lambda mrn: patient if mrn == "1" else None
+    coordinator._api.search_patient.return_value = None
+
+    assert coordinator.bind_device("10.0.0.21", "1")
+    coordinator._vitals_manager.bind_device.assert_called_once_with("10.0.0.21", patient)
+    assert not coordinator.bind_device("10.0.0.22", "missing")
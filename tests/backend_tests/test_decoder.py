@@ -0,0 +1,45 @@
+import pytest
+from pyasn1.error import PyAsn1Error
+
+from app.backend.ingest.decoder import fast_decode, generic_decode, decode_vitals, VITAL_FIELDS
+
+
+def test_field_order():
+    assert VITAL_FIELDS == ('heartRate', 'meanArterialPressure', 'spo2', 'respiratoryRate', 'systolicBP', 'diastolicBP')
+
+
+@pytest.mark.parametrize("vitals", [
+    {"heartRate": 80, "meanArterialPressure": 90, "spo2": 98, "respiratoryRate": 14, "systolicBP": 120, "diastolicBP": 80},
+    {"heartRate": 0, "meanArterialPressure": 127, "spo2": 128, "respiratoryRate": 255, "systolicBP": 256, "diastolicBP": 70000},
+    {"heartRate": -1, "meanArterialPressure": -128, "spo2": -129, "respiratoryRate": 1, "systolicBP": 2 ** 40, "diastolicBP": 3},
+])
+def test_fast_decode_matches_pyasn1(encode_vitals, vitals):
+    message = encode_vitals(vitals)
+    integers = fast_decode(memoryview(message))
+
+    assert integers == generic_decode(message)
+    assert dict(zip(VITAL_FIELDS, integers[2::3])) == vitals
+
+
+def test_fast_decode_rejects_unexpected(encode_vitals, sample_vitals):
+    '''Anything that does not match the schema exactly returns None'''
+    message = encode_vitals(sample_vitals)
+
+    assert fast_decode(message[:-1]) is None
+    assert fast_decode(message + b"\x00") is None
+    assert fast_decode(b"\x31" + message[1:]) is None
+    assert fast_decode(b"") is None
+
+
+def test_decode_vitals_falls_back(encode_vitals, sample_vitals):
+    '''A BER long form length the fast path does not expect is still decoded by pyasn1'''
+    message = encode_vitals(sample_vitals)
+    ber_message = b"\x30\x85\x00\x00\x00\x00" + bytes([len(message) - 2]) + message[2:]
+
+    assert fast_decode(ber_message) is None
+    assert decode_vitals(ber_message) == decode_vitals(message)
+
+
+def test_decode_vitals_invalid():
+    with pytest.raises(PyAsn1Error):
+        decode_vitals(b"\x30\x03\x02\x01\x01")
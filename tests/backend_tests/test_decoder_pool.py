@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.backend.ingest.decoder_pool import SampleRing, DecoderPool, RESULT_DTYPE, DECODED, FAILED, CLOSED
+
+
+def make_records(connection_id, count):
+    records = np.zeros(count, dtype=RESULT_DTYPE)
+    records["connection_id"] = connection_id
+    records["values"][:, 0] = np.arange(count)
+    return records
+
+
+def test_ring_wraps_around():
+    '''Records come back in order across the end of the ring'''
+    ring = SampleRing(capacity=8)
+    attached = SampleRing(capacity=8, name=ring.name)
+
+    try:
+        attached.put(make_records(1, 6))
+        assert ring.drain()["values"][:, 0].tolist() == list(range(6))
+
+        # wraps past the end of the shared memory
+        attached.put(make_records(2, 5))
+        assert len(ring) == 5
+        records = ring.drain()
+        assert records["connection_id"].tolist() == [2] * 5
+        assert records["values"][:, 0].tolist() == list(range(5))
+        assert len(ring.drain()) == 0
+    finally:
+        attached.close()
+        ring.close()
+
+
+def test_pool_decodes_in_order(encode_vitals, sample_vitals):
+    '''Frames are decoded by the processes and handed back per connection in order, ending with CLOSED'''
+    pool = DecoderPool(processes=2, ring_capacity=64)
+    pool.start()
+
+    message = encode_vitals(sample_vitals)
+    try:
+        for connection_id in (1, 2):
+            pool.submit(connection_id, 100.0, 1.0, [message] * 3)
+            pool.submit(connection_id, 101.0, 2.0, [b"\x30\x03\x02\x01\x01", message])
+            pool.close_connection(connection_id)
+
+        records = {1: [], 2: []}
+        while sum(len(received) for received in records.values()) < 12:
+            for batch in pool.drain(timeout=5):
+                for record in batch:
+                    records[int(record["connection_id"])].append(record)
+    finally:
+        pool.stop()
+
+    for received in records.values():
+        assert [int(record["status"]) for record in received] == [DECODED] * 3 + [FAILED, DECODED, CLOSED]
+        assert [float(record["received_at"]) for record in received[:5]] == [100.0] * 3 + [101.0] * 2
+        assert received[0]["values"].tolist() == [80, 90, 98, 14, 120, 80]
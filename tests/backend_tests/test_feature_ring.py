@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.backend.inference.feature_ring import FeatureRing
+
+
+def rows(start, stop):
+    return np.arange(start, stop, dtype=np.float32)[:, None] * np.ones(3, dtype=np.float32)
+
+
+def test_view_is_the_last_rows_oldest_first():
+    '''The view always holds the last capacity rows in the order they were appended'''
+    ring = FeatureRing(4, n_features=3)
+    assert len(ring) == 0 and ring.view().shape == (0, 3)
+
+    for row in rows(0, 3):
+        ring.append(row)
+    assert np.array_equal(ring.view(), rows(0, 3))
+
+    # wraps around, every window is still one contiguous slice
+    for end in range(4, 12):
+        ring.append(rows(end - 1, end)[0])
+        assert len(ring) == min(end, 4)
+        assert np.array_equal(ring.view(), rows(max(0, end - 4), end))
+        assert np.array_equal(ring.view(2), rows(end - 2, end))
+
+
+def test_view_is_zero_copy_and_read_only():
+    '''view() shares the ring's memory, snapshot() is a copy that later appends don't touch'''
+    ring = FeatureRing(4, n_features=3)
+    for row in rows(0, 6):
+        ring.append(row)
+
+    view = ring.view()
+    assert np.shares_memory(view, ring._rows)
+    with pytest.raises(ValueError):
+        view[0, 0] = 1
+
+    snapshot = ring.snapshot()
+    ring.append(rows(6, 7)[0])
+    assert np.array_equal(snapshot, rows(2, 6))
+    assert np.array_equal(ring.snapshot(10), rows(3, 7))
+
+
+def test_missing_values_and_clear():
+    '''None is stored as nan and clear() empties the ring'''
+    ring = FeatureRing(2, n_features=3)
+    ring.append((1, None, 3))
+    assert np.isnan(ring.view()[0, 1])
+
+    ring.clear()
+    assert len(ring) == 0 and ring.snapshot().shape == (0, 3)
+
+    with pytest.raises(ValueError):
+        FeatureRing(0)
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import event
+
+from app.backend.managers.fluid_manager import FluidManager
+from database_models import Patient
+
+
+@pytest.fixture
+def patient(mock_db):
+    '''A patient with no fluid records, removed once the test is done'''
+    with mock_db.session_context() as db:
+        patient = Patient(firstname="Fluid", lastname="Test", patient_mrn="fluid-test")
+        db.add(patient)
+        db.commit()
+
+    yield patient
+
+    with mock_db.session_context() as db:
+        db.delete(patient)
+        db.commit()
+
+
+@pytest.fixture
+def statements(mock_db):
+    '''A list that every statement executed on the database is appended to, clear it where counting starts'''
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(mock_db._engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(mock_db._engine, "before_cursor_execute", record)
+
+
+def test_totals_are_summed_by_the_database(mock_db, patient, statements):
+    manager = FluidManager(mock_db)
+    assert manager.get_total_fluid_volume(patient) == 0
+    assert manager.get_fluid_totals(patient) == {}
+
+    manager.forget_totals()
+    for fluid_name, amount_ml in [("Saline", 500.0), ("Albumin", 250.0), ("Saline", 100.0)]:
+        assert manager.add_record(patient, fluid_name, amount_ml)
+
+    # nothing was cached, the totals come from a single grouped SUM
+    statements.clear()
+    assert manager.get_fluid_totals(patient) == {"Saline": 600.0, "Albumin": 250.0}
+    assert len(statements) == 1 and "sum(" in statements[0].lower()
+
+    assert manager.get_total_fluid_volume(patient) == 850.0
+    assert manager.get_total_fluid_volume(patient, fluid="Saline") == 600.0
+    assert manager.get_total_fluid_volume(patient, fluid="Plasma") == 0
+    assert len(statements) == 1
+
+
+def test_running_totals_match_the_database(mock_db, patient, statements):
+    manager = FluidManager(mock_db)
+    assert manager.get_total_fluid_volume(patient) == 0
+
+    for amount_ml in range(1, 21):
+        manager.add_record(patient, "Lactated Ringers", float(amount_ml))
+    assert not manager.add_record(patient, "Lactated Ringers", 0.0)
+
+    statements.clear()
+    assert manager.get_total_fluid_volume(patient) == 210.0
+    assert statements == []
+
+    manager.forget_totals(patient)
+    assert manager.get_total_fluid_volume(patient) == 210.0
+    assert manager.get_fluid_totals(patient) == {"Lactated Ringers": 210.0}
@@ -0,0 +1,72 @@
+import pytest
+
+from app.backend.ingest.framing import FrameBuffer
+
+
+@pytest.fixture
+def message(encode_vitals, sample_vitals):
+    return encode_vitals(sample_vitals)
+
+
+def test_single_frame(message):
+    framer = FrameBuffer()
+    frames = framer.feed(message)
+
+    assert [bytes(frame) for frame in frames] == [message]
+    assert framer.pending == 0
+
+
+def test_coalesced_frames(message):
+    '''Several messages delivered by a single recv are all returned'''
+    framer = FrameBuffer()
+    frames = framer.feed(message * 10)
+
+    assert len(frames) == 10
+    assert all(bytes(frame) == message for frame in frames)
+
+
+def test_split_frames(message):
+    '''A message split across reads is only returned once it is complete'''
+    framer = FrameBuffer()
+    stream = message * 3
+    frames = []
+
+    # worst case, the stream arrives one byte at a time
+    for index in range(len(stream)):
+        frames.extend(framer.feed(stream[index:index + 1]))
+
+    assert [bytes(frame) for frame in frames] == [message] * 3
+    assert framer.pending == 0
+    assert framer.malformed == 0
+
+
+def test_partial_tail_kept(message):
+    framer = FrameBuffer()
+    frames = framer.feed(message + message[:7])
+
+    assert len(frames) == 1
+    assert framer.pending == 7
+
+    frames = framer.feed(message[7:])
+    assert [bytes(frame) for frame in frames] == [message]
+
+
+def test_garbage_is_skipped(message):
+    '''Bytes that cannot start a frame are counted as malformed and skipped'''
+    framer = FrameBuffer()
+    frames = framer.feed(b"\x01\x02\x03" + message + b"\xff" + message)
+
+    assert len(frames) == 2
+    assert framer.malformed == 2
+
+
+@pytest.mark.parametrize("header", [
+    b"\x30\x80",                  # BER indefinite length, not allowed in DER
+    b"\x30\x84\x7f\xff\xff\xff",  # larger than the max frame size
+])
+def test_invalid_length(message, header):
+    framer = FrameBuffer()
+    frames = framer.feed(header + message)
+
+    assert [bytes(frame) for frame in frames] == [message]
+    assert framer.malformed == 1
@@ -0,0 +1,71 @@
+from threading import Event
+
+import pytest
+
+from app.backend.inference.worker import InferenceWorker
+
+
+@pytest.fixture
+def worker():
+    inference_worker = InferenceWorker()
+    yield inference_worker
+    inference_worker.shutdown()
+
+
+def test_runs_requests_in_order(worker):
+    results = []
+    futures = [worker.submit(results.append, value) for value in range(5)]
+
+    for future in futures:
+        future.result(timeout=5)
+    assert results == list(range(5))
+
+
+def test_exceptions_are_set_on_the_future(worker):
+    future = worker.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=5)
+
+
+def test_stale_requests_are_cancelled(worker):
+    '''Only the newest pending request with a key runs, the running one is left alone'''
+    started, release = Event(), Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return "running"
+
+    running = worker.submit(block, key="patient")
+    started.wait(5)
+
+    stale = [worker.submit(lambda value=value: value, key="patient") for value in range(3)]
+    other = worker.submit(lambda: "other", key="other patient")
+    release.set()
+
+    assert running.result(timeout=5) == "running"
+    assert stale[-1].result(timeout=5) == 2
+    assert all(future.cancelled() for future in stale[:-1])
+    assert other.result(timeout=5) == "other"
+
+
+def test_shutdown_cancels_pending():
+    '''Shutting down lets the running request finish and cancels the rest'''
+    worker = InferenceWorker()
+    started, release = Event(), Event()
+
+    def block():
+        started.set()
+        return release.wait(5)
+
+    running = worker.submit(block)
+    started.wait(5)
+    pending = worker.submit(lambda: None)
+
+    worker.shutdown(wait=False)
+    release.set()
+
+    assert running.result(timeout=5) is True
+    assert pending.cancelled()
+    with pytest.raises(RuntimeError):
+        worker.submit(lambda: None)
@@ -0,0 +1,31 @@
+import pytest
+
+from app.backend.ingest.stats import IngestStats
+
+
+def test_ingest_stats():
+    stats = IngestStats()
+    stats.open_connection(1, "127.0.0.1:1000")
+    stats.record_read(1, nbytes=100, messages=4, framing_errors=1, framing_seconds=0.001,
+                      decode_seconds=0.004, route_seconds=0.002, recv_to_emit=0.007)
+    stats.record_decode_failure(1, ValueError("bad frame"))
+
+    snapshot = stats.snapshot()
+    assert snapshot["totals"]["messages"] == 4
+    assert snapshot["totals"]["framing_errors"] == 1
+    assert snapshot["totals"]["decode_failures"] == 1
+    assert snapshot["stage_seconds"]["decode"] == pytest.approx(0.004)
+    assert snapshot["decode_latency"]["count"] == 4
+    assert snapshot["decode_latency"]["mean_ms"] == pytest.approx(1.0)
+    assert snapshot["recv_to_emit_latency"]["p50_ms"] == pytest.approx(7, rel=0.15)
+    # once per read, not once per message
+    assert snapshot["recv_to_emit_latency"]["count"] == 1
+
+    connection = snapshot["connections"][1]
+    assert connection["malformed"] == 2
+    assert connection["last_error"] == "ValueError: bad frame"
+
+    closed = stats.close_connection(1)
+    assert closed["messages"] == 4
+    assert stats.connections() == {}
+    assert "0 connections" in stats.summary()
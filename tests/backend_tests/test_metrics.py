@@ -0,0 +1,31 @@
+import pytest
+
+from app.backend.metrics import LatencyHistogram
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0.0
+    assert histogram.snapshot()["count"] == 0
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+
+    # percentiles are accurate to the bucket width
+    assert histogram.percentile(50) == pytest.approx(0.050, rel=0.15)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.15)
+    assert histogram.percentile(100) == pytest.approx(0.100)
+    assert histogram.snapshot()["mean_ms"] == pytest.approx(50.5)
+
+
+def test_histogram_weighted_and_out_of_range():
+    histogram = LatencyHistogram(min_seconds=1e-6, max_seconds=1)
+    histogram.record(1e-9, count=98)
+    histogram.record(10.0, count=2)
+
+    assert histogram.count == 100
+    assert histogram.percentile(50) <= 1e-6
+    assert histogram.percentile(99) == 10.0
@@ -0,0 +1,303 @@
+import os
+import sys
+import shutil
+import subprocess
+from pathlib import Path
+from collections import Counter
+
+import numpy as np
+
+import pytest
+
+from app.backend.managers.ml_manager import MLManager
+from app.backend.inference.registry import load_xgb_model
+from vitals_data_models import VitalSample
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../app"))
+
+
+def make_samples(count, seed=0):
+    '''Random but plausible vitals'''
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(count):
+        systolic = int(rng.integers(80, 170))
+        diastolic = int(rng.integers(40, 100))
+        sample = VitalSample(
+            int(rng.integers(50, 130)), (systolic + 2 * diastolic) // 3, int(rng.integers(88, 100)),
+            int(rng.integers(10, 30)), systolic, diastolic,
+        )
+        sample.age = int(rng.integers(20, 90))
+        samples.append(sample)
+    return samples
+
+
+def stack_features(samples):
+    '''The (n, 8) feature matrix of the samples, one preprocessed row per sample'''
+    return np.vstack([MLManager._preprocess(sample) for sample in samples])
+
+
+@pytest.mark.parametrize("model_type", ["xgb", "rf"])
+def test_batched_inference_matches_per_sample(qtbot, model_type):
+    '''One predict call over the stacked cache gives the same vote as predicting every sample'''
+    manager = MLManager(model_type=model_type, max_cache_size=100)
+    samples = make_samples(100)
+    for sample in samples:
+        manager.add_to_cache(sample, "patient")
+
+    expected = Counter(manager._raw_predict(sample) for sample in samples).most_common(1)[0][0]
+
+    with qtbot.waitSignal(manager.prediction_ready) as blocker:
+        manager.run_batched_inference("patient")
+
+    assert blocker.args == ["patient", manager._post_process(expected)]
+    # the features were written into the cache as the samples arrived
+    assert np.array_equal(manager.cache("patient").view(), stack_features(samples).astype(np.float32))
+
+
+def test_majority_vote_ties():
+    '''Ties go to the label predicted first, like Counter.most_common'''
+    assert MLManager._majority_vote(np.array([2, 1, 1, 2, 0])) == 2
+    assert MLManager._majority_vote(np.array([0, 1, 1])) == 1
+
+
+def test_request_batched_inference(qtbot):
+    '''Inference requested from the gui runs on the worker thread and is emitted through prediction_ready'''
+    manager = MLManager(model_type="xgb", max_cache_size=100)
+    for sample in make_samples(50):
+        manager.add_to_cache(sample, "patient")
+
+    try:
+        with qtbot.waitSignal(manager.prediction_ready, timeout=10000) as blocker:
+            future = manager.request_batched_inference("patient")
+
+        assert blocker.args[0] == "patient"
+        assert future.result(timeout=5) == blocker.args[1]
+        assert manager.request_batched_inference("nobody").result(timeout=5) is None
+    finally:
+        manager.shutdown()
+
+
+def test_batched_predictions_keep_their_patient(qtbot):
+    '''Each requested prediction is emitted with the key of the patient it was requested for'''
+    manager = MLManager(model_type="xgb", max_cache_size=100)
+    for sample in make_samples(30, seed=1):
+        manager.add_to_cache(sample, "bed-1")
+    for sample in make_samples(30, seed=2):
+        manager.add_to_cache(sample, "bed-2")
+
+    emitted = []
+    manager.prediction_ready.connect(lambda patient_key, prediction: emitted.append((patient_key, prediction)))
+    try:
+        first = manager.request_batched_inference("bed-1")
+        second = manager.request_batched_inference("bed-2")
+        qtbot.waitUntil(lambda: len(emitted) == 2, timeout=10000)
+
+        assert emitted == [("bed-1", first.result(timeout=5)), ("bed-2", second.result(timeout=5))]
+    finally:
+        manager.shutdown()
+
+
+def test_continuous_inference(qtbot):
+    '''Samples are scored as they are cached and the rolling majority is published per patient'''
+    manager = MLManager(model_type="xgb", max_cache_size=20)
+    manager.enable_continuous_inference(micro_batch=5, publish_interval=0)
+    published = []
+    manager.patient_prediction_ready.connect(lambda patient_key, prediction: published.append((patient_key, prediction)))
+
+    try:
+        for sample in make_samples(40):
+            manager.add_to_cache(sample, "patient")
+
+        # every sample is scored exactly once, the vote only covers the cache window
+        qtbot.waitUntil(lambda: manager._votes.get("patient") is not None and sum(manager._votes["patient"].counts) == 20, timeout=10000)
+        # pending() does not count the request that is running, queue behind it to wait for the worker to go idle
+        manager._worker.submit(lambda: None).result(timeout=5)
+
+        labels = manager._predict_labels(manager.cache("patient").snapshot())
+        assert manager._votes["patient"].counts == np.bincount(labels, minlength=3).tolist()
+        qtbot.waitUntil(lambda: published and published[-1][1] == manager.current_prediction("patient"), timeout=5000)
+        assert all(patient_key == "patient" for patient_key, _ in published)
+        assert manager.current_prediction("nobody") is None
+    finally:
+        manager.shutdown()
+
+
+@pytest.mark.parametrize("vote", ["majority", "soft"])
+def test_batch_scheduler(qtbot, vote):
+    '''Every patient with new samples is scored in one batch per tick and gets their own prediction'''
+    manager = MLManager(model_type="xgb", max_cache_size=30)
+    manager.load_model()
+    published = {}
+    manager.patient_prediction_ready.connect(lambda patient_key, prediction: published.__setitem__(patient_key, prediction))
+    predictions = []
+    predict_proba = manager.model.predict_proba
+    manager.model.predict_proba = lambda features: predictions.append(len(features)) or predict_proba(features)
+
+    try:
+        manager.enable_batch_scheduler(tick=0.3, max_batch_size=1000, vote=vote)
+        for idx in range(5):
+            for sample in make_samples(40, seed=idx):
+                manager.add_to_cache(sample, f"patient {idx}")
+
+        qtbot.waitUntil(lambda: len(published) == 5, timeout=10000)
+        qtbot.waitUntil(lambda: manager._worker.pending() == 0 and manager._scheduler.pending() == 0, timeout=5000)
+        # the five windows of 30 rows went through a single call
+        assert predictions[0] == 150
+
+        for idx in range(5):
+            window = manager.cache(f"patient {idx}").snapshot()
+            proba = predict_proba(window)
+            if vote == "soft":
+                expected = int(np.argmax(proba.mean(axis=0)))
+            else:
+                expected = manager._majority_vote(manager.model.predict(window))
+
+            assert published[f"patient {idx}"] == manager._post_process(expected)
+            assert manager.current_prediction(f"patient {idx}") == published[f"patient {idx}"]
+
+        manager.remove_cache("patient 0")
+        assert manager.current_prediction("patient 0") is None
+    finally:
+        manager.shutdown()
+
+
+def test_swap_label_space_drops_tick_labels(qtbot):
+    '''Labels of a ternary model are not read through the binary label table after a swap'''
+    manager = MLManager(model_type="xgb", max_cache_size=30)
+    try:
+        # the tick is long enough to never fire, the test ticks by hand
+        manager.enable_batch_scheduler(tick=60)
+        for sample in make_samples(30):
+            manager.add_to_cache(sample, "patient")
+
+        labels = manager._score_tick()
+        assert manager.current_prediction("patient") == manager._post_process(labels["patient"])
+
+        manager.set_active_model("xgb", binary=True).result(timeout=30)
+        assert manager.current_prediction("patient") is None
+
+        # the next tick scores the patient with the binary model
+        manager._scheduler.mark("patient")
+        labels = manager._score_tick()
+        assert manager.current_prediction("patient")["label"] in ("abnormal blood volume", "euvolemic")
+    finally:
+        manager.shutdown()
+
+
+def test_heavy_imports_are_deferred():
+    '''Importing the ml manager does not import xgboost or joblib'''
+    code = "import sys; import backend.managers.ml_manager; print('xgboost' in sys.modules, 'joblib' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_ubj_model_cache(qtbot, tmp_path):
+    '''The JSON model is converted to UBJSON once and the cache is regenerated when the JSON changes'''
+    model_path = tmp_path / "unsupervised_data_xgboost.json"
+    shutil.copy(Path(APP_DIR) / "models" / model_path.name, model_path)
+    cache_path = model_path.with_suffix(".ubj")
+
+    manager = MLManager(model_type="xgb", model_dir=tmp_path)
+    try:
+        manager.load_model_async().result(timeout=30)
+        assert cache_path.exists()
+        assert set(manager.startup_times) == {"load", "warm_up"}
+
+        features = stack_features(make_samples(50))
+        expected = manager.model.predict(features)
+
+        # a second load uses the cache and predicts the same
+        cached = MLManager(model_type="xgb", model_dir=tmp_path)
+        cached.load_model()
+        assert np.array_equal(cached.model.predict(features), expected)
+
+        # the cache is older than the JSON model, it is rewritten
+        stale = cache_path.stat().st_mtime - 10
+        os.utime(cache_path, (stale, stale))
+        load_xgb_model(model_path)
+        assert cache_path.stat().st_mtime > stale
+    finally:
+        manager.shutdown()
+
+
+def test_hot_swap_and_shadow(qtbot):
+    '''The active model is swapped at runtime and a shadow model scores the same batches'''
+    manager = MLManager(model_type="xgb", max_cache_size=50)
+    for sample in make_samples(50):
+        manager.add_to_cache(sample, "patient")
+
+    try:
+        manager.load_model_async().result(timeout=30)
+        manager.set_shadow_model("xgb", binary=True).result(timeout=30)
+
+        manager.request_batched_inference("patient").result(timeout=30)
+        qtbot.waitUntil(lambda: manager.shadow_stats()["batches"] == 1, timeout=5000)
+        stats = manager.shadow_stats()
+        assert stats["active"] == ("xgb", False) and stats["shadow"] == ("xgb", True)
+        assert stats["samples"] == 50
+        assert 0 <= stats["agreement"] <= 1
+        assert stats["shadow_latency"]["count"] == 1
+
+        # swap to the binary model, its predictions now come back post-processed as binary labels
+        assert manager.set_active_model("xgb", binary=True).result(timeout=30).key == ("xgb", True)
+        prediction = manager.request_batched_inference("patient").result(timeout=30)
+        assert prediction["label"] in ("abnormal blood volume", "euvolemic")
+
+        # the same model scoring in shadow always agrees
+        qtbot.waitUntil(lambda: manager.shadow_stats()["batches"] == 1, timeout=5000)
+        assert manager.shadow_stats()["agreement"] == 1.0
+
+        # swapping after the shadow model was cleared does not compare against it
+        manager.clear_shadow_model()
+        assert manager.shadow_stats() is None
+        assert manager.set_active_model("xgb", binary=False).result(timeout=30).key == ("xgb", False)
+        assert manager.shadow_stats() is None
+    finally:
+        manager.shutdown()
+
+
+def test_prediction_memo(qtbot):
+    '''Repeated feature vectors are served from the memo, which is invalidated by a model swap'''
+    manager = MLManager(model_type="xgb", max_cache_size=100)
+    samples = stack_features(make_samples(10) * 10)
+    try:
+        manager.load_model()
+        first = manager._predict_labels(samples)
+        assert manager.memo_stats()["size"] == 10
+
+        assert np.array_equal(manager._predict_labels(samples), first)
+        assert manager.memo_stats()["hits"] == 100
+
+        manager.set_active_model("xgb", binary=True).result(timeout=30)
+        assert manager.memo_stats()["size"] == 0
+        assert np.array_equal(manager._predict_labels(samples), manager.model.predict(samples))
+    finally:
+        manager.shutdown()
+
+
+def test_inference_telemetry(qtbot):
+    '''Every inference path is timed by stage once telemetry is enabled'''
+    manager = MLManager(model_type="xgb", max_cache_size=100, telemetry=True)
+    samples = make_samples(20)
+    try:
+        manager.predict(samples[0])
+        for sample in samples:
+            manager.add_to_cache(sample, "patient")
+        manager.request_batched_inference("patient").result(timeout=10)
+
+        stats = manager.inference_stats()
+        assert stats["requests"] == {"predict": 1, "batched": 1}
+        assert stats["rows"] == 21
+        assert stats["loads"] == {"load": 1}
+        assert stats["stages"]["load"]["count"] == 1
+        assert stats["stages"]["queued"]["count"] == 1
+        assert stats["stages"]["predict"]["count"] == 2
+        assert stats["stages"]["post_process"]["count"] == 2
+        assert "memo" in stats
+
+        manager.disable_telemetry()
+        manager.predict(samples[1])
+        assert manager.inference_stats()["requests"] == {"predict": 1, "batched": 1}
+    finally:
+        manager.shutdown()
@@ -0,0 +1,69 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.backend.inference.registry import ModelRegistry, MODEL_FILES
+
+MODEL_DIR = Path(__file__).parent.parent.parent / "app" / "models"
+
+
+def test_lru_eviction():
+    registry = ModelRegistry(MODEL_DIR, capacity=2)
+    ternary = registry.get("xgb", False)
+    registry.get("xgb", True)
+
+    # using the ternary model again makes the binary model the least recently used
+    assert registry.get("xgb", False) is ternary
+    registry.get("rf", True)
+    assert registry.loaded() == [("xgb", False), ("rf", True)]
+
+
+def test_every_model_predicts_integer_labels():
+    '''The 7 feature models drop age and the random forests' string labels are mapped to integers'''
+    registry = ModelRegistry(MODEL_DIR, capacity=len(MODEL_FILES))
+    features = np.array([[17.0, 73.0, 83.0, 55.0, 131.0, 98.0, 45, 76.0]] * 3)
+
+    for model_type, binary in MODEL_FILES:
+        model = registry.get(model_type, binary)
+        labels = model.predict(features)
+        assert labels.dtype == np.int64 and labels.shape == (3,)
+        assert set(labels.tolist()) <= set(range(2 if binary else 3))
+
+
+def test_missing_model(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ModelRegistry(tmp_path).get("xgb")
+    with pytest.raises(FileNotFoundError):
+        ModelRegistry(MODEL_DIR).get("svm")
+
+
+def test_load_does_not_block_loaded_models(monkeypatch):
+    '''A slow load only holds back requests for the model being loaded, and that model is loaded once'''
+    registry = ModelRegistry(MODEL_DIR, capacity=2)
+    ternary = registry.get("xgb", False)
+
+    load = registry._load
+    release = threading.Event()
+    loads = []
+
+    def slow_load(key):
+        loads.append(key)
+        release.wait(timeout=10)
+        return load(key)
+
+    monkeypatch.setattr(registry, "_load", slow_load)
+    results = []
+    getters = [threading.Thread(target=lambda: results.append(registry.get("xgb", True))) for _ in range(2)]
+    for getter in getters:
+        getter.start()
+
+    # the loaded model is served while the binary model is still loading
+    assert registry.get("xgb", False) is ternary
+    release.set()
+    for getter in getters:
+        getter.join(timeout=10)
+
+    assert loads == [("xgb", True)]
+    assert len(results) == 2 and results[0] is results[1]
@@ -0,0 +1,81 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from app.backend.inference.memo import PredictionMemo
+
+
+class CountingModel:
+    '''Predicts the first feature modulo 3 and counts the rows it was asked to predict'''
+    def __init__(self):
+        self.rows = 0
+
+    def predict(self, features):
+        self.rows += len(features)
+        return features[:, 0].astype(np.int64) % 3
+
+
+def test_repeated_vectors_skip_the_model():
+    model = CountingModel()
+    memo = PredictionMemo(capacity=100)
+    features = np.array([[14, 80, 90, 80, 120, 98, 45, 40]] * 5 + [[15, 80, 90, 80, 120, 98, 45, 40]], dtype=float)
+
+    assert memo.predict(model, features).tolist() == [2] * 5 + [0]
+    # the repeated vector is only predicted once
+    assert model.rows == 2
+
+    assert memo.predict(model, features).tolist() == [2] * 5 + [0]
+    assert model.rows == 2
+    assert memo.snapshot()["hits"] == 6
+    assert memo.snapshot()["misses"] == 6
+
+
+def test_fractional_rows_are_not_memoized():
+    model = CountingModel()
+    memo = PredictionMemo()
+    features = np.array([[14.5, 80, 90, 80, 120, 98, 45, 40]])
+
+    memo.predict(model, features)
+    memo.predict(model, features)
+    assert model.rows == 2
+    assert memo.snapshot()["uncacheable"] == 2
+    assert len(memo) == 0
+
+
+def test_missing_and_out_of_range_rows_are_not_memoized():
+    '''Rows with a missing vital or a value that does not fit in an int16 are predicted without a warning'''
+    model = CountingModel()
+    memo = PredictionMemo()
+    features = np.array([[14, np.nan, 90, 80, 120, 98, 45, 40], [14, 80, 1e6, 80, 120, 98, 45, 40], [14, 80, 90, 80, 120, 98, 45, 40]])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert memo.predict(model, features).tolist() == [2, 2, 2]
+
+    assert memo.snapshot()["uncacheable"] == 2
+    assert len(memo) == 1
+
+
+def test_lru_bound_and_model_change():
+    model = CountingModel()
+    memo = PredictionMemo(capacity=2)
+    rows = np.array([[value] * 8 for value in range(3)], dtype=float)
+
+    memo.predict(model, rows)
+    assert len(memo) == 2
+
+    # the oldest row was evicted
+    memo.predict(model, rows[:1])
+    assert model.rows == 4
+
+    # a different model never sees the labels of the previous one
+    other = CountingModel()
+    memo.predict(other, rows[1:2])
+    assert other.rows == 1
+    assert len(memo) == 1
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        PredictionMemo(capacity=0)
@@ -0,0 +1,33 @@
+from collections import Counter
+
+import numpy as np
+
+from app.backend.inference.rolling_vote import RollingVote
+
+
+def test_matches_recounting_the_window():
+    '''The incremental counts always match recounting the last window labels'''
+    labels = np.random.default_rng(0).integers(0, 3, 1000).tolist()
+    vote = RollingVote(window=50, classes=3)
+
+    for end, label in enumerate(labels, 1):
+        vote.push(label)
+        window = Counter(labels[max(0, end - 50):end])
+        assert vote.counts == [window[label] for label in range(3)]
+        assert vote.counts[vote.majority()] == max(window.values())
+
+    assert len(vote) == 50
+
+
+def test_ties_keep_the_majority():
+    vote = RollingVote(window=4, classes=3)
+    vote.extend([1, 1, 2, 2])
+    assert vote.majority() == 1
+
+    # evicting a 1 hands the majority to 2
+    vote.push(0)
+    assert vote.majority() == 2
+
+
+def test_empty():
+    assert RollingVote(window=10, classes=2).majority() is None
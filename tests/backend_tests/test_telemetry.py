@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from app.backend.inference.telemetry import InferenceTelemetry, StageTimer, NULL_TIMER
+
+
+def test_disabled_telemetry_records_nothing():
+    telemetry = InferenceTelemetry()
+    timer = telemetry.timer("predict")
+    assert timer is NULL_TIMER
+
+    timer.lap("predict", rows=10)
+    timer.finish()
+    telemetry.record_load(("xgb", False), 0.1, 0.01)
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["requests"] == {}
+    assert snapshot["loads"] == {}
+    assert snapshot["last_load"] is None
+
+
+def test_stage_timings_and_batch_sizes():
+    telemetry = InferenceTelemetry(enabled=True)
+    for rows in (1, 100, 100):
+        timer = telemetry.timer("batched")
+        assert isinstance(timer, StageTimer)
+        timer.lap("preprocess")
+        timer.lap("predict", rows=rows)
+        timer.lap("vote")
+        timer.finish()
+
+    snapshot = telemetry.snapshot()
+    assert snapshot["requests"] == {"batched": 3}
+    assert snapshot["rows"] == 201
+    assert snapshot["batch_sizes"] == {"1": 1, "64-127": 2}
+    assert snapshot["stages"]["predict"]["count"] == 3
+    assert snapshot["stages"]["load"]["count"] == 0
+    assert snapshot["request_latency"]["batched"]["count"] == 3
+    assert "3 requests" in telemetry.summary()
+
+    telemetry.reset()
+    assert telemetry.snapshot()["requests"] == {}
+
+
+def test_log_lines():
+    lines = []
+    telemetry = InferenceTelemetry(enabled=True, log_lines=True, log=lines.append)
+    telemetry.record_load(("rf", True), 0.5, 0.25, event="swap")
+    timer = telemetry.timer("tick")
+    timer.lap("predict", rows=7)
+    timer.finish(patients=2)
+
+    load, request = map(json.loads, lines)
+    assert load == {"event": "model_load", "load_event": "swap", "model": ["rf", True], "load_ms": 500.0, "warm_up_ms": 250.0}
+    assert request["event"] == "inference"
+    assert request["kind"] == "tick"
+    assert request["rows"] == 7
+    assert request["patients"] == 2
+    assert set(request["stages_ms"]) == {"predict"}
+    assert telemetry.snapshot()["last_load"]["event"] == "swap"
+    assert telemetry.snapshot()["load_latency"]["mean_ms"] == pytest.approx(750, rel=0.01)
@@ -0,0 +1,179 @@
+import socket
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.backend.managers.vitals_manager import VitalsManager
+
+
+@pytest.fixture(params=["threaded", "async", "process"])
+def manager(request):
+    '''Starts a VitalsManager on a free port in each ingest mode'''
+    vitals_manager = VitalsManager(host="127.0.0.1", port=0, max_workers=10, mode=request.param, decoders=2)
+    vitals_manager.start_server()
+    yield vitals_manager
+    vitals_manager.stop_server()
+
+
+def make_patient(mrn):
+    return MagicMock(patient_mrn=mrn, dob=date(1980, 1, 1))
+
+
+def collect(manager):
+    '''Focuses a patient and returns the list every emitted sample is appended to'''
+    received = []
+    manager.focus_patient(make_patient("focused"))
+    manager.vitals_data.connect(received.append)
+    return received
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        VitalsManager(mode="fork")
+
+
+def test_concurrent_devices(qtbot, manager, encode_vitals, sample_vitals):
+    '''Devices that stay connected must not block other devices from being served'''
+    devices = 5
+    received = collect(manager)
+
+    # open every connection before any data is sent, the threaded version used to block here
+    clients = [socket.create_connection(("127.0.0.1", manager.port)) for _ in range(devices)]
+    try:
+        for client in clients:
+            client.sendall(encode_vitals(sample_vitals))
+
+        qtbot.waitUntil(lambda: len(received) == devices, timeout=5000)
+        assert received[0].heartRate == 80
+        assert received[0].pulsePressure == 40
+        assert received[0].received_at > 0
+        assert len({sample.source_id for sample in received}) == devices
+
+        # every connection is still open and reports its own throughput
+        throughput = manager.connection_throughput()
+        assert len(throughput) == devices
+        assert all(stats["messages"] == 1 for stats in throughput.values())
+        assert all(stats["messages_per_sec"] > 0 for stats in throughput.values())
+    finally:
+        for client in clients:
+            client.close()
+
+
+def test_connection_closed(qtbot, manager, encode_vitals, sample_vitals):
+    '''Closed connections are removed from the throughput report'''
+    received = collect(manager)
+
+    with socket.create_connection(("127.0.0.1", manager.port)) as client:
+        client.sendall(encode_vitals(sample_vitals))
+        qtbot.waitUntil(lambda: len(received) == 1, timeout=5000)
+
+    qtbot.waitUntil(lambda: manager.connection_throughput() == {}, timeout=5000)
+
+
+def test_coalesced_and_split_messages(qtbot, manager, encode_vitals, sample_vitals):
+    '''Messages coalesced or split by TCP are all decoded, garbage is counted as malformed'''
+    received = collect(manager)
+    message = encode_vitals(sample_vitals)
+
+    with socket.create_connection(("127.0.0.1", manager.port)) as client:
+        client.sendall(message * 50 + b"\x00\x01" + message[:10])
+        client.sendall(message[10:])
+
+        qtbot.waitUntil(lambda: len(received) == 51, timeout=5000)
+        stats = list(manager.connection_throughput().values())[0]
+        assert stats["messages"] == 51
+        assert stats["malformed"] == 1
+
+
+def test_ingest_stats(qtbot, manager, encode_vitals, sample_vitals):
+    '''Decode failures and latencies are available from the vitals manager at runtime'''
+    received = collect(manager)
+    message = encode_vitals(sample_vitals)
+
+    with socket.create_connection(("127.0.0.1", manager.port)) as client:
+        # a well framed message that does not decode
+        client.sendall(message * 5 + b"\x30\x03\x02\x01\x01")
+        qtbot.waitUntil(lambda: manager.get_stats()["totals"]["decode_failures"] == 1, timeout=5000)
+
+        stats = manager.get_stats()
+        assert stats["totals"]["messages"] == 5
+        assert stats["open_connections"] == 1
+        # recorded once per read, the frames may have arrived in more than one
+        assert 1 <= stats["recv_to_emit_latency"]["count"] <= 5
+        assert stats["recv_to_emit_latency"]["p99_ms"] > 0
+        assert list(stats["connections"].values())[0]["last_error"] is not None
+
+    # only the frame that failed to decode is dropped
+    qtbot.waitUntil(lambda: len(received) == 5, timeout=5000)
+
+
+def test_unrouted_samples_dropped(qtbot, manager, encode_vitals, sample_vitals):
+    '''Without a binding or focused patient samples are decoded but not routed anywhere'''
+    routed = []
+    manager.add_sink(lambda sample, patient_key: routed.append(patient_key))
+    received = []
+    manager.vitals_data.connect(received.append)
+
+    with socket.create_connection(("127.0.0.1", manager.port)) as client:
+        client.sendall(encode_vitals(sample_vitals) * 3)
+        qtbot.waitUntil(lambda: manager.get_stats()["totals"]["messages"] == 3, timeout=5000)
+
+    assert routed == []
+    assert received == []
+
+
+def test_unbound_devices_follow_focus(qtbot, manager, encode_vitals, sample_vitals):
+    '''Unbound devices are routed to the focused patient, keeping the single monitor setup working'''
+    routed = []
+    manager.add_sink(lambda sample, patient_key: routed.append(patient_key))
+    received = collect(manager)
+
+    with socket.create_connection(("127.0.0.1", manager.port)) as client:
+        client.sendall(encode_vitals(sample_vitals))
+        qtbot.waitUntil(lambda: len(received) == 1, timeout=5000)
+
+    assert routed == ["focused"]
+    assert received[0].age >= 40
+
+
+def test_multi_bed_routing(qtbot, encode_vitals, sample_vitals):
+    '''Every bed is routed to its own patient, only the focused patient is emitted to the frontend'''
+    beds = 200
+    manager = VitalsManager(host="127.0.0.1", port=0, mode="async")
+    manager.start_server()
+
+    routed = {}
+    manager.add_sink(lambda sample, patient_key: routed.__setitem__(patient_key, routed.get(patient_key, 0) + 1))
+    received = collect(manager)
+
+    clients = [socket.create_connection(("127.0.0.1", manager.port)) for _ in range(beds)]
+    try:
+        for bed, client in enumerate(clients):
+            manager.bind_device("{}:{}".format(*client.getsockname()), make_patient(f"bed-{bed}"))
+
+        for client in clients:
+            client.sendall(encode_vitals(sample_vitals) * 2)
+
+        qtbot.waitUntil(lambda: sum(routed.values()) == beds * 2, timeout=10000)
+        assert routed == {f"bed-{bed}": 2 for bed in range(beds)}
+
+        # none of the beds are on screen
+        assert received == []
+
+        # focusing a bed sends only its samples to the frontend
+        manager.focus_patient(make_patient("bed-7"))
+        for client in clients:
+            client.sendall(encode_vitals(sample_vitals))
+
+        qtbot.waitUntil(lambda: sum(routed.values()) == beds * 3, timeout=10000)
+        qtbot.waitUntil(lambda: len(received) == 1, timeout=5000)
+        assert received[0].source_id == "{}:{}".format(*clients[7].getsockname())
+        assert manager.bound_devices(make_patient("bed-7")) == [received[0].source_id]
+
+        manager.forget_patient("bed-7")
+        assert manager.bound_devices(make_patient("bed-7")) == []
+    finally:
+        for client in clients:
+            client.close()
+        manager.stop_server()
@@ -6,6 +6,7 @@ from datetime import datetime
 from PyQt6.QtCore import QDateTime
 
 from app.frontend.vitals_window import VitalsWindow
+from app.vitals_data_models import VitalSample
 
 @pytest.fixture
 def app(qtbot, patch_patient_manager, patch_fluid_manager):
@@ -90,18 +91,36 @@ def test_update_ui(app):
     assert app.total_fluid_value.text() == "1000"
 
 
+def test_prediction_for_another_patient_ignored():
+    '''A requested prediction that arrives after switching patients is not shown for the new patient'''
+    # only the patient filter is under test, so it does not need the window fixture
+    window = MagicMock()
+    window.patient_state.current_patient = MagicMock(patient_mrn="123")
+
+    VitalsWindow._update_patient_prediction(window, "456", {"label": "hypovolemia", "suggested_action": "Administer fluids"})
+    window._update_inference_fields.assert_not_called()
+
+    prediction = {"label": "euvolemic", "suggested_action": "Monitor"}
+    VitalsWindow._update_patient_prediction(window, "123", prediction)
+    window._update_inference_fields.assert_called_once_with(prediction)
+
+    window.patient_state.current_patient = None
+    VitalsWindow._update_patient_prediction(window, "123", prediction)
+    window._update_inference_fields.assert_called_once()
+
+
 def test_update_vitals(app):
     '''Test that vitals update the proper fields'''
-    vitals_data = {
-        "heartRate": 80,
-        "meanArterialPressure": 70,
-        "respiratoryRate": 10,
-        "systolicBP": 120,
-        "diastolicBP": 80,
-        "spo2": 98
-    }
-
-    app._update_vitals(vitals_data)
+    vitals_sample = VitalSample(
+        heartRate=80,
+        meanArterialPressure=70,
+        spo2=98,
+        respiratoryRate=10,
+        systolicBP=120,
+        diastolicBP=80,
+    )
+
+    app._update_vitals(vitals_sample)
 
     assert app.heart_rate_value.text() == "80"
     assert app.map_value.text() == "70"
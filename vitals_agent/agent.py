@@ -1,6 +1,10 @@
 import socket
 import time
 import random
+import struct
+import asyncio
+import argparse
+from collections import deque
 
 from pyasn1.codec.der.encoder import encode
 
@@ -20,26 +24,26 @@ def generate_mock_vitals():
     }
 
 
-def encode_vitals(data):
-
-    # These mdc_codes could be wrong, but im not paying for the document to find out
-    mdc_codes = {
-        'heartRate': {'mdcCode': 18402, 'unitCode': 264864},  # MDC_PULS_RATE (bpm)
-        'meanArterialPressure': {'mdcCode': 18949, 'unitCode': 266016},  # MDC_PRESS_BLD_ART_MEAN (mmHg)
-        'spo2': {'mdcCode': 150456, 'unitCode': 262144},  # MDC_PULS_OXIM_SAT_O2 (percentage)
-        'respiratoryRate': {'mdcCode': 18945, 'unitCode': 266016},  # MDC_PRESS_CVP (mmHg)
-        'systolicBP': {'mdcCode': 18947, 'unitCode': 266016},  # MDC_PRESS_BLD_ART_SYS (mmHg)
-        'diastolicBP': {'mdcCode': 18948, 'unitCode': 266016}  # MDC_PRESS_BLD_ART_DIA (mmHg)
-    }
+# These mdc_codes could be wrong, but im not paying for the document to find out
+MDC_CODES = {
+    'heartRate': {'mdcCode': 18402, 'unitCode': 264864},  # MDC_PULS_RATE (bpm)
+    'meanArterialPressure': {'mdcCode': 18949, 'unitCode': 266016},  # MDC_PRESS_BLD_ART_MEAN (mmHg)
+    'spo2': {'mdcCode': 150456, 'unitCode': 262144},  # MDC_PULS_OXIM_SAT_O2 (percentage)
+    'respiratoryRate': {'mdcCode': 18945, 'unitCode': 266016},  # MDC_PRESS_CVP (mmHg)
+    'systolicBP': {'mdcCode': 18947, 'unitCode': 266016},  # MDC_PRESS_BLD_ART_SYS (mmHg)
+    'diastolicBP': {'mdcCode': 18948, 'unitCode': 266016}  # MDC_PRESS_BLD_ART_DIA (mmHg)
+}
 
 
+def encode_vitals(data):
+    '''Encode the vitals with pyasn1, this is the reference encoder the fast encoder must match'''
     raw_data = VitalSigns()
 
     for key, value in data.items():
         observation_component = NumericObservation()
 
         # add the mdc and unit codes to the NumericOvservation
-        for field, field_value in mdc_codes.get(key).items():
+        for field, field_value in MDC_CODES.get(key).items():
             observation_component.setComponentByName(f"{field}", field_value)
 
         observation_component.setComponentByName('value', f"{value}")
@@ -49,21 +53,98 @@ def encode_vitals(data):
     
     # encode and return the vitals data
     return encode(raw_data)
-    
 
-def send_vitals(): 
-    '''publish/send the vitals'''
-    server = "host.docker.internal"
-    port = 8080 
 
+def _der_length(length):
+    '''DER length octets, short form below 128 and long form above'''
+    if length < 0x80:
+        return bytes([length])
+    octets = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(octets)]) + octets
+
+
+def _der_integer(value):
+    '''DER INTEGER, the value is two's complement with the same content length pyasn1 uses'''
+    content = value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True)
+    return b"\x02" + _der_length(len(content)) + content
+
+
+class TemplateEncoder:
+    '''Encodes vitals by patching the values into a precomputed DER template.
+
+    The VitalSigns schema is fixed and the mdc/unit codes never change, so
+    everything except the six value octets is the same in every message.
+    When every value fits in a single octet (0-127, which covers all of the
+    vitals we send) the template is copied and only those six octets are
+    patched. Any other value falls back to joining precomputed prefixes,
+    which is still much cheaper than building pyasn1 objects. The output is
+    byte for byte the same as encode_vitals().
+    '''
+    FIELDS = tuple(VitalSigns.componentType.getNameByPosition(idx) for idx in range(len(VitalSigns.componentType)))
+
+    def __init__(self, mdc_codes=MDC_CODES):
+        # mdcCode and unitCode TLVs of each observation, in schema order
+        self._prefixes = [
+            _der_integer(mdc_codes[field]['mdcCode']) + _der_integer(mdc_codes[field]['unitCode'])
+            for field in self.FIELDS
+        ]
+
+        # template with a single octet value of 0 in every observation
+        observations = [self._observation(prefix, b"\x02\x01\x00") for prefix in self._prefixes]
+        template = self._sequence(b"".join(observations))
+        self._template = bytearray(template)
+
+        # the value octet is the last octet of each observation
+        self._offsets = []
+        position = len(template) - len(b"".join(observations))
+        for observation in observations:
+            position += len(observation)
+            self._offsets.append(position - 1)
+
+
+    @staticmethod
+    def _sequence(content):
+        return b"\x30" + _der_length(len(content)) + content
+
+
+    def _observation(self, prefix, value_tlv):
+        return self._sequence(prefix + value_tlv)
+
+
+    def encode(self, data):
+        '''Encodes a dict of vitals keyed by the VitalSigns field names'''
+        values = [int(data[field]) for field in self.FIELDS]
+
+        if all(0 <= value < 0x80 for value in values):
+            message = self._template[:]
+            for offset, value in zip(self._offsets, values):
+                message[offset] = value
+            return bytes(message)
+
+        observations = b"".join(
+            self._observation(prefix, _der_integer(value)) for prefix, value in zip(self._prefixes, values)
+        )
+        return self._sequence(observations)
+
+
+_template_encoder = TemplateEncoder()
+
+
+def encode_vitals_fast(data):
+    '''Encode the vitals using the precomputed template, byte compatible with encode_vitals()'''
+    return _template_encoder.encode(data)
+
+
+def send_vitals(server="host.docker.internal", port=8080, interval=0.5): 
+    '''publish/send the vitals'''
     vitals_agent = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     vitals_agent.connect((server, port))
 
     try:
         while True:
             vitals_data = generate_mock_vitals()
-            vitals_agent.sendall(encode_vitals(vitals_data))
-            time.sleep(0.5)
+            vitals_agent.sendall(encode_vitals_fast(vitals_data))
+            time.sleep(interval)
 
     # stop gracefully
     except (ConnectionRefusedError, BrokenPipeError):
@@ -76,5 +157,212 @@ def send_vitals():
         vitals_agent.close()
 
 
+def ramp_rate(profile, target_rate, elapsed, ramp_seconds, start_rate=1.0):
+    '''Returns the per device send rate (Hz) at a point in the run
+
+    Args:
+        profile {str} -- 'constant', 'linear' (start_rate to target_rate over ramp_seconds)
+                         or 'step' (doubles from start_rate every ramp_seconds until target_rate)
+        target_rate {float} -- the final rate, 0 means as fast as possible
+        elapsed {float} -- seconds since the run started
+        ramp_seconds {float} -- length of the linear ramp or of each step
+        start_rate {float} -- the rate the ramp starts at
+    '''
+    if profile == "constant" or target_rate <= 0 or ramp_seconds <= 0:
+        return target_rate
+
+    if profile == "linear":
+        progress = min(elapsed / ramp_seconds, 1.0)
+        return start_rate + (target_rate - start_rate) * progress
+
+    if profile == "step":
+        return min(start_rate * 2 ** int(elapsed / ramp_seconds), target_rate)
+
+    raise ValueError(f"Unknown ramp profile: {profile}")
+
+
+class LoadStats:
+    '''Counters shared by every simulated device in a load run
+
+    Latencies are kept in a fixed size uniform sample of every acked message
+    (reservoir sampling), so a long run neither grows without bound nor slows
+    down the reports that sort it.
+    '''
+    RESERVOIR_SIZE = 10000
+
+    def __init__(self):
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.latencies = []
+
+
+    def record_latency(self, latency):
+        '''Records the latency of an acked message, replacing a random earlier one once the reservoir is full'''
+        self.acked += 1
+        if len(self.latencies) < self.RESERVOIR_SIZE:
+            self.latencies.append(latency)
+            return
+
+        slot = random.randrange(self.acked)
+        if slot < self.RESERVOIR_SIZE:
+            self.latencies[slot] = latency
+
+
+    @staticmethod
+    def percentile(values, pct):
+        '''Util method to get the pct percentile of a list of values'''
+        if not values:
+            return float("nan")
+        ordered = sorted(values)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+    def summary(self, elapsed):
+        '''Returns a one line summary of the run so far'''
+        line = f"{elapsed:7.1f}s  sent {self.sent:>9}  {self.sent / max(elapsed, 1e-9):>10.1f} msg/s  errors {self.errors}"
+        if self.acked:
+            p50 = self.percentile(self.latencies, 50) * 1000
+            p99 = self.percentile(self.latencies, 99) * 1000
+            line += f"  acked {self.acked}  latency p50 {p50:.2f} ms  p99 {p99:.2f} ms"
+        return line
+
+
+async def _read_acks(reader, sent_times, stats):
+    '''Matches sequence stamped acks from the vitals manager with the time each message was sent'''
+    while True:
+        try:
+            ack = await reader.readexactly(4)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # the vitals manager closed the connection
+            return
+        sequence = struct.unpack("!I", ack)[0]
+        now = time.perf_counter()
+
+        # acks arrive in order, drop anything older than the acked message
+        while sent_times and sent_times[0][0] < sequence:
+            sent_times.popleft()
+        if sent_times and sent_times[0][0] == sequence:
+            stats.record_latency(now - sent_times.popleft()[1])
+
+
+async def _simulate_device(args, stats, started):
+    '''Simulates one device, sending vitals at the ramped rate until the run ends'''
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    except OSError as e:
+        print(f"Failed to connect: {e}")
+        stats.errors += 1
+        return
+
+    sent_times = deque()
+    ack_task = asyncio.create_task(_read_acks(reader, sent_times, stats)) if args.ack else None
+    sequence = 0
+    next_send = time.perf_counter()
+
+    try:
+        while True:
+            elapsed = time.perf_counter() - started
+            if args.duration and elapsed >= args.duration:
+                break
+
+            sequence += 1
+            if ack_task:
+                sent_times.append((sequence, time.perf_counter()))
+            writer.write(encode_vitals_fast(generate_mock_vitals()))
+            stats.sent += 1
+
+            rate = ramp_rate(args.ramp, args.rate, elapsed, args.ramp_seconds, args.start_rate)
+            if rate > 0:
+                # schedule against absolute times so the rate does not drift
+                next_send = max(next_send + 1 / rate, time.perf_counter() - 1)
+                await asyncio.sleep(max(next_send - time.perf_counter(), 0))
+            else:
+                await writer.drain()
+
+            if writer.transport.get_write_buffer_size() > 1 << 20:
+                await writer.drain()
+
+    except (ConnectionError, OSError):
+        stats.errors += 1
+    finally:
+        if ack_task:
+            # give the last acks a moment to arrive
+            await asyncio.sleep(0.2)
+            ack_task.cancel()
+            await asyncio.gather(ack_task, return_exceptions=True)
+        writer.close()
+
+
+async def _report(stats, started, interval):
+    '''Periodically prints the achieved send rate'''
+    while True:
+        await asyncio.sleep(interval)
+        print(stats.summary(time.perf_counter() - started))
+
+
+async def run_load(args):
+    '''Simulates args.devices devices sending to args.host:args.port and reports the achieved rate
+
+    Returns:
+        stats {LoadStats} -- counters for the whole run
+    '''
+    stats = LoadStats()
+    started = time.perf_counter()
+    reporter = asyncio.create_task(_report(stats, started, args.report_interval))
+
+    devices = []
+    for _ in range(args.devices):
+        devices.append(asyncio.create_task(_simulate_device(args, stats, started)))
+        if args.connect_delay:
+            await asyncio.sleep(args.connect_delay)
+
+    try:
+        await asyncio.gather(*devices)
+    finally:
+        reporter.cancel()
+        print(stats.summary(time.perf_counter() - started))
+
+    return stats
+
+
+def parse_arguments(args=None):
+    '''Parses the cli arguments, running without a command sends from a single device like before
+
+    intended use from the cli:
+        python3 agent.py
+        python3 agent.py load --host localhost --devices 200 --rate 100 --duration 30 --ack
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="host.docker.internal", help="Host the vitals manager is listening on")
+    parser.add_argument("--port", type=int, default=8080, help="Port the vitals manager is listening on")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between samples for the single device")
+
+    subparsers = parser.add_subparsers(dest="command")
+    load = subparsers.add_parser("load", help="Simulate many devices to load test the vitals manager")
+    # also accepted after the command, suppressed defaults keep the values given before it
+    load.add_argument("--host", default=argparse.SUPPRESS, help="Host the vitals manager is listening on")
+    load.add_argument("--port", type=int, default=argparse.SUPPRESS, help="Port the vitals manager is listening on")
+    load.add_argument("--devices", type=int, default=10, help="Number of simulated devices")
+    load.add_argument("--rate", type=float, default=2.0, help="Samples per second per device, 0 sends as fast as possible")
+    load.add_argument("--ramp", choices=("constant", "linear", "step"), default="constant", help="How the rate ramps up to --rate")
+    load.add_argument("--start-rate", type=float, default=1.0, help="Rate the linear and step ramps start at")
+    load.add_argument("--ramp-seconds", type=float, default=10.0, help="Length of the linear ramp or of each step")
+    load.add_argument("--duration", type=float, default=30.0, help="Seconds to run for, 0 runs until interrupted")
+    load.add_argument("--connect-delay", type=float, default=0.0, help="Seconds between opening each device connection")
+    load.add_argument("--report-interval", type=float, default=1.0, help="Seconds between rate reports")
+    load.add_argument("--ack", action="store_true", help="Measure latency from the vitals manager's sequence stamped acks")
+
+    return parser.parse_args(args)
+
+
 if __name__ == "__main__":
-    send_vitals()
+    args = parse_arguments()
+
+    if args.command == "load":
+        try:
+            asyncio.run(run_load(args))
+        except KeyboardInterrupt:
+            print("Stopping load")
+    else:
+        send_vitals(args.host, args.port, args.interval)
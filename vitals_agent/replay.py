@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# the capture format is defined by the app, add the app directory to the system path to import it
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../app"))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from backend.ingest.capture import CaptureReader
+
+
+async def replay(records, host, port, speed=1.0):
+    '''Re-sends the captured frames of a session, one connection per captured connection
+
+    Args:
+        records {List[tuple]} -- (received_at, connection id, frame) records of a session, see CaptureReader.sessions()
+        host {str} -- host the vitals manager is listening on
+        port {int} -- port the vitals manager is listening on
+        speed {float} -- 1 replays in real time, N replays N times faster and 0 as fast as possible
+
+    Returns:
+        (messages, seconds) -- number of frames sent and how long it took
+    '''
+    if not records:
+        return 0, 0.0
+
+    writers = {}
+    for connection_id in dict.fromkeys(record[1] for record in records):
+        _, writers[connection_id] = await asyncio.open_connection(host, port)
+
+    first_received = records[0][0]
+    started = time.perf_counter()
+
+    try:
+        for sent, (received_at, connection_id, frame) in enumerate(records, 1):
+            if speed > 0:
+                # keep the captured spacing between frames, scaled by the speed
+                delay = (received_at - first_received) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            writer = writers[connection_id]
+            writer.write(frame)
+
+            # don't let the write buffers grow without bound at max speed
+            if writer.transport.get_write_buffer_size() > 1 << 20 or (speed <= 0 and sent % 1000 == 0):
+                await writer.drain()
+
+        for writer in writers.values():
+            await writer.drain()
+
+        return len(records), time.perf_counter() - started
+
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def parse_arguments(args=None):
+    '''Parses the cli arguments
+
+    intended use from the cli:
+        python3 replay.py capture.fscap --host localhost --speed 10
+    '''
+    parser = argparse.ArgumentParser(description="Replay a vitals capture against a VitalsManager")
+    parser.add_argument("capture", help="Path of the capture file")
+    parser.add_argument("--host", default="localhost", help="Host the vitals manager is listening on")
+    parser.add_argument("--port", type=int, default=8080, help="Port the vitals manager is listening on")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 replays in real time, N is N times faster, 0 is as fast as possible")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times to replay the capture")
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    with CaptureReader(args.capture) as capture:
+        # every session is replayed on its own connections, the gap between sessions is skipped
+        sessions = capture.sessions()
+        print(f"Replaying {sum(len(records) for records in sessions)} frames from {len(sessions)} sessions")
+
+        for _ in range(args.repeat):
+            for session, records in enumerate(sessions):
+                messages, seconds = asyncio.run(replay(records, args.host, args.port, args.speed))
+                print(f"Session {session}: sent {messages} frames from {len({record[1] for record in records})} connections "
+                      f"in {seconds:.2f}s ({messages / max(seconds, 1e-9):.0f} frames/s)")
+
+        # the frames are views of the memory map, drop them before it is closed
+        sessions = records = None